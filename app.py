@@ -62,6 +62,7 @@ class App(ctk.CTk):
         # Variáveis de Dados
         self.empresas_disponiveis = [] # Agora será lista de dicts: [{'id':..., 'nome':..., 'cnpj':...}]
         self.empresas_selecionadas = [] # Lista de IDs (strings)
+        self.sessao_firebird = None # Sessão Firebird (fdb ou isql) compartilhada entre empresas e análise
         
         self.db_type = ctk.StringVar(value='nuvem')
         self.db_nuvem_nome = ctk.StringVar()
@@ -393,18 +394,26 @@ class App(ctk.CTk):
                     self.after(0, lambda: messagebox.showerror("Erro PDF", res_conv['erro']))
                     return
                 
-                # Ler Excel
-                from logic import _ler_sefaz
-                cupons_por_serie = {}
+                # Ler Excel (uma única leitura para todas as séries)
+                from logic import _ler_sefaz_multi, _faixa_sefaz_grande_demais, TAMANHO_MAXIMO_INTERVALO_SEFAZ
+                cupons_por_serie = _ler_sefaz_multi(temp_excel, lista_series)
                 
-                for serie in lista_series:
-                    c_set = _ler_sefaz(temp_excel, serie)
-                    cupons_por_serie[serie] = sorted(list(c_set), key=lambda x: int(x))
+                # Cada faixa vira um cupom por linha: faixa absurda (linha malformada) esgotaria a memória
+                faixa_grande = _faixa_sefaz_grande_demais(cupons_por_serie)
+                if faixa_grande:
+                    serie, inicial, final = faixa_grande
+                    try: os.remove(temp_excel)
+                    except: pass
+                    msg = (f"A faixa de inutilização {inicial} a {final} (série {serie}) tem "
+                           f"{final - inicial + 1} números, acima do limite de {TAMANHO_MAXIMO_INTERVALO_SEFAZ}.\n"
+                           f"Verifique o PDF da SEFAZ.")
+                    self.after(0, lambda: messagebox.showerror("Erro PDF", msg))
+                    return
                 
-                # Formatar
+                # Formatar (IntervalSet já itera em ordem crescente)
                 linhas = []
-                for serie, lista in cupons_por_serie.items():
-                    for cp in lista:
+                for serie, cupons in cupons_por_serie.items():
+                    for cp in cupons:
                         linhas.append(f"{cp}|SERIE_{serie}")
                 texto_cupons = '\n'.join(linhas)
                 
@@ -413,9 +422,17 @@ class App(ctk.CTk):
             
             # 2. Obter Empresas (Agora com detalhes)
             from logic import obter_empresas_disponiveis
-            res_emp = obter_empresas_disponiveis(config)
+            
+            # Firebird: uma única sessão (fdb ou isql) para empresas + análise (fechada ao fim da análise)
+            self._fechar_sessao_firebird()
+            if config.get('tipo') == 'local':
+                from firebird_backend import open_backend
+                self.sessao_firebird = open_backend(config)
+            
+            res_emp = obter_empresas_disponiveis(config, sessao_firebird=self.sessao_firebird)
             
             if not res_emp['sucesso']:
+                self._fechar_sessao_firebird()
                 self.after(0, lambda: messagebox.showerror("Erro Banco", res_emp['erro']))
                 return
             
@@ -425,8 +442,16 @@ class App(ctk.CTk):
             self.after(0, lambda: self._decidir_empresas(config, texto_cupons, lista_series))
             
         except Exception as e:
+            self._fechar_sessao_firebird()
             self.after(0, lambda: messagebox.showerror("Erro Fatal", str(e)))
 
+    def _fechar_sessao_firebird(self):
+        sessao = getattr(self, 'sessao_firebird', None)
+        self.sessao_firebird = None
+        if sessao is not None:
+            try: sessao.close()
+            except: pass
+
     def _decidir_empresas(self, config, texto_cupons, lista_series):
         if len(self.empresas_disponiveis) > 1:
             self.limpar_tabela_resultados() # Limpar msg loading
@@ -488,6 +513,11 @@ class App(ctk.CTk):
             top.destroy()
             self._lançar_analise_final(config, texto_cupons, lista_series)
             
+        def _cancelar():
+            self._fechar_sessao_firebird()
+            top.destroy()
+            
+        top.protocol("WM_DELETE_WINDOW", _cancelar)
         ctk.CTkButton(top, text="Confirmar Seleção", command=_confirmar, height=40).pack(pady=20)
 
     def _lançar_analise_final(self, config, texto_cupons, lista_series):
@@ -498,12 +528,16 @@ class App(ctk.CTk):
 
     def _run_analise_final(self, config, texto_cupons, lista_series):
         from logic import executar_analise_db_avancada
-        res = executar_analise_db_avancada(
-            config, 
-            texto_cupons, 
-            lista_series, 
-            self.empresas_selecionadas
-        )
+        try:
+            res = executar_analise_db_avancada(
+                config, 
+                texto_cupons, 
+                lista_series, 
+                self.empresas_selecionadas,
+                sessao_firebird=self.sessao_firebird
+            )
+        finally:
+            self._fechar_sessao_firebird()
         self.after(0, lambda: self._exibir_resultados_db(res))
 
     def _exibir_resultados_db(self, resultado):
@@ -0,0 +1,337 @@
+"""
+Motor assíncrono (asyncio) para a análise avançada de cupons em vários bancos ao mesmo tempo.
+
+- PostgreSQL: driver assíncrono asyncpg (opcional; sem ele, o caminho síncrono de logic.py
+  roda em thread do executor).
+- Firebird: um processo isql por banco via asyncio.create_subprocess_exec, com todas as
+  consultas enviadas pelo stdin e separadas por SELECTs sentinela.
+- Concorrência limitada por servidor (MAX_CONCURRENT_PER_HOST análises simultâneas por host).
+
+A classificação dos cupons é a mesma de logic.executar_analise_db_avancada; cada banco
+retorna um dicionário no mesmo formato. Uso síncrono (GUI/threads) via run_sync().
+"""
+
+import asyncio
+import decimal
+import locale
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import firebird_isql
+import logging_utils
+import logic
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = logging_utils.get_logger()
+
+# Análises simultâneas por servidor (host PostgreSQL ou máquina do Firebird)
+MAX_CONCURRENT_PER_HOST = 4
+
+# Tempo máximo (segundos) sem nenhuma linha de saída do isql antes de abortar o banco
+ISQL_LINE_TIMEOUT = 60
+
+# Mesmas colunas de logic.executar_analise_db_avancada. Os parâmetros ficam com o tipo que o
+# servidor deduz das colunas (sem cast nas colunas, que impediria o uso do índice
+# (serie_nf, numero_nf)); o asyncpg exige valores já nesse tipo, ver _typed_params
+QUERY_LOTE_POSTGRES = """
+    SELECT cod_empresa, numero_nf, nfe_chave, nfe_status,
+           nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
+    FROM vendas
+    WHERE numero_nf = ANY($1)
+    AND serie_nf = ANY($2)
+    AND cod_empresa = ANY($3)
+"""
+
+QUERY_FAIXA_POSTGRES = """
+    SELECT cod_empresa, numero_nf, nfe_chave, nfe_status,
+           nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
+    FROM vendas
+    WHERE serie_nf = $1
+    AND numero_nf BETWEEN $2 AND $3
+    AND cod_empresa = ANY($4)
+"""
+
+# Conversão dos valores (texto) para o tipo do parâmetro no PostgreSQL; demais tipos recebem str
+_PG_CONVERTERS = {
+    'int2': int,
+    'int4': int,
+    'int8': int,
+    'numeric': decimal.Decimal,
+}
+
+
+def run_sync(coro):
+    """
+    Executa a corrotina até o fim e retorna o resultado, para chamadores síncronos.
+    Se a thread atual já tiver um event loop rodando, usa um loop novo em outra thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+def database_name(config):
+    """Nome do banco usado como chave nos resultados (nome, dbname ou caminho do .FDB)."""
+    return config.get('nome') or config.get('dbname') or config.get('path') or ''
+
+
+def _host_key(config):
+    """Servidor do banco: análises no mesmo servidor dividem o limite de concorrência."""
+    if config.get('tipo') == 'nuvem':
+        conn_config = logic._config_conexao_postgres(config)
+        return f"postgres:{conn_config['host']}:{conn_config['port']}"
+    return f"firebird:{config.get('host', 'localhost')}"
+
+
+async def analyze_databases(configs, texto_bruto, lista_series, lista_empresas,
+                            max_per_host=MAX_CONCURRENT_PER_HOST):
+    """
+    Executa a análise avançada em todos os bancos concorrentemente.
+
+    Args:
+        configs (list): Configurações de banco (mesmo formato de executar_analise_db_avancada)
+        texto_bruto (str): Texto com lista de cupons
+        lista_series (list): Lista de séries
+        lista_empresas (list): Lista de códigos de empresa
+        max_per_host (int): Análises simultâneas por servidor
+
+    Returns:
+        dict: {'resultados_por_banco': {nome: resultado}, 'erro': None}
+    """
+    semaphores = {}
+
+    async def _run(config):
+        semaphore = semaphores.setdefault(_host_key(config), asyncio.Semaphore(max(1, max_per_host)))
+        async with semaphore:
+            try:
+                return await analyze_database(config, texto_bruto, lista_series, lista_empresas)
+            except Exception as e:
+                return {
+                    'erro': f'Erro na análise: {str(e)}',
+                    'total_processados': 0
+                }
+
+    resultados = await asyncio.gather(*(_run(config) for config in configs))
+
+    return {
+        'resultados_por_banco': {database_name(config): resultado for config, resultado in zip(configs, resultados)},
+        'erro': None
+    }
+
+
+async def analyze_database(config, texto_bruto, lista_series, lista_empresas):
+    """
+    Análise avançada de um único banco (versão assíncrona de logic.executar_analise_db_avancada).
+
+    Returns:
+        dict: Mesmo formato de logic.executar_analise_db_avancada
+    """
+    tipo = config.get('tipo')
+    usar_asyncpg = tipo == 'nuvem' and asyncpg is not None
+    usar_isql = tipo == 'local' and firebird_isql._find_isql() is not None
+
+    if not (usar_asyncpg or usar_isql):
+        # Sem driver assíncrono: caminho síncrono (psycopg2/fdb) numa thread do executor
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, logic.executar_analise_db_avancada, config, texto_bruto, lista_series, lista_empresas
+        )
+
+    cupons_com_serie = logic._extrair_cupons_com_serie(texto_bruto)
+    if not cupons_com_serie:
+        return {
+            'erro': 'Nenhum cupom válido encontrado no texto.',
+            'total_processados': 0
+        }
+
+    resultados_por_serie = {}
+    cupons_por_numero = logic._agrupar_cupons_por_numero(cupons_com_serie)
+    numeros = sorted(cupons_por_numero)
+    faixas, avulsos = logic._separar_faixas_contiguas(numeros, logic.TAMANHO_MINIMO_FAIXA, logic.TAMANHO_MAXIMO_FAIXA)
+
+    def classificar(numero, resultados):
+        for cupom, serie_origem in cupons_por_numero[numero]:
+            logic._processar_resultados_analise(resultados, cupom, serie_origem, lista_series, resultados_por_serie)
+
+    inicio = time.perf_counter()
+    if usar_asyncpg:
+        await _analyze_postgres(config, faixas, avulsos, lista_series, lista_empresas, classificar)
+    else:
+        unidades = logic._montar_unidades_firebird(faixas, avulsos, lista_series, lista_empresas)
+        nao_consultados, erro = await _analyze_firebird(config, unidades, classificar)
+        if nao_consultados:
+            # Como no caminho síncrono: sem resultado parcial, erro com os cupons que ficaram de fora
+            cupons = [cupom for numero in nao_consultados for cupom, _ in cupons_por_numero[numero]]
+            return logic._resultado_cupons_nao_consultados(cupons, erro)
+
+    logger.info(f"Análise assíncrona ({database_name(config)}): {len(numeros)} cupons em "
+                f"{time.perf_counter() - inicio:.2f}s")
+
+    resultados_por_serie = logic._ordenar_resultados_por_cupom(resultados_por_serie, cupons_com_serie, lista_series)
+
+    return {
+        'total_processados': len(cupons_com_serie),
+        'resultados_por_serie': resultados_por_serie,
+        'series': sorted(resultados_por_serie.keys()),
+        'erro': None
+    }
+
+
+async def _analyze_postgres(config, faixas, avulsos, lista_series, lista_empresas, classificar):
+    """Consulta faixas (BETWEEN por série) e lotes (ANY) numa conexão asyncpg e classifica cada unidade."""
+    conn_config = logic._config_conexao_postgres(config)
+    series = [str(serie).strip() for serie in lista_series]
+    empresas = [str(empresa).strip() for empresa in lista_empresas]
+
+    # Unidades: (consultas, números cobertos), como no caminho síncrono
+    unidades = []
+    for faixa in faixas:
+        unidades.append(([(QUERY_FAIXA_POSTGRES, (serie, faixa[0], faixa[-1], empresas)) for serie in series], faixa))
+    for lote in logic._dividir_em_lotes(avulsos, logic.TAMANHO_LOTE_POSTGRES):
+        unidades.append(([(QUERY_LOTE_POSTGRES, (lote, series, empresas))], lote))
+
+    conn = await asyncpg.connect(
+        host=conn_config['host'],
+        port=conn_config['port'],
+        user=conn_config['user'],
+        password=conn_config['password'],
+        database=conn_config['dbname']
+    )
+    statements = {}
+    try:
+        for consultas, numeros_unidade in unidades:
+            linhas_por_numero = {}
+            for query, params in consultas:
+                statement = statements.get(query)
+                if statement is None:
+                    statement = statements[query] = await conn.prepare(query)
+                rows = await statement.fetch(*_typed_params(statement, params))
+                logic._agrupar_por_numero((tuple(row) for row in rows), linhas_por_numero, set(numeros_unidade))
+            for numero in numeros_unidade:
+                classificar(numero, linhas_por_numero.get(numero, []))
+    finally:
+        await conn.close()
+
+
+def _typed_params(statement, params):
+    """
+    Converte os parâmetros (texto) para os tipos que o PostgreSQL deduziu no prepare
+    (ex: numero_nf inteiro -> int('000000123') = 123), elemento a elemento nos arrays.
+    """
+    values = []
+    for param_type, value in zip(statement.get_parameters(), params):
+        if param_type.kind == 'array':
+            convert = _PG_CONVERTERS.get(param_type.name.lstrip('_'), str)
+            values.append([convert(item) for item in value])
+        else:
+            values.append(_PG_CONVERTERS.get(param_type.name, str)(value))
+    return values
+
+
+async def _analyze_firebird(config, unidades, classificar):
+    """
+    Envia todas as unidades a um processo isql assíncrono e classifica cada uma assim que
+    o sentinela correspondente é lido. Unidades com erro, e as que ficaram sem resposta porque
+    o isql encerrou antes do fim, não são classificadas: seus números são devolvidos.
+    Os valores são convertidos pelos tipos das colunas de VENDAS (column_decoders), como no
+    backend isql síncrono; os metadados vêm no primeiro grupo do mesmo script.
+
+    Returns:
+        tuple: (números não consultados, em ordem crescente; primeiro erro ou None)
+    """
+    isql_path = firebird_isql._find_isql()
+    # Grupo 0: metadados de VENDAS; depois um grupo de consultas por unidade,
+    # cada um seguido do sentinela RS_BOUNDARY_<n> (n = índice da unidade + 1)
+    script = firebird_isql._build_boundary_script(
+        [[firebird_isql._interpolate_params(firebird_isql.COLUMN_TYPES_QUERY, ['VENDAS'])]] +
+        [[firebird_isql._interpolate_params(query, params) for query, params in consultas] for consultas, _ in unidades]
+    )
+    encoding = locale.getpreferredencoding(False)
+
+    # Linha de comando fora do event loop: na primeira vez testa o acesso embarcado ao banco
+    cmd = await asyncio.get_running_loop().run_in_executor(None, firebird_isql._isql_command, isql_path, config)
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,  # Erros no mesmo fluxo para ficarem antes do sentinela
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+
+    async def _write_script():
+        try:
+            process.stdin.write(script.encode(encoding, errors='replace'))
+            await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Processo encerrado: as unidades sem sentinela são tratadas na leitura
+
+    # Escrita em paralelo com a leitura (evita travar com os dois pipes cheios)
+    writer = asyncio.ensure_future(_write_script())
+    types = {}
+    concluidas = set()
+    erros = {}  # {índice da unidade: mensagem}
+    splitter = firebird_isql._BoundarySplitter()
+    try:
+        while True:
+            try:
+                raw = await asyncio.wait_for(process.stdout.readline(), ISQL_LINE_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise Exception(f"Erro no ISQL: tempo limite de {ISQL_LINE_TIMEOUT}s excedido")
+            if not raw:
+                break
+
+            completed = splitter.feed(raw.decode(encoding, errors='replace'))
+            if completed is None:
+                continue
+
+            idx, linhas, erro = completed
+            if idx == 0:
+                # Sem metadados (erro) os valores ficam str, como numa tabela desconhecida
+                if not erro:
+                    types = firebird_isql.column_decoders(firebird_isql._iter_list_rows(linhas, as_tuple=True))
+                continue
+            idx -= 1
+            numeros_unidade = unidades[idx][1]
+            concluidas.add(idx)
+            if erro:
+                # Cupons de unidades com erro ficam sem classificação (e entram no erro da análise)
+                erros[idx] = chr(10).join(erro).strip()
+                logger.error(f"Erro na consulta {idx+1} ({numeros_unidade[0]} a {numeros_unidade[-1]}): {erros[idx]}")
+                continue
+            rows = firebird_isql._iter_list_rows(linhas, types, as_tuple=True)
+            linhas_por_numero = logic._agrupar_por_numero(rows, None, set(numeros_unidade))
+            for numero in numeros_unidade:
+                classificar(numero, linhas_por_numero.get(numero, []))
+
+        await writer
+        await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        writer.cancel()
+
+    saida = chr(10).join(splitter.pending()).strip()
+    if unidades and not concluidas:
+        # Nenhum resultado: tipicamente falha ao conectar (servidor parado, senha inválida)
+        raise Exception(f"Erro no ISQL: {saida or 'processo encerrado sem resposta'}")
+    if len(concluidas) < len(unidades):
+        faltantes = len(unidades) - len(concluidas)
+        logger.error(f"ISQL encerrou antes do fim ({database_name(config)}): {faltantes} unidade(s) sem resultado\n{saida}")
+        for idx in range(len(unidades)):
+            if idx not in concluidas:
+                erros[idx] = f"ISQL encerrou antes do fim: {saida or 'sem resposta'}"
+
+    nao_consultados = sorted(numero for idx in erros for numero in unidades[idx][1])
+    return nao_consultados, erros[min(erros)] if erros else None
@@ -0,0 +1,610 @@
+"""
+Substituto do isql do Firebird para desenvolvimento e benchmarks sem servidor Firebird.
+
+Executa os scripts num banco SQLite com uma cópia da tabela vendas, aceitando os mesmos
+argumentos do isql (-user, -password, -i, -z, DSN 'host:"caminho"') e o script pelo stdin,
+e imprime a saída no formato do isql: SET LIST ON (coluna com padding + valor, '<null>',
+linha em branco antes de cada registro), SET HEADING OFF, prompts SQL>/CON> quando lê do
+stdin e erros 'Statement failed, SQLSTATE = ...'. Com ele dá para medir localmente o custo
+de iniciar processos, do parse da saída e dos lotes de firebird_isql / firebird_backend.
+
+Uso:
+    python fake_isql.py --create vendas_teste.db --rows 200000   # gera o banco SQLite
+    FIREBIRD_ISQL=/caminho/fake_isql.py python app.py            # descoberta aponta para o fake
+    (no banco local da configuração, 'path' = caminho do arquivo SQLite)
+
+Variáveis de ambiente:
+- FAKE_ISQL_STARTUP_MS: latência simulada de inicialização/conexão, em ms (padrão 0)
+- FAKE_ISQL_STATEMENT_MS: latência simulada por comando SQL, em ms (padrão 0)
+- FAKE_ISQL_PASSWORD: se definida, senhas diferentes são recusadas como no servidor
+
+SQL suportado: o que o SQLite aceita (o subconjunto usado pela aplicação é compatível), mais
+RDB$DATABASE, RDB$GET_CONTEXT, os metadados RDB$RELATIONS / RDB$RELATION_FIELDS / RDB$FIELDS,
+SET TERM, EXECUTE BLOCK sem variáveis e GLOBAL TEMPORARY TABLE (ON COMMIT DELETE ROWS).
+"""
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+
+ENV_STARTUP_MS = 'FAKE_ISQL_STARTUP_MS'
+ENV_STATEMENT_MS = 'FAKE_ISQL_STATEMENT_MS'
+ENV_PASSWORD = 'FAKE_ISQL_PASSWORD'
+
+VERSION = 'WI-V3.0.7.33374 Firebird 3.0 (fake_isql/SQLite)'
+ENGINE_VERSION = '3.0.7'
+
+# Largura do nome da coluna no SET LIST ON (identificadores de até 31 caracteres + espaço)
+LIST_NAME_WIDTH = 31
+
+_NULL = '<null>'
+
+# DSN 'host:caminho' (host com 2+ caracteres, para não confundir com a letra do drive 'C:')
+_DSN_HOST = re.compile(r'^[^:"\\/]{2,}:(.*)$')
+
+_IDENTIFIER = re.compile(r'^[A-Za-z][\w$]*$')
+_FUNCTION_CALL = re.compile(r'^([A-Za-z][\w$]*)\s*\(')
+
+_SET_TERM = re.compile(r'^SET\s+TERM\s+(\S+)$', re.IGNORECASE)
+
+# EXECUTE BLOCK sem parâmetros nem variáveis: só uma sequência de comandos entre BEGIN e END
+_EXECUTE_BLOCK = re.compile(r'^EXECUTE\s+BLOCK\s+AS\s+BEGIN\b(.*)\bEND$', re.IGNORECASE | re.DOTALL)
+
+_CREATE_GTT = re.compile(r'^CREATE\s+GLOBAL\s+TEMPORARY\s+TABLE\s+([\w$]+)\s*(\(.*\))\s*'
+                         r'ON\s+COMMIT\s+(DELETE|PRESERVE)\s+ROWS$', re.IGNORECASE | re.DOTALL)
+
+# Tabela do SQLite com as tabelas temporárias globais criadas (a definição é permanente, como no Firebird)
+_GTT_REGISTRY = 'FAKE_ISQL$GTT'
+
+_SET_COMMAND = re.compile(r'^SET\s+(\w+)(?:\s+(\w+))?$', re.IGNORECASE)
+
+# RDB$FIELD_TYPE do Firebird pelo tipo declarado na tabela SQLite (primeiro que casar)
+_FIELD_TYPES = [
+    ('BIGINT', 16),
+    ('SMALLINT', 7),
+    ('INT', 8),
+    ('NUMERIC', 16),
+    ('DECIMAL', 16),
+    ('DOUBLE', 27),
+    ('REAL', 27),
+    ('FLOAT', 10),
+    ('TIMESTAMP', 35),
+    ('DATE', 12),
+    ('TIME', 13),
+    ('BLOB', 261),
+    ('VARCHAR', 37),
+    ('CHAR', 14),
+]
+
+# Largura de exibição do isql na saída tabular (SET LIST OFF) por tipo declarado (primeiro que casar);
+# CHAR/VARCHAR usam o tamanho declarado
+_DISPLAY_WIDTHS = [
+    ('BIGINT', 21),
+    ('SMALLINT', 7),
+    ('INT', 12),
+    ('DOUBLE', 23),
+    ('REAL', 23),
+    ('FLOAT', 14),
+    ('TIMESTAMP', 24),
+    ('DATE', 11),
+    ('TIME', 13),
+    ('BLOB', 17),
+]
+
+# Sem tipo declarado (expressões, CONCATENATION): VARCHAR(255), como em _field_type
+_DEFAULT_DISPLAY_WIDTH = 255
+
+_SCHEMA_VENDAS = """
+    CREATE TABLE vendas (
+        cod_empresa INTEGER NOT NULL,
+        serie_nf VARCHAR(3) NOT NULL,
+        numero_nf VARCHAR(9) NOT NULL,
+        nfe_chave VARCHAR(44),
+        nfe_status CHAR(1),
+        nfe_contingencia CHAR(1),
+        cancelada CHAR(1),
+        nfe_cod_resp VARCHAR(10)
+    )
+"""
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == '--create':
+        return _create_command(argv)
+
+    options = _parse_isql_args(argv)
+    _sleep_ms(os.environ.get(ENV_STARTUP_MS))
+
+    if options['version']:
+        _write(f"ISQL Version: {VERSION}\n")
+
+    session = Session(options['bail'])
+    if options['dsn']:
+        session.connect(_dsn_path(options['dsn']), options['password'])
+
+    if options['input']:
+        with open(options['input'], 'r', encoding='utf-8', errors='replace') as f:
+            session.run(f, prompts=False, source=options['input'])
+    else:
+        session.run(sys.stdin, prompts=True)
+    return 1 if session.failed else 0
+
+
+class Session:
+    """Estado de uma execução do isql: conexão SQLite, opções SET e erros ocorridos."""
+
+    def __init__(self, bail=False):
+        self.conn = None
+        self.list_mode = False
+        self.heading = True
+        self.bail = bail
+        self.failed = False
+        self.temporary_tables = set()  # GTTs ON COMMIT DELETE ROWS
+        self.statement_ms = os.environ.get(ENV_STATEMENT_MS)
+
+    def connect(self, path, password):
+        """Abre o banco SQLite (erros de conexão impressos como os do servidor Firebird)."""
+        expected = os.environ.get(ENV_PASSWORD)
+        if expected is not None and password != expected:
+            self._error('28000', ['Your user name and password are not defined. '
+                                  'Ask your database administrator to set up a Firebird login.'])
+            return
+        if not os.path.isfile(path):
+            self._error('08001', [f'I/O error during "open" operation for file "{path}"',
+                                  '-Error while trying to open file',
+                                  '-No such file or directory'])
+            return
+
+        self.conn = sqlite3.connect(path, isolation_level='DEFERRED')
+        self.conn.create_function('RDB$GET_CONTEXT', 2, _get_context)
+        _create_system_tables(self.conn)
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (_GTT_REGISTRY,)).fetchone():
+            self.temporary_tables = {row[0] for row in self.conn.execute(
+                f'SELECT name FROM "{_GTT_REGISTRY}" WHERE delete_rows = 1')}
+
+    def run(self, stream, prompts, source=None):
+        """Lê e executa os comandos do script até o fim ou QUIT/EXIT."""
+        for statement, line_number in _iter_statements(stream, prompts):
+            if not self._execute(statement, line_number, source):
+                break
+        if self.conn is not None:
+            self.conn.close()
+
+    def _execute(self, statement, line_number, source):
+        """Executa um comando. Retorna False para encerrar (QUIT/EXIT ou erro com BAIL)."""
+        command = ' '.join(statement.split()).upper()
+
+        if command in ('QUIT', 'EXIT'):
+            if self.conn is not None:
+                (self._commit if command == 'EXIT' else self.conn.rollback)()
+            return False
+
+        match = _SET_COMMAND.match(command)
+        if match:
+            option, value = match.groups()
+            if option == 'LIST':
+                self.list_mode = value != 'OFF'
+            elif option == 'HEADING':
+                self.heading = value != 'OFF'
+            elif option == 'BAIL':
+                self.bail = value != 'OFF'
+            return True  # Demais SET (STATS, PLAN, ...) não alteram a saída aqui
+
+        if self.conn is None:
+            self._error('08001', ['Use CONNECT or CREATE DATABASE to specify a database'])
+            return not self.bail
+
+        _sleep_ms(self.statement_ms)
+        try:
+            if command in ('COMMIT', 'ROLLBACK'):
+                (self._commit if command == 'COMMIT' else self.conn.rollback)()
+                return True
+            block = _EXECUTE_BLOCK.match(statement)
+            if block:
+                # Comandos do bloco, em sequência e na transação atual
+                for inner, _ in _iter_statements(block.group(1).splitlines(True), prompts=False):
+                    self.conn.execute(inner)
+                return True
+            gtt = _CREATE_GTT.match(statement)
+            if gtt:
+                self._create_temporary_table(*gtt.groups())
+                return True
+            cursor = self.conn.execute(statement)
+            if cursor.description:
+                names = [_column_name(column[0]) for column in cursor.description]
+                if self.list_mode:
+                    _write_list(names, cursor)
+                else:
+                    expressions = [column[0] for column in cursor.description]
+                    _write_table(names, expressions, cursor.fetchall(), self.heading, _declared_types(self.conn))
+        except sqlite3.Error as e:
+            details = ['Dynamic SQL Error', '-SQL error code = -204' if 'no such' in str(e) else '-SQL error code = -104',
+                       f'-{e}']
+            if source:
+                details.append(f'After line {line_number} in file {source}')
+            self._error(_sqlstate(e), details)
+            return not self.bail
+        sys.stdout.flush()
+        return True
+
+    def _commit(self):
+        """COMMIT: linhas das GTTs ON COMMIT DELETE ROWS são apagadas antes de confirmar (nunca persistem)."""
+        for table in self.temporary_tables:
+            self.conn.execute(f'DELETE FROM "{table}"')
+        self.conn.commit()
+
+    def _create_temporary_table(self, name, columns, on_commit):
+        """GLOBAL TEMPORARY TABLE: tabela comum do SQLite registrada em _GTT_REGISTRY."""
+        name = name.upper()
+        self.conn.execute(f'CREATE TABLE "{name}" {columns}')
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{_GTT_REGISTRY}" (name TEXT PRIMARY KEY, delete_rows INTEGER)')
+        self.conn.execute(f'INSERT INTO "{_GTT_REGISTRY}" VALUES (?, ?)', (name, int(on_commit.upper() == 'DELETE')))
+        self.conn.execute("INSERT INTO RDB$RELATIONS VALUES (?, 0)", (name,))
+        if on_commit.upper() == 'DELETE':
+            self.temporary_tables.add(name)
+
+    def _error(self, sqlstate, lines):
+        """Erro no stderr, no formato do isql ('Statement failed, SQLSTATE = ...' + detalhes)."""
+        self.failed = True
+        sys.stdout.flush()
+        sys.stderr.write(f"Statement failed, SQLSTATE = {sqlstate}\n" + ''.join(f"{line}\n" for line in lines))
+        sys.stderr.flush()
+
+
+def _iter_statements(stream, prompts):
+    """
+    Gera (comando, número da linha final) do script, separando pelo terminador (';', ou o
+    definido por SET TERM) fora de aspas.
+    Lendo do stdin, imprime 'SQL> ' antes de cada comando e 'CON> ' a cada linha de continuação,
+    sem quebra de linha, como o isql (a saída do comando vem logo depois na mesma linha).
+    """
+    buffer = []
+    quote = None
+    terminator = ';'
+    line_number = 0
+
+    if prompts:
+        _write('SQL> ')
+    for line in stream:
+        line_number += 1
+        start = 0
+        i = 0
+        while i < len(line):
+            char = line[i]
+            if quote:
+                if char == quote:
+                    quote = None
+            elif char in ("'", '"'):
+                quote = char
+            elif line.startswith(terminator, i):
+                buffer.append(line[start:i])
+                statement = ''.join(buffer).strip()
+                buffer = []
+                i += len(terminator)
+                start = i
+                if statement:
+                    match = _SET_TERM.match(statement)
+                    if match:
+                        terminator = match.group(1)  # Tratado aqui: muda a separação dos próximos comandos
+                    else:
+                        yield statement, line_number
+                    if prompts:
+                        _write('SQL> ')
+                continue
+            i += 1
+
+        rest = line[start:]
+        if rest.strip() or quote:
+            buffer.append(rest)
+            if prompts:
+                _write('CON> ')
+
+
+def _write_list(names, cursor):
+    """SET LIST ON: linha em branco e um par 'NOME<padding> valor' por coluna em cada registro."""
+    for row in cursor:
+        parts = ['\n']
+        for name, value in zip(names, row):
+            parts.append(f"{name:<{LIST_NAME_WIDTH}} {_format_value(value)}\n")
+        _write(''.join(parts))
+
+
+def _write_table(names, expressions, rows, heading, declared):
+    """
+    Saída tabular (SET LIST OFF): cada coluna com a largura do tipo, como o isql, e cabeçalho opcional.
+
+    Args:
+        names (list): Nomes das colunas
+        expressions (list): Texto de cada coluna no SELECT (para a largura de expressões)
+        rows (list): Linhas do cursor
+        heading (bool): SET HEADING ON
+        declared (dict): Tipo declarado por nome de coluna (ver _declared_types)
+    """
+    values = [[_format_value(value) for value in row] for row in rows]
+    numeric = [all(isinstance(row[i], (int, float)) or row[i] is None for row in rows) for i in range(len(names))]
+    widths = []
+    for i, name in enumerate(names):
+        width = _expression_width(expressions[i]) or _display_width(declared.get(name), [row[i] for row in rows])
+        # O isql alarga a coluna para o nome no cabeçalho; valores nunca passam da largura do tipo
+        widths.append(max([width, len(name) if heading else 0] + [len(row[i]) for row in values]))
+
+    def _line(cells):
+        return ' '.join(cell.rjust(width) if is_numeric else cell.ljust(width)
+                        for cell, width, is_numeric in zip(cells, widths, numeric)) + '\n'
+
+    parts = ['\n']
+    if heading:
+        parts.append(' '.join(name.ljust(width) for name, width in zip(names, widths)) + '\n')
+        parts.append(' '.join('=' * width for width in widths) + '\n')
+    parts.extend(_line(row) for row in values)
+    _write(''.join(parts))
+
+
+def _declared_types(conn):
+    """Tipo declarado de cada coluna das tabelas do banco (nome em maiúsculas), para a largura tabular."""
+    declared = {}
+    for schema in ('main', 'temp'):
+        tables = [row[0] for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            for _, name, column_type, *_ in conn.execute(f'PRAGMA {schema}.table_info("{table}")'):
+                declared.setdefault(name.upper(), column_type)
+    return declared
+
+
+def _expression_width(expression):
+    """
+    Largura de uma concatenação (||), como o Firebird a declara: soma das larguras dos operandos.
+    Cada operando vale o tamanho do literal ou o maior CHAR/VARCHAR(n) e literal dentro dele
+    (ex.: COALESCE(CAST(x AS VARCHAR(9)), '<null>') -> 9). None se não for concatenação ou se
+    algum operando não tiver largura conhecida.
+    """
+    operands, depth, quoted, start = [], 0, False, 0
+    for i, char in enumerate(expression):
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char in '()':
+            depth += 1 if char == '(' else -1
+        elif not quoted and depth == 0 and expression.startswith('||', i) and i >= start:
+            operands.append(expression[start:i])
+            start = i + 2
+    if not operands:
+        return None
+    operands.append(expression[start:])
+    
+    total = 0
+    for operand in operands:
+        literals = [len(text) for text in re.findall(r"'((?:[^']|'')*)'", operand)]
+        sizes = [int(n) for n in re.findall(r'CHAR\s*\(\s*(\d+)\s*\)', operand, re.IGNORECASE)]
+        if not literals and not sizes:
+            return None
+        total += max(literals + sizes)
+    return total
+
+
+def _display_width(declared, values):
+    """
+    Largura da coluna na saída tabular: pelo tipo declarado ou, em expressões, pelo tipo dos valores.
+
+    Args:
+        declared (str | None): Tipo declarado da coluna de mesmo nome, se houver
+        values (list): Valores da coluna
+
+    Returns:
+        int: Largura em caracteres
+    """
+    declared = (declared or '').upper()
+    if declared:
+        sizes = re.findall(r'\d+', declared)
+        if 'CHAR' in declared:
+            return int(sizes[0]) if sizes else 1
+        for name, width in _DISPLAY_WIDTHS:
+            if name in declared:
+                return width
+        if ('NUMERIC' in declared or 'DECIMAL' in declared) and sizes:
+            return int(sizes[0]) + 2  # Sinal e ponto decimal
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, int) for value in present):
+        # INTEGER ou, fora da faixa de 32 bits, BIGINT
+        return 12 if all(-2**31 <= value < 2**31 for value in present) else 21
+    if present and all(isinstance(value, (int, float)) for value in present):
+        return 23
+    return _DEFAULT_DISPLAY_WIDTH
+
+
+def _column_name(name):
+    """Nome da coluna como o Firebird dá: expressões sem alias viram o nome da função, CONCATENATION etc."""
+    if _IDENTIFIER.match(name):
+        return name.upper()
+    function = _FUNCTION_CALL.match(name)
+    if function:
+        return function.group(1).upper()
+    if '||' in name:
+        return 'CONCATENATION'
+    return ''
+
+
+def _format_value(value):
+    if value is None:
+        return _NULL
+    if isinstance(value, bytes):
+        # BLOB: id do blob e conteúdo na linha seguinte, como o isql faz com BLOB de texto
+        return f"0:1\n{value.decode('utf-8', errors='replace')}"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _sqlstate(error):
+    message = str(error)
+    if 'no such table' in message:
+        return '42S02'
+    if 'no such column' in message:
+        return '42S22'
+    if isinstance(error, sqlite3.IntegrityError):
+        return '23000'
+    return '42000'
+
+
+def _get_context(namespace, name):
+    """RDB$GET_CONTEXT: só as variáveis de SYSTEM usadas pela aplicação."""
+    if namespace == 'SYSTEM' and name == 'ENGINE_VERSION':
+        return ENGINE_VERSION
+    return None
+
+
+def _create_system_tables(conn):
+    """Tabelas de sistema (temporárias) do Firebird usadas pela aplicação, montadas do schema SQLite."""
+    conn.executescript("""
+        CREATE TEMP TABLE RDB$DATABASE (RDB$RELATION_ID INTEGER);
+        INSERT INTO RDB$DATABASE VALUES (128);
+        CREATE TEMP TABLE RDB$RELATIONS (RDB$RELATION_NAME VARCHAR(63), RDB$SYSTEM_FLAG INTEGER);
+        CREATE TEMP TABLE RDB$RELATION_FIELDS (
+            RDB$RELATION_NAME VARCHAR(63), RDB$FIELD_NAME VARCHAR(63),
+            RDB$FIELD_SOURCE VARCHAR(63), RDB$FIELD_POSITION INTEGER
+        );
+        CREATE TEMP TABLE RDB$FIELDS (
+            RDB$FIELD_NAME VARCHAR(63), RDB$FIELD_TYPE INTEGER,
+            RDB$FIELD_SCALE INTEGER, RDB$FIELD_LENGTH INTEGER, RDB$CHARACTER_LENGTH INTEGER
+        );
+    """)
+
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                             "AND name NOT LIKE 'sqlite%' AND name <> ?", (_GTT_REGISTRY,))]
+    source = 0
+    for table in tables:
+        conn.execute("INSERT INTO RDB$RELATIONS VALUES (?, 0)", (table.upper(),))
+        for position, name, declared, *_ in conn.execute(f'PRAGMA table_info("{table}")'):
+            source += 1
+            field_type, scale, length = _field_type(declared)
+            conn.execute("INSERT INTO RDB$RELATION_FIELDS VALUES (?, ?, ?, ?)",
+                         (table.upper(), name.upper(), f'RDB${source}', position))
+            # RDB$CHARACTER_LENGTH só existe para CHAR/VARCHAR (NULL nos demais tipos)
+            characters = length if field_type in (14, 37) else None
+            conn.execute("INSERT INTO RDB$FIELDS VALUES (?, ?, ?, ?, ?)",
+                         (f'RDB${source}', field_type, scale, length, characters))
+
+
+def _field_type(declared):
+    """(RDB$FIELD_TYPE, RDB$FIELD_SCALE, RDB$FIELD_LENGTH) de um tipo declarado no SQLite."""
+    declared = (declared or '').upper()
+    sizes = [int(n) for n in re.findall(r'\d+', declared)]
+    for name, field_type in _FIELD_TYPES:
+        if name in declared:
+            scale = -sizes[1] if name in ('NUMERIC', 'DECIMAL') and len(sizes) > 1 else 0
+            length = sizes[0] if name in ('VARCHAR', 'CHAR') and sizes else 8
+            return field_type, scale, length
+    return 37, 0, 255  # Sem tipo declarado: VARCHAR
+
+
+def _parse_isql_args(argv):
+    """Argumentos do isql usados pela aplicação; os demais são ignorados."""
+    options = {'user': None, 'password': None, 'input': None, 'version': False, 'bail': False, 'dsn': None}
+    with_value = {'-user': 'user', '-u': 'user', '-password': 'password', '-pas': 'password', '-p': 'password',
+                  '-input': 'input', '-i': 'input'}
+    args = iter(argv)
+    for arg in args:
+        flag = arg.lower()
+        if flag in with_value:
+            options[with_value[flag]] = next(args, None)
+        elif flag == '-z':
+            options['version'] = True
+        elif flag in ('-bail', '-b'):
+            options['bail'] = True
+        elif not arg.startswith('-'):
+            options['dsn'] = arg
+    return options
+
+
+def _dsn_path(dsn):
+    """Caminho do banco no DSN ('localhost:"C:\\dados\\base.fdb"' -> C:\\dados\\base.fdb)."""
+    match = _DSN_HOST.match(dsn)
+    path = match.group(1) if match else dsn
+    return path.strip().strip('"')
+
+
+def _sleep_ms(value):
+    try:
+        milliseconds = float(value or 0)
+    except ValueError:
+        return
+    if milliseconds > 0:
+        time.sleep(milliseconds / 1000)
+
+
+def _write(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def create_database(path, rows=100000, series=('1',), empresas=(1,), seed=0):
+    """
+    Cria (ou recria) o banco SQLite com uma tabela vendas sintética.
+
+    Para cada empresa e série, os números 1..rows com ~2% de buracos (cupons não encontrados)
+    e status variados: autorizadas ('A'/100), canceladas ('C'/101), inutilizadas ('I')
+    e erro de envio (E0001).
+
+    Args:
+        path (str): Arquivo SQLite
+        rows (int): Números por empresa e série
+        series (iterable): Séries
+        empresas (iterable): Códigos de empresa
+        seed (int): Semente do gerador (mesmo banco a cada execução)
+    """
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.unlink(path)
+
+    def _rows():
+        for empresa in empresas:
+            for serie in series:
+                for numero in range(1, rows + 1):
+                    sorteio = rng.random()
+                    if sorteio < 0.02:
+                        continue  # Buraco na sequência
+                    chave = ''.join(rng.choice('0123456789') for _ in range(44))
+                    if sorteio < 0.93:
+                        status, resp, cancelada = 'A', '100', 'N'
+                    elif sorteio < 0.96:
+                        status, resp, cancelada = 'C', '101', 'S'
+                    elif sorteio < 0.97:
+                        status, resp, cancelada, chave = 'I', '102', 'N', None
+                    else:
+                        status, resp, cancelada, chave = 'E', 'E0001', 'N', None
+                    yield (empresa, str(serie), str(numero).zfill(9), chave, status,
+                           'N', cancelada, resp)
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(_SCHEMA_VENDAS)
+        conn.executemany("INSERT INTO vendas VALUES (?, ?, ?, ?, ?, ?, ?, ?)", _rows())
+        conn.execute("CREATE INDEX ix_vendas_serie_numero ON vendas (serie_nf, numero_nf)")
+        conn.execute("CREATE INDEX ix_vendas_numero ON vendas (numero_nf)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _create_command(argv):
+    parser = argparse.ArgumentParser(prog='fake_isql.py', description='Gera o banco SQLite usado pelo fake_isql.')
+    parser.add_argument('--create', metavar='ARQUIVO', required=True, help='arquivo SQLite a criar')
+    parser.add_argument('--rows', type=int, default=100000, help='números por empresa e série')
+    parser.add_argument('--series', default='1', help='séries separadas por vírgula')
+    parser.add_argument('--empresas', default='1', help='empresas separadas por vírgula')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    create_database(args.create, args.rows, args.series.split(','),
+                    [int(empresa) for empresa in args.empresas.split(',')], args.seed)
+    print(f"{args.create}: vendas criada em {time.perf_counter() - inicio:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
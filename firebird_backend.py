@@ -0,0 +1,515 @@
+"""
+Camada de acesso Firebird com seleção automática de backend.
+
+- fdb (driver nativo, in-process): statements preparados e leitura com fetchmany.
+  Latência por consulta de sub-milissegundo, mas depende de um fbclient com a mesma
+  arquitetura (32/64 bits) do Python.
+- isql (subprocesso, via firebird_isql.IsqlSession): usado quando o driver não é utilizável.
+
+O teste de carga do driver é feito uma vez por máquina e o resultado fica em cache
+(memória + arquivo JSON ao lado da aplicação).
+"""
+
+import contextlib
+import ctypes
+import json
+import os
+import platform
+import re
+import struct
+import sys
+import threading
+import time
+
+import firebird_discovery
+import firebird_isql
+import logging_utils
+
+try:
+    import fdb
+except ImportError:
+    fdb = None
+
+logger = logging_utils.get_logger()
+
+# Linhas lidas por chamada de fetchmany no backend fdb
+FETCH_SIZE = 1000
+
+# Validade (segundos) do resultado do teste do driver gravado em cache
+PROBE_CACHE_TTL = 7 * 24 * 3600
+
+# Sessões adicionais (workers paralelos) permitidas ao mesmo tempo por banco,
+# para não sobrecarregar o banco do PDV em uso
+MAX_PARALLEL_SESSIONS_PER_DATABASE = 3
+
+# Primeira tabela do FROM (para buscar os tipos das colunas no backend isql)
+_FROM_TABLE = re.compile(r'\bFROM\s+([A-Za-z_][\w$]*)', re.IGNORECASE)
+
+# Duração alvo (segundos) de cada consulta em lote; o tamanho do lote se ajusta para chegar perto dela
+TARGET_CALL_SECONDS = 2.0
+
+# Timeout de uma consulta: TIMEOUT_FACTOR x a duração prevista pelo tamanho do lote, entre os limites
+TIMEOUT_FACTOR = 5
+MIN_TIMEOUT = 10
+MAX_TIMEOUT = 300
+
+# Tipos de consulta medidos pelo AdaptiveBatchSize: lotes IN (definem o tamanho do lote) e faixas BETWEEN
+BATCH = 'batch'
+RANGE = 'range'
+
+# Inserts por EXECUTE BLOCK na carga de tabelas temporárias (texto do bloco abaixo de 64 KB)
+EXECUTE_BLOCK_ROWS = 500
+
+PROBE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'firebird_backend_cache.json')
+
+_probe_result = None
+_probe_lock = threading.Lock()
+
+_database_slots = {}
+_database_slots_lock = threading.Lock()
+
+# (banco, tabela) de tabelas temporárias globais já verificadas/criadas neste processo
+_temporary_tables = set()
+_temporary_tables_lock = threading.Lock()
+
+
+def _machine_key():
+    """Identifica máquina + arquitetura do Python (o resultado do teste depende dos dois)."""
+    return f"{platform.node()}|{struct.calcsize('P') * 8}bit|py{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def _load_probe_cache():
+    try:
+        with open(PROBE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            entry = json.load(f).get(_machine_key())
+        if entry and time.time() - entry.get('verificado_em', 0) < PROBE_CACHE_TTL:
+            return entry
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def _save_probe_cache(entry):
+    try:
+        try:
+            with open(PROBE_CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[_machine_key()] = entry
+        with open(PROBE_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    except OSError as e:
+        logger.debug(f"Não foi possível gravar cache do backend Firebird: {e}")
+
+
+def fdb_usable():
+    """
+    Indica se o driver fdb consegue carregar o fbclient nesta máquina
+    (biblioteca encontrada e com a mesma arquitetura do Python).
+    """
+    global _probe_result
+
+    with _probe_lock:
+        if _probe_result is not None:
+            return _probe_result['fdb_ok']
+
+        if fdb is None:
+            _probe_result = {'fdb_ok': False, 'erro': 'Módulo fdb não instalado'}
+            return False
+
+        # fbclient no PATH antes de qualquer carga da biblioteca (teste ou conexão)
+        firebird_discovery.prepare_client()
+
+        entry = _load_probe_cache()
+        if entry is None:
+            try:
+                fdb.fbcore.load_api()
+                entry = {'fdb_ok': True, 'erro': None}
+            except Exception as e:
+                # Tipicamente: fbclient não encontrado ou arquitetura 32/64 bits diferente
+                entry = {'fdb_ok': False, 'erro': str(e)}
+            entry['verificado_em'] = time.time()
+            _save_probe_cache(entry)
+            logger.info(f"Backend Firebird: driver fdb {'utilizável' if entry['fdb_ok'] else 'indisponível'}"
+                        f"{'' if entry['fdb_ok'] else ' (' + entry['erro'] + ')'}")
+
+        _probe_result = entry
+        return entry['fdb_ok']
+
+
+class FdbBackend:
+    """Backend in-process via fdb, com cache de statements preparados."""
+
+    name = 'fdb'
+
+    def __init__(self, config):
+        self.config = config
+        self._conn = None
+
+        def _try_embedded():
+            try:
+                self._conn = self._connect(firebird_discovery.ACCESS_EMBEDDED)
+                return True
+            except Exception as e:
+                logger.debug(f"fdb: acesso embarcado indisponível ({e})")
+                return False
+
+        # Embarcado (arquivo aberto direto, sem servidor) quando possível; ver firebird_discovery.access_mode
+        mode = firebird_discovery.access_mode(config, _try_embedded)
+        if self._conn is None:
+            try:
+                self._conn = self._connect(mode)
+            except Exception:
+                if mode != firebird_discovery.ACCESS_EMBEDDED or (config.get('modo_firebird') or 'auto') != 'auto':
+                    raise
+                # Arquivo passou a ser usado por um servidor: volta para localhost
+                firebird_discovery.set_access_mode(config, firebird_discovery.ACCESS_SERVER)
+                self._conn = self._connect(firebird_discovery.ACCESS_SERVER)
+        self._cursor = self._conn.cursor()
+        self._prepared = {}
+
+    def _connect(self, mode):
+        return fdb.connect(
+            dsn=firebird_discovery.database_dsn(self.config, mode),
+            user=self.config.get('user'),
+            password=self.config.get('password'),
+            charset='UTF8'
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def fetch_rows(self, query_sql, params=None, timeout=None):
+        """Executa a query (placeholders '?') e retorna lista de tuplas na ordem do SELECT."""
+        return list(self.iter_rows(query_sql, params, timeout))
+
+    def iter_rows(self, query_sql, params=None, timeout=None):
+        """
+        Executa a query (placeholders '?') e gera as tuplas em blocos de FETCH_SIZE (fetchmany).
+        A mesma query é preparada uma única vez por conexão.
+
+        Args:
+            timeout (float): Opcional. Espera máxima pelo execute e por cada fetchmany; ao estourar,
+                             a operação é cancelada no servidor e QueryTimeout é lançada
+                             (a conexão continua utilizável)
+        """
+        statement = self._prepared.get(query_sql)
+        if statement is None:
+            statement = self._cursor.prep(query_sql)
+            self._prepared[query_sql] = statement
+
+        with self._watchdog(timeout):
+            self._cursor.execute(statement, params or ())
+
+        while True:
+            with self._watchdog(timeout):
+                batch = self._cursor.fetchmany(FETCH_SIZE)
+            if not batch:
+                break
+            for row in batch:
+                yield tuple(row)
+
+    @contextlib.contextmanager
+    def _watchdog(self, timeout):
+        """
+        Cancela a operação em andamento na conexão se ela passar de `timeout` segundos
+        (fb_cancel_operation, feito para ser chamado de outra thread) e a converte em QueryTimeout.
+        """
+        if not timeout:
+            yield
+            return
+
+        lock = threading.Lock()
+        state = {'done': False, 'expired': False}
+
+        def _cancel():
+            # Sob o lock: o cancelamento nunca atinge uma operação posterior à vigiada
+            with lock:
+                if state['done']:
+                    return
+                state['expired'] = True
+                self._cancel_operation()
+
+        timer = threading.Timer(timeout, _cancel)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        except Exception as e:
+            if state['expired']:
+                raise QueryTimeout(f"Erro no fdb: tempo limite de {timeout:g}s excedido") from e
+            raise
+        finally:
+            timer.cancel()
+            with lock:
+                state['done'] = True
+
+    def _cancel_operation(self):
+        """Pede ao servidor que aborte a operação atual desta conexão (fb_cancel_raise)."""
+        api = fdb.fbcore.api
+        status = fdb.ibase.ISC_STATUS_ARRAY()
+        api.client_library.fb_cancel_operation(status, ctypes.byref(self._conn._db_handle),
+                                               fdb.ibase.fb_cancel_raise)
+        if status[0] == 1 and status[1]:
+            logger.debug(f"fdb: cancelamento da consulta não aceito (código {status[1]})")
+
+    def execute_statement(self, query_sql, params=None, timeout=None):
+        """Executa um comando sem result set (DDL, INSERT, EXECUTE BLOCK) na transação atual (timeout como em iter_rows)."""
+        with self._watchdog(timeout):
+            self._cursor.execute(query_sql, params or ())
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        try:
+            self._prepared.clear()
+            self._conn.close()
+        except Exception:
+            pass
+
+
+class IsqlBackend(firebird_isql.IsqlSession):
+    """
+    Backend via subprocesso isql (sessão persistente), com a mesma interface do FdbBackend.
+    Os valores são convertidos pelos tipos das colunas da tabela do FROM (metadados lidos
+    uma vez por sessão): NULL -> None, inteiros -> int, NUMERIC -> Decimal.
+    SELECTs só com colunas dessa tabela usam o modo compacto do isql (firebird_isql.compact_query),
+    com as larguras das colunas tiradas dos mesmos metadados.
+    """
+
+    name = 'isql'
+
+    def fetch_rows(self, query_sql, params=None, timeout=None, types=None):
+        """Executa a query (placeholders '?' ou %s) e retorna lista de tuplas na ordem do SELECT."""
+        return list(self.iter_rows(query_sql, params, timeout, types))
+
+    def iter_rows(self, query_sql, params=None, timeout=None, types=None):
+        """
+        Executa a query e gera as tuplas à medida que o isql as imprime.
+
+        Args:
+            timeout (float): Opcional. Espera máxima por linha (QueryTimeout ao estourar)
+            types (dict): Opcional. {COLUNA: conversor} para esta query; sem ele, usa os tipos
+                          da tabela do FROM (colunas com alias ou de outras tabelas ficam str)
+        """
+        match = _FROM_TABLE.search(query_sql)
+        table = match.group(1) if match else None
+        if not table or table.upper().startswith('RDB$'):
+            table = None
+        if types is None:
+            types = self.table_types(table) if table else {}
+        widths = self.table_widths(table) if table else None
+        return self.execute_iter(query_sql, params, types=types, as_tuple=True, timeout=timeout, widths=widths)
+
+    def commit(self):
+        self.execute_statement("COMMIT")
+
+
+# Timeout de consulta (isql); exposto aqui para quem usa os backends
+QueryTimeout = firebird_isql.QueryTimeout
+
+
+class AdaptiveBatchSize:
+    """
+    Tamanho de lote adaptativo (AIMD) para consultas Firebird: cresce `step` itens a cada
+    consulta abaixo de TARGET_CALL_SECONDS e cai pela metade quando passa do alvo ou estoura
+    o tempo. Também estima a latência por item (média móvel) para escalar os timeouts,
+    separada por tipo de consulta ('batch' para lotes IN, 'range' para varreduras BETWEEN...).
+    Seguro para uso por várias threads.
+    """
+
+    def __init__(self, initial, minimum, maximum, step, target_seconds=TARGET_CALL_SECONDS):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.target_seconds = target_seconds
+        self._size = max(minimum, min(maximum, initial))
+        self._seconds_per_item = {}  # {tipo de consulta: segundos por item}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        with self._lock:
+            return self._size
+
+    def record(self, items, seconds, kind=BATCH):
+        """
+        Registra uma consulta concluída com `items` itens em `seconds` segundos.
+        Só consultas do tipo BATCH ajustam o tamanho do lote; as demais atualizam apenas
+        a latência do seu próprio tipo (varreduras por faixa custam bem menos por item).
+        """
+        with self._lock:
+            per_item = seconds / max(1, items)
+            previous = self._seconds_per_item.get(kind)
+            if previous is None:
+                self._seconds_per_item[kind] = per_item
+            else:
+                self._seconds_per_item[kind] = 0.7 * previous + 0.3 * per_item
+
+            if kind == BATCH:
+                if seconds > self.target_seconds:
+                    self._size = max(self.minimum, self._size // 2)
+                else:
+                    self._size = min(self.maximum, self._size + self.step)
+
+    def record_timeout(self, items, kind=BATCH):
+        """Consulta com `items` itens estourou o tempo: lote cai para menos da metade dela."""
+        if kind != BATCH:
+            return
+        with self._lock:
+            self._size = max(self.minimum, min(self._size, items // 2))
+
+    def timeout_for(self, items, kind=BATCH):
+        """
+        Timeout (segundos) para uma consulta de `items` itens do tipo `kind`;
+        None antes da primeira medição desse tipo.
+        """
+        with self._lock:
+            seconds_per_item = self._seconds_per_item.get(kind)
+            if seconds_per_item is None:
+                return None
+            expected = seconds_per_item * items
+        return max(MIN_TIMEOUT, min(MAX_TIMEOUT, TIMEOUT_FACTOR * expected))
+
+
+def load_temporary_table(session, table, columns, rows, timeout=None):
+    """
+    Carrega linhas numa GLOBAL TEMPORARY TABLE (ON COMMIT DELETE ROWS), criando a tabela se
+    ainda não existir, com um EXECUTE BLOCK a cada EXECUTE_BLOCK_ROWS inserts.
+    A consulta que usa a tabela deve rodar na mesma transação; session.commit() a esvazia.
+
+    Args:
+        session: FdbBackend ou IsqlBackend
+        table (str): Nome da tabela temporária
+        columns (list): [(coluna, tipo SQL)]; usados só na criação (ver column_sql_types)
+        rows (iterable): Tuplas de valores na ordem de columns
+        timeout (float): Opcional. Tempo máximo de cada bloco (backend isql)
+
+    Returns:
+        int: Quantidade de linhas carregadas
+    """
+    _ensure_temporary_table(session, table, columns)
+
+    insert = f"INSERT INTO {table} ({', '.join(name for name, _ in columns)}) VALUES "
+    total = 0
+    block = []
+    for row in rows:
+        block.append(f"{insert}({', '.join(_sql_literal(value) for value in row)});\n")
+        if len(block) == EXECUTE_BLOCK_ROWS:
+            session.execute_statement(f"EXECUTE BLOCK AS\nBEGIN\n{''.join(block)}END", timeout=timeout)
+            total += len(block)
+            block = []
+    if block:
+        session.execute_statement(f"EXECUTE BLOCK AS\nBEGIN\n{''.join(block)}END", timeout=timeout)
+        total += len(block)
+    return total
+
+
+def column_sql_types(session, table):
+    """
+    Tipos SQL declarados das colunas de uma tabela ({COLUNA: 'VARCHAR(9)'}), lidos de
+    RDB$RELATION_FIELDS pela própria sessão (fdb ou isql).
+    """
+    return firebird_isql.column_sql_types(session.fetch_rows(firebird_isql.COLUMN_TYPES_QUERY, [table.upper()]))
+
+
+def _ensure_temporary_table(session, table, columns):
+    """Cria a tabela temporária global se ela não existir (verificado uma vez por banco e processo)."""
+    key = (os.path.normcase(os.path.abspath(session.config.get('path', ''))), table.upper())
+    with _temporary_tables_lock:
+        if key in _temporary_tables:
+            return
+
+    rows = session.fetch_rows("SELECT COUNT(*) FROM RDB$RELATIONS WHERE RDB$RELATION_NAME = ?", [table.upper()])
+    if not int(rows[0][0]):
+        definition = ', '.join(f"{name} {sql_type} NOT NULL" for name, sql_type in columns)
+        session.execute_statement(f"CREATE GLOBAL TEMPORARY TABLE {table} ({definition}) ON COMMIT DELETE ROWS")
+        session.commit()  # DDL só pode ser usada depois de confirmada
+        logger.info(f"Firebird: tabela temporária global {table} criada")
+
+    with _temporary_tables_lock:
+        _temporary_tables.add(key)
+
+
+def _sql_literal(value):
+    """Valor como literal SQL (texto entre aspas simples, com aspas internas duplicadas)."""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def open_backend(config):
+    """
+    Abre o backend Firebird mais rápido disponível: fdb se o driver for utilizável
+    e conseguir conectar; caso contrário, sessão isql.
+
+    Returns:
+        FdbBackend ou IsqlBackend (ambos context managers com fetch_rows/close)
+    """
+    if fdb_usable():
+        try:
+            return FdbBackend(config)
+        except Exception as e:
+            logger.warning(f"fdb não conseguiu conectar ({e}). Usando isql.")
+    return IsqlBackend(config)
+
+
+def _slots_for(config):
+    """Semáforo de sessões paralelas do banco (um por arquivo .FDB)."""
+    key = os.path.normcase(os.path.abspath(config.get('path', '')))
+    with _database_slots_lock:
+        if key not in _database_slots:
+            _database_slots[key] = threading.BoundedSemaphore(MAX_PARALLEL_SESSIONS_PER_DATABASE)
+        return _database_slots[key]
+
+
+@contextlib.contextmanager
+def open_parallel_sessions(config, count):
+    """
+    Abre até `count` sessões adicionais para workers paralelos, respeitando o limite
+    MAX_PARALLEL_SESSIONS_PER_DATABASE por banco (sem esperar: se o limite já estiver
+    em uso por outra análise, abre menos sessões). Cada sessão é testada antes do uso; se
+    uma não conectar, a análise segue só com as que já estão abertas (erro apenas no log).
+    Fecha todas ao sair do bloco.
+
+    Uso:
+        with open_parallel_sessions(config, 2) as sessions:
+            ...
+    """
+    if not fdb_usable() and firebird_discovery.access_mode(config) == firebird_discovery.ACCESS_EMBEDDED:
+        # Cada sessão isql é um processo com seu próprio engine embarcado, que abre o arquivo
+        # com exclusividade: sessões adicionais não conseguiriam conectar
+        count = 0
+
+    slots = _slots_for(config)
+    sessions = []
+    try:
+        for _ in range(max(0, count)):
+            if not slots.acquire(blocking=False):
+                break
+            session = None
+            try:
+                session = open_backend(config)
+                # O isql conecta só no primeiro comando: a sessão precisa responder antes de receber unidades
+                session.fetch_rows("SELECT 1 FROM RDB$DATABASE", timeout=MIN_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Firebird: sessão paralela indisponível ({e}). "
+                               f"Seguindo com {len(sessions)} sessão(ões) adicional(is).")
+                if session is not None:
+                    session.close()
+                slots.release()
+                break
+            sessions.append(session)
+        yield sessions
+    finally:
+        for session in sessions:
+            session.close()
+            slots.release()
@@ -0,0 +1,413 @@
+"""
+Descoberta da instalação do Firebird: isql, biblioteca cliente (fbclient), versão e arquitetura.
+
+A busca nos diretórios de instalação é feita uma vez e gravada em cache (arquivo JSON ao lado
+da aplicação). Nas execuções seguintes o cache é apenas revalidado (os arquivos ainda existem?)
+na primeira consulta do processo; depois disso o resultado fica em memória.
+
+Variáveis de ambiente (têm prioridade sobre a busca):
+- FIREBIRD_ISQL: caminho do isql
+- FIREBIRD_CLIENT: caminho da biblioteca cliente (fbclient.dll / libfbclient.so)
+- FIREBIRD_HOME: diretório de instalação do Firebird (procurado antes dos locais padrão)
+
+Também decide o modo de acesso a cada banco local (access_mode): servidor via DSN 'localhost:'
+sempre que houver um servidor Firebird local aceitando conexões (o engine embarcado prenderia o
+arquivo e poderia bloquear o ERP); embarcado, abrindo o arquivo direto pelo engine do Firebird 3+
+(sem servidor nem TCP), só quando não há servidor, o plugin do engine está instalado e nenhum
+outro processo tem o arquivo aberto.
+
+FIREBIRD_ISQL também pode apontar para um script Python (ex: fake_isql.py, substituto com SQLite
+para desenvolvimento e benchmarks), executado com o interpretador atual.
+"""
+
+import glob
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import logging_utils
+
+logger = logging_utils.get_logger()
+
+# Validade (segundos) de uma descoberta gravada em cache
+CACHE_TTL = 30 * 24 * 3600
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'firebird_discovery_cache.json')
+
+ENV_ISQL = 'FIREBIRD_ISQL'
+ENV_CLIENT = 'FIREBIRD_CLIENT'
+ENV_HOME = 'FIREBIRD_HOME'
+
+# Modos de acesso a um banco local
+ACCESS_EMBEDDED = 'embedded'
+ACCESS_SERVER = 'server'
+
+# Porta do servidor Firebird local (modo automático: servidor ouvindo -> acesso via servidor)
+SERVER_PORT = 3050
+SERVER_PROBE_TIMEOUT = 0.5
+
+if os.name == 'nt':
+    _ISQL_NAMES = ['isql.exe']
+    _CLIENT_NAMES = ['fbclient.dll']
+    # Diretórios de instalação (a partir do Firebird 3 isql e fbclient ficam na raiz, antes em bin\)
+    # Plugin do engine embarcado (Firebird 3: Engine12, Firebird 4/5: Engine13)
+    _ENGINE_NAMES = ['engine13.dll', 'engine12.dll']
+    _INSTALL_PATTERNS = [
+        r'C:\Program Files\Firebird\Firebird_*',
+        r'C:\Program Files (x86)\Firebird\Firebird_*',
+        r'C:\Program Files\Firebird',
+        r'C:\Program Files (x86)\Firebird',
+        r'C:\Firebird*',
+    ]
+else:
+    _ISQL_NAMES = ['isql-fb', 'isql']
+    _CLIENT_NAMES = ['libfbclient.so.2', 'libfbclient.so']
+    _ENGINE_NAMES = ['libEngine13.so', 'libEngine12.so']
+    _INSTALL_PATTERNS = ['/opt/firebird', '/usr/lib/firebird/*', '/usr/local/firebird']
+
+_installation = None
+_lock = threading.Lock()
+_client_prepared = False
+
+_access_modes = {}  # Caminho normalizado do banco -> modo confirmado por uma conexão
+_access_lock = threading.Lock()
+
+
+def get_installation():
+    """
+    Retorna a instalação do Firebird encontrada (cache em memória / arquivo, ou nova busca).
+
+    Returns:
+        dict: {'isql': caminho ou None, 'fbclient': caminho ou None, 'engine': caminho ou None,
+               'versao': str ou None,
+               'bits': 32/64 ou None, 'verificado_em': timestamp}
+    """
+    global _installation
+
+    with _lock:
+        if _installation is None:
+            _installation = _load_or_discover()
+        return _installation
+
+
+def isql_path():
+    """Caminho do isql (None se não encontrado)."""
+    return get_installation()['isql']
+
+
+def fbclient_path():
+    """Caminho da biblioteca cliente fbclient (None se não encontrada)."""
+    return get_installation()['fbclient']
+
+
+def embedded_engine_path():
+    """Caminho do plugin do engine embarcado (None se não instalado: só acesso via servidor)."""
+    return get_installation().get('engine')
+
+
+def access_mode(config, try_embedded=None):
+    """
+    Modo de acesso ao banco local de config (ACCESS_EMBEDDED ou ACCESS_SERVER).
+
+    - config['modo_firebird'] = 'embarcado' ou 'servidor' força o modo ('auto' = padrão)
+    - automático: servidor se houver um servidor Firebird local ouvindo (ele pode servir o arquivo;
+      abri-lo embarcado prenderia o arquivo durante a sessão e poderia bloquear o ERP), se o engine
+      embarcado não estiver instalado ou se o arquivo estiver em uso por outro processo; senão, embarcado.
+      Com try_embedded (função que tenta abrir o banco embarcado e retorna True/False), a escolha
+      é confirmada e fica em memória para as próximas conexões ao mesmo banco.
+      A escolha do servidor também fica em memória (sem repetir a sonda TCP a cada conexão);
+      o embarcado sem try_embedded não, pois ainda não foi confirmado.
+    """
+    forced = (config.get('modo_firebird') or 'auto').lower()
+    if forced == 'embarcado':
+        return ACCESS_EMBEDDED
+    if forced == 'servidor':
+        return ACCESS_SERVER
+
+    key = _database_key(config.get('path', ''))
+    with _access_lock:
+        if key in _access_modes:
+            return _access_modes[key]
+
+    if not embedded_engine_path() or _server_running() or _file_in_use(config.get('path', '')):
+        set_access_mode(config, ACCESS_SERVER)
+        return ACCESS_SERVER
+    if try_embedded is None:
+        return ACCESS_EMBEDDED
+
+    mode = ACCESS_EMBEDDED if try_embedded() else ACCESS_SERVER
+    set_access_mode(config, mode)
+    logger.info(f"Firebird: {os.path.basename(config.get('path', ''))} acessado "
+                f"{'direto pelo engine embarcado' if mode == ACCESS_EMBEDDED else 'via servidor (localhost)'}")
+    return mode
+
+
+def set_access_mode(config, mode):
+    """Registra o modo de acesso que funcionou para o banco (ex: após falha no embarcado)."""
+    with _access_lock:
+        _access_modes[_database_key(config.get('path', ''))] = mode
+
+
+def database_dsn(config, mode=None):
+    """DSN do fdb para o banco: o próprio caminho no modo embarcado, 'localhost:caminho' no servidor."""
+    path = config.get('path', '')
+    if (mode or access_mode(config)) == ACCESS_EMBEDDED:
+        return path
+    return f"localhost:{path}"
+
+
+def _database_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _server_running():
+    """Há um servidor Firebird local aceitando conexões na SERVER_PORT."""
+    try:
+        with socket.create_connection(('127.0.0.1', SERVER_PORT), timeout=SERVER_PROBE_TIMEOUT):
+            return True
+    except OSError:
+        return False
+
+
+def _file_in_use(path):
+    """
+    Arquivo aberto com exclusividade por outro processo (servidor Firebird ou aplicação com
+    engine embarcado). No Linux o Firebird usa travas POSIX (fcntl), testadas com lockf.
+    Só chamado antes da primeira conexão deste processo ao banco: fechar o arquivo libera as
+    travas POSIX que o próprio processo tiver nele.
+    """
+    try:
+        with open(path, 'r+b') as f:
+            if os.name != 'nt':
+                import fcntl
+                try:
+                    fcntl.lockf(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.lockf(f, fcntl.LOCK_UN)
+                except OSError:
+                    return True
+        return False
+    except PermissionError:
+        # Windows: compartilhamento negado pelo servidor. Sem permissão de escrita o
+        # engine embarcado também não abriria o arquivo
+        return True
+    except OSError:
+        return False
+
+
+def launch_command(path):
+    """Início da linha de comando para executar o isql em `path` (scripts .py rodam com o Python atual)."""
+    if path.lower().endswith('.py'):
+        return [sys.executable, path]
+    return [path]
+
+
+def refresh():
+    """Descarta o cache e refaz a busca (ex: Firebird instalado com a aplicação aberta)."""
+    global _installation
+
+    with _lock:
+        _installation = _discover(_env_overrides())
+        _save_cache(_installation)
+        return _installation
+
+
+def prepare_client():
+    """
+    Coloca o diretório do fbclient no PATH (e define FIREBIRD_HOME) para o driver fdb
+    carregar a biblioteca. Idempotente; chamar antes do primeiro uso do fdb.
+    """
+    global _client_prepared
+
+    if _client_prepared:
+        return
+    _client_prepared = True
+
+    client = fbclient_path()
+    if not client:
+        return
+
+    client_dir = os.path.dirname(client)
+    os.environ.setdefault(ENV_HOME, os.path.dirname(client_dir) if os.path.basename(client_dir).lower() == 'bin' else client_dir)
+    if client_dir not in os.environ.get('PATH', ''):
+        os.environ['PATH'] = client_dir + os.pathsep + os.environ.get('PATH', '')
+
+
+def _env_overrides():
+    return {name: os.environ.get(name, '') for name in (ENV_ISQL, ENV_CLIENT, ENV_HOME)}
+
+
+def _load_or_discover():
+    overrides = _env_overrides()
+    entry = _load_cache()
+    if (entry and entry.get('overrides') == overrides
+            and time.time() - entry.get('verificado_em', 0) < CACHE_TTL
+            and _still_valid(entry)):
+        return entry
+
+    entry = _discover(overrides)
+    _save_cache(entry)
+    return entry
+
+
+def _still_valid(entry):
+    """
+    Revalidação barata do cache: os arquivos encontrados continuam lá. Ferramentas que não
+    foram encontradas (None) não invalidam o cache; uma nova busca por elas só acontece
+    quando o CACHE_TTL vence (ou via refresh()).
+    """
+    return ('engine' in entry  # Cache de versão anterior, sem o engine embarcado
+            and all(os.path.isfile(entry[key]) for key in ('isql', 'fbclient', 'engine') if entry.get(key)))
+
+
+def _discover(overrides):
+    """Procura isql e fbclient (variáveis de ambiente, registro do Windows, locais padrão, PATH)."""
+    directories = _candidate_directories(overrides[ENV_HOME])
+
+    isql = overrides[ENV_ISQL] if os.path.isfile(overrides[ENV_ISQL]) else _find_file(_ISQL_NAMES, directories)
+    client = overrides[ENV_CLIENT] if os.path.isfile(overrides[ENV_CLIENT]) else _find_file(_CLIENT_NAMES, directories)
+
+    entry = {
+        'isql': isql,
+        'fbclient': client,
+        'engine': _find_engine(client, isql),
+        'versao': _isql_version(isql) if isql else None,
+        'bits': _binary_bits(client) if client else None,
+        'overrides': overrides,
+        'verificado_em': time.time(),
+    }
+    logger.info(f"Firebird: isql={isql or 'não encontrado'}, fbclient={client or 'não encontrado'}, "
+                f"engine embarcado={entry['engine'] or 'não encontrado'}, "
+                f"versão={entry['versao'] or '?'}, {entry['bits'] or '?'} bits")
+    return entry
+
+
+def _candidate_directories(home):
+    """Diretórios onde procurar, em ordem de prioridade (cada instalação: raiz e bin)."""
+    roots = []
+    if home:
+        roots.append(home)
+    roots.extend(_registry_instances())
+    for pattern in _INSTALL_PATTERNS:
+        roots.extend(sorted(glob.glob(pattern), reverse=True))  # Versão mais nova primeiro
+
+    directories = []
+    for root in roots:
+        for directory in (root, os.path.join(root, 'bin')):
+            if directory not in directories and os.path.isdir(directory):
+                directories.append(directory)
+    return directories
+
+
+def _registry_instances():
+    """Diretórios das instâncias registradas pelo instalador do Firebird (somente Windows)."""
+    if os.name != 'nt':
+        return []
+    try:
+        import winreg
+    except ImportError:
+        return []
+
+    roots = []
+    for view in (winreg.KEY_WOW64_64KEY, winreg.KEY_WOW64_32KEY):
+        try:
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                                r'SOFTWARE\Firebird Project\Firebird Server\Instances',
+                                0, winreg.KEY_READ | view) as key:
+                root, _ = winreg.QueryValueEx(key, 'DefaultInstance')
+                if root and root not in roots:
+                    roots.append(root)
+        except OSError:
+            pass
+    return roots
+
+
+def _find_file(names, directories):
+    for directory in directories:
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return path
+    # Último recurso: PATH do sistema (só o nome principal: 'isql' sozinho pode ser de outro programa)
+    return shutil.which(names[0])
+
+
+def _find_engine(*binaries):
+    """Plugin do engine embarcado na pasta plugins da instalação do fbclient/isql (Firebird 3+)."""
+    for binary in binaries:
+        if not binary:
+            continue
+        directory = os.path.dirname(binary)
+        for root in (directory, os.path.dirname(directory)):  # Raiz da instalação ou pasta acima de bin
+            for name in _ENGINE_NAMES:
+                path = os.path.join(root, 'plugins', name)
+                if os.path.isfile(path):
+                    return path
+    return None
+
+
+def _isql_version(isql):
+    """Versão do Firebird informada por 'isql -z' (ex: 'WI-V3.0.7.33374')."""
+    try:
+        result = subprocess.run(
+            launch_command(isql) + ['-z'],
+            input='QUIT;\n',
+            capture_output=True,
+            text=True,
+            timeout=10,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        match = re.search(r'ISQL Version:\s*(\S+)', result.stdout + result.stderr)
+        return match.group(1) if match else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _binary_bits(path):
+    """Arquitetura (32/64) da biblioteca pelo cabeçalho PE (Windows) ou ELF."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(4096)
+        if header[:2] == b'MZ':
+            pe_offset = struct.unpack_from('<I', header, 0x3C)[0]
+            if header[pe_offset:pe_offset + 4] == b'PE\0\0':
+                machine = struct.unpack_from('<H', header, pe_offset + 4)[0]
+                return {0x14C: 32, 0x8664: 64, 0xAA64: 64}.get(machine)
+        elif header[:4] == b'\x7fELF':
+            return {1: 32, 2: 64}.get(header[4])
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def _machine_key():
+    return platform.node()
+
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get(_machine_key())
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _save_cache(entry):
+    try:
+        try:
+            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[_machine_key()] = entry
+        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    except OSError as e:
+        logger.debug(f"Não foi possível gravar cache da instalação Firebird: {e}")
@@ -7,23 +7,93 @@ import subprocess
 import os
 import tempfile
 import re
+import threading
+import queue
+import uuid
+import decimal
+
+import firebird_discovery
+
+# Linha de SET LIST ON: nome da coluna e valor (vazio se só houver a coluna)
+_LIST_LINE = re.compile(r'^(\S+)(?:\s+(.*))?$')
+
+# Marcador de NULL na saída do isql
+_NULL = '<null>'
+
+# RDB$FIELD_TYPE: SMALLINT, INTEGER, BIGINT, INT128 (com escala negativa: NUMERIC/DECIMAL)
+_INTEGER_TYPES = {7, 8, 16, 26}
+# RDB$FIELD_TYPE: FLOAT, DOUBLE PRECISION
+_FLOAT_TYPES = {10, 27}
+
+# RDB$FIELD_TYPE: CHAR, VARCHAR (largura = RDB$CHARACTER_LENGTH)
+_TEXT_TYPES = {14, 37}
+
+# Largura (caracteres) de cada tipo convertido em texto no modo compacto; inteiros com escala
+# (NUMERIC/DECIMAL) ganham uma posição para o ponto decimal
+_DISPLAY_WIDTHS = {7: 6, 8: 11, 16: 20, 26: 40, 10: 15, 27: 24, 12: 10, 13: 13, 35: 24, 23: 5}
+
+# Declaração SQL de cada RDB$FIELD_TYPE (column_sql_types); CHAR/VARCHAR recebem o tamanho e
+# inteiros com escala viram NUMERIC com a precisão máxima do tipo de armazenamento
+_SQL_TYPE_NAMES = {7: 'SMALLINT', 8: 'INTEGER', 16: 'BIGINT', 26: 'INT128', 10: 'FLOAT',
+                   27: 'DOUBLE PRECISION', 12: 'DATE', 13: 'TIME', 35: 'TIMESTAMP', 23: 'BOOLEAN',
+                   14: 'CHAR', 37: 'VARCHAR'}
+_NUMERIC_PRECISION = {7: 4, 8: 9, 16: 18, 26: 38}
+
+# Modo compacto: separador entre valores (improvável nos dados), também no início e no fim
+# de cada linha de dados
+_COMPACT_SEPARATOR = '|~|'
+
+# Modo compacto só quando a linha (completada com espaços pelo isql até a largura declarada)
+# não passa do que o SET LIST ON gasta só com os nomes das colunas (32 caracteres por coluna)
+_LIST_NAME_WIDTH = 32
+
+# SELECT com lista de colunas simples ([tabela.]coluna) e a tabela do FROM (com alias opcional)
+_SIMPLE_SELECT = re.compile(r'^\s*SELECT\s+(DISTINCT\s+)?(.*?)\s+(FROM\s.*)$', re.IGNORECASE | re.DOTALL)
+_SELECT_ITEM = re.compile(r'^(?:([A-Za-z_][\w$]*)\.)?([A-Za-z_][\w$]*)$')
+_FROM_CLAUSE = re.compile(r'^FROM\s+([A-Za-z_][\w$]*)(?:\s+(?:AS\s+)?([A-Za-z_][\w$]*))?', re.IGNORECASE)
+_NOT_ALIAS = {'WHERE', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'NATURAL', 'ON', 'ORDER', 'GROUP',
+              'HAVING', 'UNION', 'PLAN', 'ROWS', 'FOR', 'WITH'}
+
+# Id de BLOB ('80:1e0') impresso antes do conteúdo de um BLOB de texto
+_BLOB_ID = re.compile(r'^[0-9a-fA-F]+:[0-9a-fA-F]+$')
+
+# Sem conexão (attach falhou no início do isql): todo comando seguinte falha com este SQLSTATE,
+# inclusive o SELECT sentinela da IsqlSession
+_NOT_CONNECTED = re.compile(r'SQLSTATE\s*=\s*08001')
+
+# Metadados de uma tabela para column_decoders / column_widths (parâmetro: nome da tabela em maiúsculas).
+# TAMANHO: caracteres de CHAR/VARCHAR (RDB$FIELD_LENGTH é em bytes, 4 por caractere em UTF8)
+COLUMN_TYPES_QUERY = (
+    "SELECT TRIM(rf.RDB$FIELD_NAME) AS NOME, f.RDB$FIELD_TYPE AS TIPO, f.RDB$FIELD_SCALE AS ESCALA, "
+    "COALESCE(f.RDB$CHARACTER_LENGTH, f.RDB$FIELD_LENGTH) AS TAMANHO "
+    "FROM RDB$RELATION_FIELDS rf JOIN RDB$FIELDS f ON f.RDB$FIELD_NAME = rf.RDB$FIELD_SOURCE "
+    "WHERE rf.RDB$RELATION_NAME = ?"
+)
+
+# Prompts que o isql imprime ao ler comandos do stdin
+_PROMPTS = re.compile(r'^(?:(?:SQL|CON)>\s*)+')
+
+# Sentinela entre result sets de um script com várias queries (async_engine): coluna RS_BOUNDARY,
+# valor RS_BOUNDARY_<n>
+_BOUNDARY_COLUMN = 'RS_BOUNDARY'
+_BOUNDARY_LINE = re.compile(rf'^{_BOUNDARY_COLUMN}\s+RS_BOUNDARY_(\d+)$')
+
+# Scripts enviados pelo stdin do isql: None até o teste (_stdin_works); False se o isql desta
+# máquina não aceitar pipe (fica esperando o console) e os scripts precisarem de arquivo -i
+_stdin_ok = None
+_stdin_lock = threading.Lock()
+
+# Tempo máximo (segundos) do teste de entrada por pipe (SELECT trivial)
+STDIN_PROBE_TIMEOUT = 15
 
 def _find_isql():
-    """Encontra o executável isql.exe no sistema."""
-    possible_isql_paths = [
-        r'C:\Program Files (x86)\Firebird\bin\isql.exe',
-        r'C:\Program Files\Firebird\bin\isql.exe',
-        r'C:\Firebird\bin\isql.exe',
-    ]
-    
-    for path in possible_isql_paths:
-        if os.path.exists(path):
-            return path
-    return None
+    """Encontra o executável isql.exe no sistema (ver firebird_discovery; resultado em cache)."""
+    return firebird_discovery.isql_path()
 
-def test_firebird_connection_isql(database_path, user, password):
+def test_firebird_connection_isql(database_path, user, password, mode=None):
     """
     Testa conexão Firebird usando isql-fb.
+    mode: config['modo_firebird'] ('auto', 'embarcado' ou 'servidor'; ver firebird_discovery.access_mode).
     """
     try:
         isql_path = _find_isql()
@@ -33,120 +103,590 @@ def test_firebird_connection_isql(database_path, user, password):
                 'erro': 'Ferramenta isql.exe não encontrada. Verifique se o Firebird está instalado.'
             }
         
-        # Criar arquivo temporário com script SQL
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sql', delete=False) as f:
-            sql_file = f.name
-            f.write("SELECT RDB$GET_CONTEXT('SYSTEM', 'ENGINE_VERSION') FROM RDB$DATABASE;\n")
-            f.write("QUIT;\n")
+        script = ("SELECT RDB$GET_CONTEXT('SYSTEM', 'ENGINE_VERSION') FROM RDB$DATABASE;\n"
+                  "QUIT;\n")
+        config = {'path': database_path, 'user': user, 'password': password, 'modo_firebird': mode}
+        result = _run_isql_script(isql_path, config, script, timeout=10)
         
-        try:
-            # DSN com aspas para suportar espaços no caminho
-            dsn = f'localhost:"{database_path}"'
-            cmd = [isql_path, '-user', user, '-password', password, dsn, '-i', sql_file]
+        if result.returncode == 0:
+            output = result.stdout
+            version = "Desconhecida"
+            for line in output.split('\n'):
+                if line.strip() and not line.startswith('SQL>') and not line.startswith('CON>'):
+                    version = line.strip()
+                    break
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=10,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            )
-            
-            if result.returncode == 0:
-                output = result.stdout
-                version = "Desconhecida"
-                for line in output.split('\n'):
-                    if line.strip() and not line.startswith('SQL>') and not line.startswith('CON>'):
-                        version = line.strip()
-                        break
-                
-                return {
-                    'sucesso': True,
-                    'mensagem': f'Conexão estabelecida com sucesso!\n\nTipo: Firebird (via isql-fb)\nServidor: localhost\nArquivo: {os.path.basename(database_path)}\nUsuário: {user}\nVersão: {version}'
-                }
-            else:
-                # Retornar erro bruto para debug
-                return {'sucesso': False, 'erro': _parse_error(result)}
-                
-        finally:
-            try:
-                os.unlink(sql_file)
-            except:
-                pass
+            return {
+                'sucesso': True,
+                'mensagem': f'Conexão estabelecida com sucesso!\n\nTipo: Firebird (via isql-fb)\nServidor: {_server_label(config)}\nArquivo: {os.path.basename(database_path)}\nUsuário: {user}\nVersão: {version}'
+            }
+        else:
+            # Retornar erro bruto para debug
+            return {'sucesso': False, 'erro': _parse_error(result)}
                 
     except Exception as e:
         return {'sucesso': False, 'erro': f'Erro inesperado: {str(e)}'}
 
-def execute_query_isql(config, query_sql, params=None):
+def execute_query_isql(config, query_sql, params=None, as_tuple=False, widths=None):
     """
     Executa uma query SQL genérica usando isql e retorna lista de dicionários.
-    Usa 'SET LIST ON' para saída formatada chave-valor.
+    Usa 'SET LIST ON' para saída formatada chave-valor, ou o modo compacto (ver compact_query)
+    quando `widths` é informado e a query permite.
     
     Args:
         config (dict): {'path': ..., 'user': ..., 'password': ...}
         query_sql (str): Query SQL. Use placeholders %s ou ? se params fornecido (mas isql não suporta bind nativo aqui, faremos interpolação segura manual simples ou assumiremos query pronta).
                          NOTA: Para simplificar, assuma que a query já vem formatada ou faça replace básico.
         params (list/tuple): Opcional. 
+        as_tuple (bool): Tuplas na ordem do SELECT em vez de dicionários
+        widths (dict): Opcional. {COLUNA: largura} da tabela do FROM (ver column_widths)
     
     Returns:
         list[dict]: Lista de linhas retornadas.
     """
+    return list(iter_query_isql(config, query_sql, params, as_tuple=as_tuple, widths=widths))
+
+def iter_query_isql(config, query_sql, params=None, timeout=30, as_tuple=False, widths=None):
+    """
+    Versão em streaming de execute_query_isql: gera cada linha (dicionário) assim que
+    o isql a imprime, sem esperar o processo terminar nem guardar a saída inteira.
+    
+    Args:
+        config (dict): {'path': ..., 'user': ..., 'password': ...}
+        query_sql (str): Query SQL (placeholders %s ou ?)
+        params (list/tuple): Opcional
+        timeout (int): Tempo máximo (segundos) da execução inteira
+        as_tuple (bool): Tuplas na ordem do SELECT em vez de dicionários
+        widths (dict): Opcional. {COLUNA: largura} para o modo compacto (ver compact_query)
+    """
     try:
         isql_path = _find_isql()
         if not isql_path:
             raise Exception("isql.exe não encontrado")
 
-        path = config.get('path')
-        user = config.get('user')
-        password = config.get('password')
-
-        # Interpolação manual básica de parâmetros (CUIDADO com injeção em prod, mas ok para uso local controlado)
-        if params:
-            # Substituir %s ou ? pelos valores
-            # Esta é uma implementação simplificada para o caso de uso específico (inteiros e strings simples)
-            final_query = query_sql
-            for p in params:
-                val = str(p)
-                if isinstance(p, str):
-                    val = f"'{val}'"
-                final_query = final_query.replace('%s', val, 1)
-        else:
-            final_query = query_sql
+        final_query = _interpolate_params(query_sql, params).strip().rstrip(';')
+        compact = compact_query(final_query, widths) if widths else None
+
+        if compact:
+            # Uma coluna delimitada por linha, sem cabeçalho
+            script = ("SET HEADING OFF;\n"
+                      f"{compact[0]};\n"
+                      "QUIT;\n")
+            lines = _stream_isql_script(_isql_command(isql_path, config), script, timeout)
+            yield from _iter_compact_rows(lines, compact[1], as_tuple=as_tuple)
+            return
 
         # Preparar script
+        script = ("SET LIST ON;\n"  # Formato Chave: Valor
+                  f"{final_query};\n"
+                  "QUIT;\n")
+        
+        yield from _iter_list_rows(_stream_isql_script(_isql_command(isql_path, config), script, timeout),
+                                   as_tuple=as_tuple, columns=select_columns(final_query))
+
+    except Exception as e:
+        # Re-raise para tratar na logic.py
+        raise Exception(f"Erro no ISQL: {str(e)}")
+
+def _isql_command(isql_path, config):
+    """
+    Linha de comando do isql conectado ao banco de config ({'path', 'user', 'password'}).
+    No modo embarcado (firebird_discovery.access_mode) o DSN é o próprio arquivo, sem servidor;
+    na primeira vez o acesso embarcado é testado e, se falhar, fica o servidor (localhost).
+    """
+    mode = firebird_discovery.access_mode(config, lambda: _embedded_works(isql_path, config))
+    return _isql_command_for(isql_path, config, mode)
+
+def _isql_command_for(isql_path, config, mode):
+    if mode == firebird_discovery.ACCESS_EMBEDDED:
+        dsn = config.get('path')
+    else:
+        # DSN com aspas para suportar espaços no caminho
+        dsn = f'localhost:"{config.get("path")}"'
+    return firebird_discovery.launch_command(isql_path) + ['-user', config.get('user'), '-password', config.get('password'), dsn]
+
+def _embedded_works(isql_path, config):
+    """Testa se o isql abre o banco pelo engine embarcado (falha se um servidor estiver com o arquivo)."""
+    cmd = _isql_command_for(isql_path, config, firebird_discovery.ACCESS_EMBEDDED)
+    try:
+        result = _run_isql_script_file(cmd, "SELECT 1 FROM RDB$DATABASE;\nQUIT;\n", timeout=10, merge_stderr=True)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0 and 'Statement failed' not in result.stdout
+
+def _server_label(config):
+    """Servidor mostrado nas mensagens de conexão."""
+    if firebird_discovery.access_mode(config) == firebird_discovery.ACCESS_EMBEDDED:
+        return 'nenhum (engine embarcado, arquivo aberto direto)'
+    return 'localhost'
+
+def _stream_isql_script(cmd, script, timeout):
+    """
+    Executa o script e gera as linhas de saída (sem prompts) à medida que chegam.
+    Mesma escolha stdin / arquivo temporário de _run_isql_script (ver _stdin_works).
+    """
+    yield from _popen_isql_lines(cmd, script, timeout, use_file=not _stdin_works(cmd))
+
+def _popen_isql_lines(cmd, script, timeout, use_file):
+    """
+    Inicia o isql com Popen (script pelo stdin ou por arquivo -i) e gera as linhas do stdout.
+    Erros do isql ('Statement failed...') são lidos até o fim e lançados como Exception;
+    o processo é encerrado se passar do timeout (subprocess.TimeoutExpired).
+    """
+    sql_file = None
+    if use_file:
         with tempfile.NamedTemporaryFile(mode='w', suffix='.sql', delete=False) as f:
             sql_file = f.name
-            f.write("SET LIST ON;\n")  # Formato Chave: Valor
-            f.write(f"{final_query};\n")
-            f.write("QUIT;\n")
-            
+            f.write(script)
+        cmd = cmd + ['-i', sql_file]
+    
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL if use_file else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,  # Erros no mesmo fluxo, na posição em que ocorreram
+        text=True,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+    timed_out = threading.Event()
+    
+    def _on_timeout():
+        timed_out.set()
+        process.kill()
+    
+    watchdog = threading.Timer(timeout, _on_timeout)
+    watchdog.daemon = True
+    watchdog.start()
+    
+    try:
+        if not use_file:
+            # Escrita em thread: o isql pode encher o stdout antes de terminar de ler o script
+            threading.Thread(target=_feed_stdin, args=(process.stdin, script), daemon=True).start()
+        
+        error = []
+        for line in process.stdout:
+            line = _strip_prompts(line)
+            if error or _is_error_line(line):
+                error.append(line)
+                continue
+            yield line
+        
+        returncode = process.wait()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if error or returncode != 0:
+            raise Exception(_parse_error(subprocess.CompletedProcess(cmd, returncode, stdout='\n'.join(error), stderr='')))
+    finally:
+        watchdog.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        if sql_file:
+            try:
+                os.unlink(sql_file)
+            except:
+                pass
+
+def _feed_stdin(stdin, script):
+    try:
+        stdin.write(script)
+        stdin.close()
+    except OSError:
+        pass  # Processo encerrado antes de ler o script
+
+def _build_boundary_script(statements):
+    """
+    Monta um script SET LIST ON em que cada grupo de queries é seguido do SELECT sentinela
+    'RS_BOUNDARY_<n>' (n = posição do grupo), para separar os result sets na saída.
+    
+    Args:
+        statements (list): Lista de grupos; cada grupo é uma lista de queries prontas (sem parâmetros)
+    """
+    parts = ["SET LIST ON;\n"]
+    for n, group in enumerate(statements):
+        for query_sql in group:
+            parts.append(f"{query_sql.strip().rstrip(';')};\n")
+        parts.append(f"SELECT 'RS_BOUNDARY_{n}' AS {_BOUNDARY_COLUMN} FROM RDB$DATABASE;\n")
+    parts.append("QUIT;\n")
+    return ''.join(parts)
+
+class _BoundarySplitter:
+    """
+    Separa a saída de um script de _build_boundary_script em result sets, linha a linha.
+    feed() devolve (n, linhas, linhas_de_erro) quando a linha do sentinela do grupo n é lida.
+    """
+    
+    def __init__(self):
+        self._lines = []
+        self._error = []
+    
+    def feed(self, line):
+        line = _strip_prompts(line)
+        match = _BOUNDARY_LINE.match(line.strip())
+        if match:
+            completed = (int(match.group(1)), self._lines, self._error)
+            self._lines = []
+            self._error = []
+            return completed
+        
+        # Erro do isql: o restante do grupo (até o sentinela) é a mensagem
+        if self._error or _is_error_line(line):
+            self._error.append(line)
+        else:
+            self._lines.append(line)
+        return None
+    
+    def pending(self):
+        """Linhas lidas após o último sentinela (saída e erros), para mensagens de falha."""
+        return self._error + self._lines
+
+def _run_isql_script(isql_path, config, script, timeout):
+    """
+    Executa um script SQL no isql conectado ao banco de config ({'path', 'user', 'password'})
+    e retorna o subprocess.CompletedProcess (stdout sem prompts).
+    
+    O script vai pelo stdin do processo, sem arquivo temporário (em máquinas com antivírus
+    cada arquivo .sql criado é escaneado), a menos que o isql instalado não funcione com
+    entrada por pipe (ver _stdin_works); nesse caso usa um arquivo temporário (-i).
+    Estouro do timeout é lançado (subprocess.TimeoutExpired), sem repetir o script.
+    """
+    cmd = _isql_command(isql_path, config)
+    
+    if not _stdin_works(cmd):
+        return _run_isql_script_file(cmd, script, timeout)
+    
+    result = subprocess.run(
+        cmd,
+        input=script,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=timeout,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+    # Lendo do stdin o isql imprime os prompts 'SQL>'/'CON>' junto com a saída
+    result.stdout = '\n'.join(_strip_prompts(line) for line in result.stdout.split('\n'))
+    # No modo interativo o isql segue após um erro; tratar como falha igual ao modo -i
+    if result.returncode == 0 and ('Statement failed' in result.stderr or 'SQLSTATE' in result.stderr):
+        result.returncode = 1
+    return result
+
+def _stdin_works(cmd):
+    """
+    Indica se o isql desta máquina aceita o script pelo stdin. Decidido uma vez por processo com
+    um SELECT trivial: se o isql não terminar no STDIN_PROBE_TIMEOUT (esperando o console),
+    os scripts passam a ir por arquivo temporário. Falha ao conectar também termina rápido
+    e conta como pipe funcionando (o erro aparece na execução real).
+    """
+    global _stdin_ok
+    
+    with _stdin_lock:
+        if _stdin_ok is None:
+            try:
+                subprocess.run(
+                    cmd,
+                    input="SELECT 1 FROM RDB$DATABASE;\nQUIT;\n",
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    timeout=STDIN_PROBE_TIMEOUT,
+                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+                )
+                _stdin_ok = True
+            except subprocess.TimeoutExpired:
+                # Pipe não funciona: isql não aceita script pelo stdin nesta máquina
+                _stdin_ok = False
+        return _stdin_ok
+
+def _run_isql_script_file(cmd, script, timeout, merge_stderr=False):
+    """Fallback de _run_isql_script: grava o script num arquivo .sql temporário e usa 'isql -i'."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.sql', delete=False) as f:
+        sql_file = f.name
+        f.write(script)
+    
+    try:
+        return subprocess.run(
+            cmd + ['-i', sql_file],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+            text=True,
+            timeout=timeout,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+    finally:
         try:
-            # DSN com aspas para suportar espaços no caminho
-            dsn = f'localhost:"{path}"'
-            cmd = [isql_path, '-user', user, '-password', password, dsn, '-i', sql_file]
+            os.unlink(sql_file)
+        except:
+            pass
+
+def _interpolate_params(query_sql, params):
+    """
+    Interpolação manual básica de parâmetros (CUIDADO com injeção em prod, mas ok para uso local controlado).
+    Substitui cada placeholder (%s, ou ? se a query não tiver %s) pelo valor correspondente
+    (strings entre aspas simples).
+    """
+    if not params:
+        return query_sql
+    
+    placeholder = '%s' if '%s' in query_sql else '?'
+    
+    # Esta é uma implementação simplificada para o caso de uso específico (inteiros e strings simples).
+    # Montagem em partes: substituir com replace() repetido é quadrático em listas IN grandes
+    parts = query_sql.split(placeholder, len(params))
+    final_query = [parts[0]]
+    for p, part in zip(params, parts[1:]):
+        val = str(p)
+        if isinstance(p, str):
+            val = f"'{val}'"
+        final_query.append(val)
+        final_query.append(part)
+    return ''.join(final_query)
+
+class QueryTimeout(Exception):
+    """Query abortada por exceder o tempo limite (o processo isql da sessão é encerrado)."""
+
+class IsqlSession:
+    """
+    Sessão isql de longa duração: mantém um único processo isql conectado ao banco
+    e envia as queries pelo stdin, evitando iniciar processo, conectar e autenticar a cada consulta.
+    
+    Cada query é seguida de um SELECT sentinela; a leitura do stdout vai até a linha do sentinela,
+    o que delimita o result set de forma confiável. Se o processo morrer, é reiniciado na próxima query.
+    
+    Uso:
+        with IsqlSession(config) as sessao:
+            rows = sessao.execute('SELECT ...')
+    """
+    
+    _SENTINEL_COLUMN = 'RS_FIM'
+    
+    def __init__(self, config, timeout=30):
+        """
+        Args:
+            config (dict): {'path': ..., 'user': ..., 'password': ...}
+            timeout (int): Tempo máximo (segundos) de espera pelo resultado de cada query
+        """
+        self.config = config
+        self.timeout = timeout
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex[:12]
+        self._counter = 0
+        self._table_metadata = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def is_alive(self):
+        """Indica se o processo isql está rodando."""
+        return self._process is not None and self._process.poll() is None
+    
+    def _start(self):
+        """Inicia o processo isql conectado ao banco, com leitura do stdout em thread separada."""
+        isql_path = _find_isql()
+        if not isql_path:
+            raise Exception("isql.exe não encontrado")
+        
+        cmd = _isql_command(isql_path, self.config)
+        
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,  # Erros no mesmo fluxo para ficarem antes do sentinela
+            text=True,
+            bufsize=1,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        
+        # O stdout é lido por uma thread para permitir timeout na espera do sentinela
+        self._lines = queue.Queue()
+        threading.Thread(
+            target=self._read_stdout,
+            args=(self._process.stdout, self._lines),
+            daemon=True
+        ).start()
+        
+        self._write("SET LIST ON;\n")
+    
+    @staticmethod
+    def _read_stdout(stream, lines):
+        for line in iter(stream.readline, ''):
+            lines.put(line)
+        lines.put(None)  # Fim do stdout: processo encerrado
+    
+    def _write(self, text):
+        self._process.stdin.write(text)
+        self._process.stdin.flush()
+    
+    def _kill(self):
+        """Encerra o processo atual sem esperar QUIT (estado desconhecido após timeout/erro de pipe)."""
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.wait(timeout=5)
+            except Exception:
+                pass
+        self._process = None
+        self._lines = None
+    
+    def execute(self, query_sql, params=None):
+        """
+        Executa uma query na sessão e retorna lista de dicionários (mesmo formato de execute_query_isql).
+        """
+        return list(self.execute_iter(query_sql, params))
+    
+    def execute_iter(self, query_sql, params=None, types=None, as_tuple=False, timeout=None, widths=None):
+        """
+        Executa uma query na sessão e devolve as linhas (dicionários) à medida que chegam do isql,
+        sem guardar o result set inteiro em memória.
+        
+        types/as_tuple: conversores por coluna e saída em tuplas (ver _iter_list_rows).
+        widths: {COLUNA: largura} para usar o modo compacto quando a query permitir (ver compact_query).
+        timeout: espera máxima (segundos) por cada linha nesta query (padrão: self.timeout);
+                 ao estourar, o processo é encerrado e QueryTimeout é lançada.
+        
+        A sessão fica ocupada até o gerador terminar; se for fechado antes do fim,
+        o restante da saída é descartado para manter a sessão sincronizada.
+        """
+        final_query = _interpolate_params(query_sql, params).strip().rstrip(';')
+        compact = compact_query(final_query, widths) if widths else None
+        if compact:
+            # Só esta query sai sem LIST/cabeçalho; o sentinela volta a sair em SET LIST ON
+            script = f"SET LIST OFF;\nSET HEADING OFF;\n{compact[0]};\nSET HEADING ON;\nSET LIST ON;\n"
+            yield from _iter_compact_rows(self._run(script, timeout), compact[1], types, as_tuple)
+        else:
+            yield from _iter_list_rows(self._run(f"{final_query};\n", timeout), types, as_tuple,
+                                       select_columns(final_query))
+    
+    def execute_statement(self, query_sql, params=None, timeout=None):
+        """
+        Executa um comando sem result set (DDL, INSERT, COMMIT, EXECUTE BLOCK).
+        O terminador do isql é trocado (SET TERM) durante o comando, então ele pode conter ';'.
+        Erros são lançados como Exception (QueryTimeout se estourar o tempo).
+        """
+        final_query = _interpolate_params(query_sql, params).strip().rstrip(';')
+        for _ in self._run(f"SET TERM ^ ;\n{final_query}^\nSET TERM ; ^\n", timeout):
+            pass
+    
+    def _run(self, script, timeout):
+        """Envia o script seguido do SELECT sentinela e gera as linhas de saída até o sentinela."""
+        with self._lock:
+            if not self.is_alive():
+                self._start()
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30, # Timeout maior para queries pesadas
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            )
+            self._counter += 1
+            sentinel = f"RS_FIM_{self._token}_{self._counter}"
             
-            if result.returncode != 0:
-                raise Exception(_parse_error(result))
+            try:
+                self._write(f"{script}"
+                            f"SELECT '{sentinel}' AS {self._SENTINEL_COLUMN} FROM RDB$DATABASE;\n")
+            except OSError as e:
+                self._kill()
+                raise Exception(f"Erro no ISQL: processo encerrado ({e})")
             
-            return _parse_list_output(result.stdout)
+            yield from self._lines_until(sentinel, timeout or self.timeout)
+    
+    def table_metadata(self, table):
+        """
+        Metadados das colunas de uma tabela (linhas de COLUMN_TYPES_QUERY), lidos do banco
+        na primeira chamada e guardados na sessão.
+        """
+        table = table.upper()
+        if table not in self._table_metadata:
+            self._table_metadata[table] = list(self.execute_iter(COLUMN_TYPES_QUERY, [table], as_tuple=True))
+        return self._table_metadata[table]
+    
+    def table_types(self, table):
+        """Conversores de valor das colunas de uma tabela (column_decoders)."""
+        return column_decoders(self.table_metadata(table))
+    
+    def table_widths(self, table):
+        """Larguras das colunas de uma tabela no modo compacto (column_widths)."""
+        return column_widths(self.table_metadata(table))
+    
+    def _lines_until(self, sentinel, timeout):
+        """
+        Gera as linhas de saída (sem prompts) até a linha do sentinela.
+        Erros do isql ('Statement failed...') são lidos até o sentinela e lançados como Exception.
+        """
+        sentinel_line = re.compile(rf'^{self._SENTINEL_COLUMN}\s+{sentinel}$')
+        error = []
+        finished = False
+        try:
+            while True:
+                try:
+                    line = self._lines.get(timeout=timeout)
+                except queue.Empty:
+                    self._kill()
+                    raise QueryTimeout(f"Erro no ISQL: tempo limite de {timeout:g}s excedido")
+                
+                if line is None:
+                    self._kill()
+                    raise Exception("Erro no ISQL: processo encerrado inesperadamente\n" + '\n'.join(error))
+                
+                line = _strip_prompts(line)
+                if sentinel_line.match(line.strip()):
+                    finished = True
+                    break
+                
+                if error or _is_error_line(line):
+                    if _NOT_CONNECTED.search(line):
+                        # O sentinela nunca vai chegar: falhar já, com o erro do attach
+                        self._kill()
+                        raise Exception(f"Erro no ISQL: {chr(10).join(error + [line]).strip()}")
+                    error.append(line)
+                    continue
+                yield line
             
+            if error:
+                raise Exception(f"Erro no ISQL: {chr(10).join(error).strip()}")
         finally:
+            if not finished and self._lines is not None:
+                # Consumidor parou antes do fim: descartar o resto do result set
+                self._discard_until(sentinel_line)
+    
+    def _discard_until(self, sentinel_line):
+        while True:
             try:
-                os.unlink(sql_file)
-            except:
-                pass
+                line = self._lines.get(timeout=self.timeout)
+            except queue.Empty:
+                self._kill()
+                return
+            if line is None:
+                self._kill()
+                return
+            if sentinel_line.match(_strip_prompts(line).strip()):
+                return
+    
+    def close(self):
+        """Encerra a sessão enviando QUIT (ou matando o processo se não responder)."""
+        with self._lock:
+            if not self.is_alive():
+                self._process = None
+                return
+            try:
+                self._write("QUIT;\n")
+                self._process.stdin.close()
+                self._process.wait(timeout=5)
+                self._process = None
+                self._lines = None
+            except Exception:
+                self._kill()
 
-    except Exception as e:
-        # Re-raise para tratar na logic.py
-        raise Exception(f"Erro no ISQL: {str(e)}")
+def _strip_prompts(line):
+    """Remove os prompts 'SQL>'/'CON>' que o isql imprime quando lê comandos do stdin."""
+    return _PROMPTS.sub('', line.rstrip('\r\n'))
+
+def _is_error_line(line):
+    """Início de uma mensagem de erro do isql (o restante da mensagem vem nas linhas seguintes)."""
+    return line.startswith('Statement failed') or 'SQLSTATE' in line
 
 def _parse_error(result):
     """Extrai mensagem de erro amigável."""
@@ -157,46 +697,289 @@ def _parse_error(result):
         return f'Usuário ou senha inválidos (Verifique se o usuário SYSDBA existe).\nErro original: {error_msg}'
     return error_msg
 
-def _parse_list_output(output):
+def _iter_list_rows(lines, types=None, as_tuple=False, columns=None):
     """
-    Faz o parse da saída do isql com SET LIST ON.
-    Formato esperado:
+    Versão incremental do parse de SET LIST ON: recebe um iterável de linhas e gera
+    cada linha (dicionário) assim que a linha em branco que a termina é lida.
     
-    COLUNA1                         Valor
-    COLUNA2                         Valor
+    Args:
+        lines (iterable): Linhas de saída do isql
+        types (dict): Opcional. {COLUNA: conversor} (ver column_decoders); demais colunas ficam str
+        as_tuple (bool): Gerar tuplas na ordem do SELECT em vez de dicionários
+        columns (list): Opcional. Nomes das colunas do SELECT (ver select_columns); sem eles,
+                        são aprendidos no primeiro registro
     
-    COLUNA1                         Valor2
-    ...
+    - O isql alinha os valores numa coluna fixa (nome com padding); a posição é aprendida
+      na primeira linha. Linhas que não são um nome seguido de valor nessa posição são
+      continuação do valor anterior (textos/BLOBs com quebra de linha).
+    - Com as colunas conhecidas, só nomes dessas colunas abrem um campo, e a linha em branco
+      termina o registro quando todas já apareceram (antes disso é uma linha vazia dentro do valor).
+      Limitação: texto com linha em branco na última coluna é cortado nela (o resto é ignorado).
+    - No primeiro registro sem colunas informadas, a linha em branco só termina o registro se
+      a linha seguinte for a primeira coluna de novo.
+    - '<null>' vira None.
+    - Tuplas têm um valor por coluna impressa, na ordem do SELECT (inclusive colunas vazias
+      e colunas com o mesmo nome, ex.: duas expressões CONCATENATION).
     """
-    rows = []
-    current_row = {}
+    current_row = []   # Pares [coluna, partes do valor] na ordem em que o isql os imprime
+    column = None      # Partes do valor que recebem linhas de continuação
+    width = None       # Posição onde começam os valores
+    blanks = 0         # Linhas em branco ainda não atribuídas (primeiro registro, colunas desconhecidas)
     
-    lines = output.split('\n')
     for line in lines:
-        line = line.strip()
-        if not line:
-            if current_row:
-                rows.append(current_row)
-                current_row = {}
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            if not current_row:
+                continue
+            if columns is None:
+                blanks += 1  # Fim do primeiro registro ou linha vazia no valor: decide a próxima linha
+            elif len(current_row) >= len(columns):
+                yield _finish_list_row(current_row, types, as_tuple)
+                current_row = []
+                column = None
+            elif column is not None:
+                column.append('')  # Faltam colunas: a linha em branco faz parte do valor atual
             continue
             
         if line.startswith('SQL>'):
             continue
             
-        # Tentar separar chave e valor
-        # ISQL com SET LIST ON usa um número fixo de espaços ou tab, 
-        # mas geralmente a coluna tem 32 chars.
-        # Vamos tentar split no primeiro espaço longo ou apenas primeiro espaço
+        # Primeira palavra (coluna) e o resto (valor); valor vazio se só houver a coluna
+        match = None if line[0].isspace() else _LIST_LINE.match(line)
+        value_start = match.start(2) if match else -1
+        
+        if blanks:
+            if match and match.group(1) == current_row[0][0] and _aligned(value_start, width):
+                # Primeira coluna de novo: o primeiro registro acabou e define as colunas
+                columns = [name for name, _ in current_row]
+                yield _finish_list_row(current_row, types, as_tuple)
+                current_row = []
+                column = None
+            else:
+                column.extend([''] * blanks)
+            blanks = 0
+        
+        if match and column is not None:
+            if columns is None:
+                # Primeiro registro: só abre campo um nome com o valor na posição alinhada
+                aligned = _aligned(value_start, width)
+            else:
+                aligned = match.group(1) in columns and (value_start == -1 or value_start >= width)
+            if not aligned:
+                match = None
+        elif match and columns is not None and not current_row and match.group(1) != columns[0]:
+            if column is None and width is None:
+                columns = None  # Colunas informadas não batem com a saída: aprende no primeiro registro
+            else:
+                match = None
         
-        # Regex para pegar primeira palavra (coluna) e o resto (valor)
-        match = re.match(r'^(\S+)\s+(.*)$', line)
         if match:
-            col = match.group(1)
-            val = match.group(2).strip()
-            current_row[col] = val
+            column = [match.group(2) or '']
+            current_row.append((match.group(1), column))
+            if width is None and value_start != -1:
+                width = value_start
+        elif column is not None:
+            column.append(line)
+        # Sem registro aberto (resto de um valor após o fim do registro): linha ignorada
             
     # Adicionar última linha se existir
     if current_row:
-        rows.append(current_row)
+        yield _finish_list_row(current_row, types, as_tuple)
+
+def _aligned(value_start, width):
+    """Valor começa na posição dos valores (ainda desconhecida: qualquer nome seguido de valor)."""
+    return value_start != -1 and (width is None or value_start == width)
+
+def _finish_list_row(row, types=None, as_tuple=False):
+    """Junta as partes de cada valor, converte '<null>' em None e aplica os conversores de tipo."""
+    values = []
+    for column, parts in row:
+        if len(parts) > 1 and _BLOB_ID.match(parts[0].strip()):
+            # BLOB de texto: o isql imprime o id do blob e o conteúdo nas linhas seguintes
+            parts = parts[1:]
+        values.append(_decode_value(column, '\n'.join(parts).strip(), types))
+    return tuple(values) if as_tuple else dict(zip((column for column, _ in row), values))
+
+def _decode_value(column, value, types):
+    """'<null>' vira None; os demais valores passam pelo conversor da coluna, se houver."""
+    if value == _NULL:
+        return None
+    if types and column in types:
+        try:
+            return types[column](value)
+        except (ValueError, ArithmeticError):
+            pass  # Valor fora do formato esperado: mantém o texto
+    return value
+
+def _simple_select(query_sql):
+    """
+    Decompõe um SELECT cuja lista tem só colunas simples ([tabela.]coluna).
+    
+    Returns:
+        tuple | None: ('DISTINCT ' ou None, [(item, TABELA ou None, COLUNA)], resto a partir do FROM)
+    """
+    select = _SIMPLE_SELECT.match(query_sql)
+    if not select:
+        return None
+    distinct, items, rest = select.groups()
+    columns = []
+    for item in items.split(','):
+        column = _SELECT_ITEM.match(item.strip())
+        if not column:
+            return None
+        qualifier, name = column.groups()
+        columns.append((item.strip(), qualifier.upper() if qualifier else None, name.upper()))
+    return distinct, columns, rest
+
+def select_columns(query_sql):
+    """Nomes das colunas que o isql imprime para um SELECT de colunas simples; None se não der para saber."""
+    select = _simple_select(query_sql)
+    return [name for _, _, name in select[1]] if select else None
+
+def compact_query(query_sql, widths):
+    """
+    Reescreve um SELECT para o modo compacto: uma única coluna por linha, montada no servidor
+    com os valores convertidos em VARCHAR da largura de cada coluna, concatenados (||) e
+    separados por _COMPACT_SEPARATOR (também no início e no fim). NULL vira o mesmo '<null>'
+    do modo LIST. Executado com SET HEADING OFF, evita repetir o nome de cada coluna em toda linha.
+    
+    Args:
+        query_sql (str): SELECT pronto (sem parâmetros)
+        widths (dict): {COLUNA: largura ou None} das colunas da tabela do FROM (ver column_widths)
+    
+    Returns:
+        tuple | None: (query reescrita, nomes das colunas) ou None para usar SET LIST ON:
+            colunas que não são [tabela.]coluna da tabela do FROM, BLOB ou largura desconhecida,
+            ou linha larga demais para compensar
+    """
+    select = _simple_select(query_sql)
+    if not select:
+        return None
+    distinct, items, rest = select
+    source = _FROM_CLAUSE.match(rest)
+    if not source:
+        return None
+    table, alias = source.groups()
+    qualifiers = {table.upper()}
+    if alias and alias.upper() not in _NOT_ALIAS:
+        qualifiers.add(alias.upper())
+    
+    names, fields = [], []
+    row_width = len(_COMPACT_SEPARATOR)
+    for item, qualifier, name in items:
+        if qualifier and qualifier not in qualifiers:
+            return None
+        width = widths.get(name)
+        if not width:
+            return None
+        names.append(name)
+        # NULL anularia a concatenação inteira: vira o mesmo marcador do modo LIST
+        fields.append(f"COALESCE(CAST({item} AS VARCHAR({width})), '{_NULL}')")
+        row_width += max(width, len(_NULL)) + len(_COMPACT_SEPARATOR)
+    
+    if row_width > _LIST_NAME_WIDTH * len(names):
+        return None
+    separator = f"'{_COMPACT_SEPARATOR}'"
+    concatenation = f" || {separator} || ".join(fields)
+    return f"SELECT {distinct or ''}{separator} || {concatenation} || {separator} {rest}", names
+
+def _iter_compact_rows(lines, names, types=None, as_tuple=False):
+    """
+    Parse da saída do modo compacto (compact_query): cada linha de dados começa pelo separador
+    e termina no separador de fechamento (seguido dos espaços de padding do isql). Um valor com
+    quebra de linha continua nas linhas seguintes até o separador de fechamento.
+    
+    Args:
+        lines (iterable): Linhas de saída do isql
+        names (list): Nomes das colunas, na ordem do SELECT
+        types (dict): Opcional. {COLUNA: conversor} (ver column_decoders)
+        as_tuple (bool): Gerar tuplas na ordem do SELECT em vez de dicionários
+    """
+    pending = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if pending is None:
+            line = _strip_prompts(line)
+            if not line.startswith(_COMPACT_SEPARATOR):
+                continue  # Linhas em branco entre result sets
+            pending = line
+        else:
+            pending = f"{pending}\n{line}"
         
-    return rows
+        parts = pending.split(_COMPACT_SEPARATOR)
+        if len(parts) < len(names) + 2:
+            continue  # Linha ainda incompleta (quebra de linha dentro de um valor)
+        if len(parts) > len(names) + 2 or parts[-1].strip():
+            raise Exception(f"Erro no ISQL: separador '{_COMPACT_SEPARATOR}' dentro de um valor: {pending!r}")
+        values = [_decode_value(name, value.strip(), types) for name, value in zip(names, parts[1:-1])]
+        yield tuple(values) if as_tuple else dict(zip(names, values))
+        pending = None
+    
+    if pending is not None:
+        raise Exception(f"Erro no ISQL: linha incompleta no modo compacto: {pending!r}")
+
+def column_decoders(metadata_rows):
+    """
+    Monta os conversores de valor por coluna a partir dos metadados do Firebird
+    (RDB$FIELD_TYPE / RDB$FIELD_SCALE), como o driver fdb faria:
+    inteiros -> int, NUMERIC/DECIMAL -> Decimal, FLOAT/DOUBLE -> float; o resto fica str.
+    
+    Args:
+        metadata_rows (iterable): Tuplas (nome_coluna, field_type, field_scale, ...) de COLUMN_TYPES_QUERY
+    
+    Returns:
+        dict: {NOME_COLUNA: conversor}
+    """
+    decoders = {}
+    for name, field_type, scale, *_ in metadata_rows:
+        field_type = int(field_type)
+        if field_type in _INTEGER_TYPES:
+            decoders[name] = decimal.Decimal if scale and int(scale) < 0 else int
+        elif field_type in _FLOAT_TYPES:
+            decoders[name] = float
+    return decoders
+
+def column_sql_types(metadata_rows):
+    """
+    Declaração SQL de cada coluna a partir dos metadados do Firebird, para criar tabelas
+    com os mesmos tipos de outra (ex: 'VARCHAR(9)', 'INTEGER', 'NUMERIC(18,2)').
+    
+    Args:
+        metadata_rows (iterable): Tuplas (nome_coluna, field_type, field_scale, tamanho) de COLUMN_TYPES_QUERY
+    
+    Returns:
+        dict: {NOME_COLUNA: tipo SQL}; colunas BLOB e de tipos desconhecidos ficam de fora
+    """
+    sql_types = {}
+    for name, field_type, scale, length in metadata_rows:
+        field_type = int(field_type)
+        scale = int(scale or 0)
+        if field_type in _TEXT_TYPES:
+            sql_types[name] = f"{_SQL_TYPE_NAMES[field_type]}({int(length)})"
+        elif field_type in _NUMERIC_PRECISION and scale < 0:
+            sql_types[name] = f"NUMERIC({_NUMERIC_PRECISION[field_type]},{-scale})"
+        elif field_type in _SQL_TYPE_NAMES:
+            sql_types[name] = _SQL_TYPE_NAMES[field_type]
+    return sql_types
+
+def column_widths(metadata_rows):
+    """
+    Largura de cada coluna convertida em texto no modo compacto, a partir dos metadados do
+    Firebird (RDB$FIELD_TYPE / RDB$FIELD_SCALE / tamanho de CHAR e VARCHAR).
+    
+    Args:
+        metadata_rows (iterable): Tuplas (nome_coluna, field_type, field_scale, tamanho) de COLUMN_TYPES_QUERY
+    
+    Returns:
+        dict: {NOME_COLUNA: largura}; None para BLOB e tipos sem largura conhecida
+    """
+    widths = {}
+    for name, field_type, scale, length in metadata_rows:
+        field_type = int(field_type)
+        if field_type in _TEXT_TYPES:
+            widths[name] = int(length) if length else None
+        elif field_type in _DISPLAY_WIDTHS:
+            widths[name] = _DISPLAY_WIDTHS[field_type] + (1 if scale and int(scale) < 0 else 0)
+        else:
+            widths[name] = None  # BLOB e arrays: SET LIST ON
+    return widths
@@ -0,0 +1,138 @@
+"""
+Conjunto de números inteiros representado por intervalos fechados [início, fim].
+
+Usado para as faixas de inutilização da SEFAZ ("Inicial a".."Final"): uma faixa de
+milhões de números ocupa um único par, em vez de uma string por documento.
+Os intervalos ficam ordenados, sem sobreposição e sem intervalos adjacentes
+(ex.: [1, 3] e [4, 6] viram [1, 6]).
+"""
+
+import bisect
+
+
+class IntervalSet:
+    """
+    Conjunto imutável de inteiros em intervalos fechados ordenados e mesclados.
+
+    - Iteração em ordem crescente (int), len() com a quantidade de números
+    - `in` aceita int ou texto numérico ('00123' -> 123)
+    - União, interseção e diferença (| & -) calculadas sobre os intervalos
+    """
+
+    __slots__ = ('_starts', '_ends')
+
+    def __init__(self, intervals=()):
+        """
+        Args:
+            intervals: Pares (início, fim), em qualquer ordem; pares com fim < início são ignorados
+        """
+        starts, ends = [], []
+        for start, end in sorted((int(s), int(e)) for s, e in intervals if int(e) >= int(s)):
+            if ends and start <= ends[-1] + 1:
+                # Sobrepõe ou encosta no anterior: estende
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+        self._starts = starts
+        self._ends = ends
+
+    @classmethod
+    def from_numbers(cls, numbers):
+        """
+        Monta o conjunto a partir de números avulsos (int ou texto numérico).
+
+        Args:
+            numbers: Iterável de números
+
+        Returns:
+            IntervalSet: Conjunto com os números agrupados em intervalos
+        """
+        return cls((n, n) for n in map(int, numbers))
+
+    @classmethod
+    def _from_normalized(cls, starts, ends):
+        # Listas já ordenadas e mescladas (resultado das operações)
+        result = cls.__new__(cls)
+        result._starts = starts
+        result._ends = ends
+        return result
+
+    @property
+    def intervals(self):
+        """Lista de pares (início, fim) em ordem crescente."""
+        return list(zip(self._starts, self._ends))
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in zip(self._starts, self._ends))
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    def __iter__(self):
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def __contains__(self, number):
+        try:
+            number = int(number)
+        except (ValueError, TypeError):
+            return False
+        pos = bisect.bisect_right(self._starts, number) - 1
+        return pos >= 0 and number <= self._ends[pos]
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __repr__(self):
+        return f"IntervalSet({self.intervals!r})"
+
+    def union(self, other):
+        """Números presentes em qualquer um dos conjuntos."""
+        return IntervalSet(self.intervals + other.intervals)
+
+    def intersection(self, other):
+        """Números presentes nos dois conjuntos."""
+        starts, ends = [], []
+        i = j = 0
+        while i < len(self._starts) and j < len(other._starts):
+            start = max(self._starts[i], other._starts[j])
+            end = min(self._ends[i], other._ends[j])
+            if start <= end:
+                starts.append(start)
+                ends.append(end)
+            # Avança o intervalo que termina primeiro
+            if self._ends[i] < other._ends[j]:
+                i += 1
+            else:
+                j += 1
+        return IntervalSet._from_normalized(starts, ends)
+
+    def difference(self, other):
+        """Números deste conjunto que não estão em `other`."""
+        starts, ends = [], []
+        j = 0
+        for start, end in zip(self._starts, self._ends):
+            # Pula os intervalos de `other` que terminam antes deste começar
+            while j < len(other._starts) and other._ends[j] < start:
+                j += 1
+            k = j
+            while k < len(other._starts) and other._starts[k] <= end:
+                if other._starts[k] > start:
+                    starts.append(start)
+                    ends.append(other._starts[k] - 1)
+                start = other._ends[k] + 1
+                if start > end:
+                    break
+                k += 1
+            if start <= end:
+                starts.append(start)
+                ends.append(end)
+        return IntervalSet._from_normalized(starts, ends)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
@@ -4,32 +4,21 @@ Refatorado para usar Pandas e suportar Excel/CSV com detecção automática de c
 """
 
 import pandas as pd
+import numpy as np
 import os
 import configparser
 import psycopg2
 import re
-
-# Configurar caminho da DLL do Firebird antes de importar fdb
-import sys
-if sys.platform == 'win32':
-    # Tentar encontrar fbclient.dll em locais comuns
-    possible_paths = [
-        r'C:\Program Files\Firebird\Firebird_3_0\bin',
-        r'C:\Program Files\Firebird\Firebird_4_0\bin',
-        r'C:\Program Files (x86)\Firebird\Firebird_3_0\bin',
-        r'C:\Program Files (x86)\Firebird\Firebird_4_0\bin',
-        r'C:\Program Files (x86)\Firebird\bin',  # Caminho genérico
-        r'C:\Program Files\Firebird\bin',
-        r'C:\Firebird\bin',
-    ]
-    
-    for path in possible_paths:
-        dll_path = os.path.join(path, 'fbclient.dll')
-        if os.path.exists(dll_path):
-            os.environ['FIREBIRD_HOME'] = os.path.dirname(path)  # Diretório pai
-            if path not in os.environ.get('PATH', ''):
-                os.environ['PATH'] = path + os.pathsep + os.environ.get('PATH', '')
-            break
+import time
+import contextlib
+import io
+import csv
+import codecs
+import queue
+import itertools
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Patch para Python 3.13 - resetlocale foi removido
 import locale
@@ -41,11 +30,75 @@ if not hasattr(locale, 'resetlocale'):
 
 import fdb
 
+import firebird_discovery
 import logging_utils
+from interval_set import IntervalSet
+import pg_pool
 
 # Inicializar logger
 logger = logging_utils.get_logger()
 
+# Quantidade de cupons enviados por consulta no PostgreSQL (numero_nf = ANY(%s))
+TAMANHO_LOTE_POSTGRES = 1000
+
+# Firebird aceita no máximo 1500 literais em uma lista IN (...)
+LIMITE_IN_FIREBIRD = 1500
+
+# Lotes IN do Firebird com tamanho adaptativo: inicial, mínimo e passo de crescimento
+# (o passo também arredonda a quantidade de placeholders, para reaproveitar statements preparados)
+LOTE_INICIAL_FIREBIRD = 500
+LOTE_MINIMO_FIREBIRD = 50
+PASSO_LOTE_FIREBIRD = 100
+
+# Unidade Firebird que estoura o tempo é repetida em duas metades no máximo este número de vezes
+# (e nunca em metades menores que LOTE_MINIMO_FIREBIRD); depois disso a análise falha
+DIVISOES_MAXIMAS_FIREBIRD = 3
+
+# Quantidade de cupons listados na mensagem de erro quando parte da análise não pôde ser consultada
+CUPONS_LISTADOS_NO_ERRO = 20
+
+# A partir desta quantidade de cupons, o PostgreSQL usa tabela temporária (COPY) + JOIN
+# em vez de arrays. Pode ser sobrescrito por config['limite_tabela_temporaria']
+LIMITE_TABELA_TEMPORARIA = 100000
+
+# Linhas trazidas por ida ao servidor ao ler o resultado do JOIN com a tabela temporária
+TAMANHO_FETCH_POSTGRES = 5000
+
+# A partir desta quantidade de cupons, o Firebird usa tabela temporária global (GTT) + JOIN
+# em vez de lotes IN. Pode ser sobrescrito por config['limite_tabela_temporaria_firebird']
+LIMITE_TABELA_TEMPORARIA_FIREBIRD = 20000
+
+# Tabela temporária global (ON COMMIT DELETE ROWS) da consulta em massa no Firebird;
+# criada no banco na primeira vez que for necessária
+TABELA_TEMPORARIA_FIREBIRD = 'CUPONS_ANALISE'
+
+# Duração estimada (segundos) por par (numero_nf, serie_nf) na carga e no JOIN da tabela temporária
+# Firebird; o timeout é TIMEOUT_FACTOR x a estimativa, entre os limites de firebird_backend
+# (o JOIN ordena tudo antes de devolver a primeira linha)
+SEGUNDOS_POR_PAR_TABELA_TEMPORARIA_FIREBIRD = 0.005
+
+# Sessões Firebird consultando em paralelo durante uma análise (1 = sequencial).
+# Pode ser sobrescrito por config['workers_firebird']; o limite por banco fica em
+# firebird_backend.MAX_PARALLEL_SESSIONS_PER_DATABASE
+WORKERS_FIREBIRD = 2
+
+# Sequências contíguas de cupons a partir deste tamanho são lidas com BETWEEN (varredura por faixa)
+TAMANHO_MINIMO_FAIXA = 200
+
+# Faixas maiores são quebradas neste tamanho (limita a memória de cada unidade de consulta)
+TAMANHO_MAXIMO_FAIXA = 5000
+
+# Maior faixa de inutilização da SEFAZ que a análise automática (banco de dados) aceita expandir
+# cupom a cupom; acima disso a análise é recusada (ex.: Final 999999999 digitado no lugar do número).
+# As análises de arquivo usam os intervalos sem expandir e não têm limite
+TAMANHO_MAXIMO_INTERVALO_SEFAZ = 100000
+
+# Bytes lidos do início do arquivo para detectar formato, encoding e separador de CSV
+TAMANHO_AMOSTRA_ARQUIVO = 64 * 1024
+
+# Separadores de CSV aceitos na detecção automática
+SEPARADORES_CSV = ',;\t|'
+
 # Importar pdfplumber hardcoded (obrigatório agora)
 try:
     import pdfplumber
@@ -57,7 +110,8 @@ except ImportError:
 def _carregar_dados_brutos(filepath):
     """
     Carrega CSV ou Excel como DataFrame sem cabeçalho definido.
-    Tenta primeiro ler como Excel (pela extensão), depois como CSV se falhar.
+    O formato real é detectado pelo conteúdo (ver _detectar_formato_arquivo), não pela extensão,
+    e o arquivo é lido uma única vez com as configurações detectadas.
     Isso resolve o problema de arquivos CSV com extensão .xls/.xlsx incorreta.
     
     Args:
@@ -70,60 +124,89 @@ def _carregar_dados_brutos(filepath):
         raise FileNotFoundError(f"Arquivo não encontrado: {filepath}")
     
     ext = os.path.splitext(filepath)[1].lower()
-    df = None
-    erros = []
+    formato = _detectar_formato_arquivo(filepath)
     
-    # Estratégia 1: Tentar ler como Excel se a extensão indicar isso
-    if ext in ['.xlsx', '.xls']:
-        try:
-            df = pd.read_excel(filepath, header=None)
-            return df
-        except Exception as e:
-            erros.append(f"Excel: {str(e)}")
-            # Se falhar, continua para tentar como CSV (extensão pode estar errada)
-    
-    # Estratégia 2: Tentar ler como CSV com diferentes encodings e separadores
-    # Tentativa 1: UTF-8 com BOM (padrão Windows)
     try:
-        df = pd.read_csv(filepath, header=None, encoding='utf-8-sig')
-        return df
+        if formato['tipo'] == 'excel':
+            # O pandas escolhe o engine (openpyxl/xlrd/odf) pelo conteúdo
+            return pd.read_excel(filepath, header=None)
+        
+        # Largura fixa pela amostra: sem ela o pandas deduz as colunas pela primeira linha
+        # e linhas de título curtas antes do cabeçalho quebram a leitura ("Expected 1 fields")
+        opcoes = {'header': None, 'sep': formato['sep'], 'names': range(formato['colunas'])}
+        try:
+            return pd.read_csv(filepath, encoding=formato['encoding'], **opcoes)
+        except UnicodeDecodeError:
+            # Amostra era só ASCII e o resto do arquivo não é UTF-8: único caso de segunda leitura
+            if formato['encoding'] != 'utf-8':
+                raise
+            formato['encoding'] = 'cp1252'
+            return pd.read_csv(filepath, encoding='cp1252', **opcoes)
     except Exception as e:
-        erros.append(f"CSV utf-8-sig: {str(e)}")
+        raise Exception(
+            f"Não foi possível carregar o arquivo {filepath}.\n"
+            f"Extensão: {ext}\n"
+            f"Formato detectado: {_descrever_formato(formato)}\n"
+            f"Erro: {str(e)}"
+        )
+
+
+def _detectar_formato_arquivo(filepath):
+    """
+    Detecta o formato do arquivo lendo apenas os primeiros TAMANHO_AMOSTRA_ARQUIVO bytes:
+    - Assinatura: ZIP ('PK\\x03\\x04', xlsx/ods) ou OLE2 (xls antigo) -> Excel
+    - Texto: encoding pelo BOM ou por teste de decodificação da amostra (utf-8, cp1252, latin1)
+      e separador pelo csv.Sniffer (',', ';', TAB ou '|')
+    - Colunas: maior quantidade de campos numa linha da amostra (linhas de título antes da
+      tabela têm menos campos que o cabeçalho)
     
-    # Tentativa 2: Latin1 (ISO-8859-1) - comum em sistemas antigos
-    try:
-        df = pd.read_csv(filepath, header=None, encoding='latin1')
-        return df
-    except Exception as e:
-        erros.append(f"CSV latin1: {str(e)}")
+    Args:
+        filepath (str): Caminho para o arquivo
+        
+    Returns:
+        dict: {'tipo': 'excel'} ou {'tipo': 'csv', 'encoding': str, 'sep': str, 'colunas': int}
+    """
+    with open(filepath, 'rb') as f:
+        amostra = f.read(TAMANHO_AMOSTRA_ARQUIVO)
     
-    # Tentativa 3: Latin1 com separador ponto-e-vírgula
-    try:
-        df = pd.read_csv(filepath, header=None, encoding='latin1', sep=';')
-        return df
-    except Exception as e:
-        erros.append(f"CSV latin1 sep=';': {str(e)}")
+    if amostra.startswith(b'PK\x03\x04') or amostra.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return {'tipo': 'excel'}
     
-    # Tentativa 4: UTF-8 sem BOM
-    try:
-        df = pd.read_csv(filepath, header=None, encoding='utf-8')
-        return df
-    except Exception as e:
-        erros.append(f"CSV utf-8: {str(e)}")
+    # Encoding: BOM, senão o primeiro que decodificar a amostra. O decodificador incremental
+    # ignora um caractere multibyte cortado no fim da amostra
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if amostra.startswith(bom):
+            texto = codecs.getincrementaldecoder(encoding)(errors='replace').decode(amostra)
+            break
+    else:
+        for encoding in ('utf-8', 'cp1252', 'latin1'):
+            try:
+                texto = codecs.getincrementaldecoder(encoding)().decode(amostra)
+                break
+            except UnicodeDecodeError:
+                continue
     
-    # Tentativa 5: Windows-1252 (CP1252)
+    # Separador: só linhas completas da amostra
+    linhas = texto.splitlines()
+    if len(amostra) == TAMANHO_AMOSTRA_ARQUIVO and len(linhas) > 1:
+        linhas = linhas[:-1]
+    trecho = '\n'.join(linhas)
     try:
-        df = pd.read_csv(filepath, header=None, encoding='cp1252')
-        return df
-    except Exception as e:
-        erros.append(f"CSV cp1252: {str(e)}")
+        sep = csv.Sniffer().sniff(trecho, delimiters=SEPARADORES_CSV).delimiter
+    except csv.Error:
+        # Sniffer inconclusivo (ex: linhas de título antes da tabela): separador mais frequente
+        contagens = {candidato: trecho.count(candidato) for candidato in SEPARADORES_CSV}
+        sep = max(contagens, key=contagens.get) if any(contagens.values()) else ','
     
-    # Se todas as tentativas falharam, lançar erro detalhado
-    raise Exception(
-        f"Não foi possível carregar o arquivo {filepath}.\n"
-        f"Extensão: {ext}\n"
-        f"Tentativas realizadas:\n" + "\n".join(f"  - {erro}" for erro in erros)
-    )
+    colunas = max((len(campos) for campos in csv.reader(linhas, delimiter=sep)), default=1)
+    
+    return {'tipo': 'csv', 'encoding': encoding, 'sep': sep, 'colunas': colunas}
+
+
+def _descrever_formato(formato):
+    if formato['tipo'] == 'excel':
+        return 'Excel'
+    return f"CSV ({formato['encoding']}, separador {formato['sep']!r})"
 
 
 def _encontrar_cabecalho(df, colunas_obrigatorias):
@@ -142,7 +225,7 @@ def _encontrar_cabecalho(df, colunas_obrigatorias):
     
     for idx in range(max_linhas_busca):
         # Pegar a linha como potencial cabeçalho
-        linha_teste = df.iloc[idx].astype(str).str.strip().str.lower()
+        linha_teste = df.iloc[idx].fillna('').astype(str).str.strip().str.lower()
         
         # Verificar se TODAS as colunas obrigatórias aparecem (match parcial)
         colunas_encontradas = 0
@@ -157,7 +240,7 @@ def _encontrar_cabecalho(df, colunas_obrigatorias):
         # Se encontrou todas as colunas obrigatórias
         if colunas_encontradas >= len(colunas_obrigatorias):
             # Esta é a linha do cabeçalho
-            novo_header = df.iloc[idx].astype(str).str.strip()
+            novo_header = df.iloc[idx].fillna('').astype(str).str.strip()
             novo_df = df.iloc[idx+1:].copy()  # Dados abaixo do cabeçalho
             novo_df.columns = novo_header
             novo_df.reset_index(drop=True, inplace=True)
@@ -183,30 +266,46 @@ def _ler_sefaz(filepath, serie_alvo):
         serie_alvo (str): Série a ser filtrada
         
     Returns:
-        set: Conjunto com os números de documentos fiscais (intervalos expandidos)
+        IntervalSet: Números de documentos fiscais como intervalos [inicial, final] mesclados
+            (faixas não são expandidas número a número)
+    """
+    return _ler_sefaz_multi(filepath, [serie_alvo])[str(serie_alvo)]
+
+
+def _ler_sefaz_multi(filepath, series=None):
+    """
+    Lê o arquivo SEFAZ Inutilizados uma única vez e separa os documentos por série.
+    Para várias séries, evita recarregar o arquivo e redetectar o cabeçalho a cada uma.
+    
+    Args:
+        filepath (str): Caminho para o arquivo SEFAZ
+        series (list, optional): Séries desejadas. None = todas as séries presentes no arquivo
+        
+    Returns:
+        dict: {'série': IntervalSet}; série pedida sem documentos no arquivo -> IntervalSet vazio
     """
     try:
         # Carregar dados brutos
-        logger.info(f"_ler_sefaz: Carregando arquivo {os.path.basename(filepath)}")
+        logger.info(f"_ler_sefaz_multi: Carregando arquivo {os.path.basename(filepath)}")
         df = _carregar_dados_brutos(filepath)
-        logger.debug(f"_ler_sefaz: Arquivo carregado. Shape: {df.shape}")
+        logger.debug(f"_ler_sefaz_multi: Arquivo carregado. Shape: {df.shape}")
         
         # Tentar encontrar cabeçalho com intervalos primeiro (Inicial a + Final)
         tem_intervalos = False
         try:
-            logger.debug(f"_ler_sefaz: Tentando encontrar colunas com intervalos...")
+            logger.debug(f"_ler_sefaz_multi: Tentando encontrar colunas com intervalos...")
             df = _encontrar_cabecalho(df, ['Inicial', 'Final', 'Série'])
             tem_intervalos = True
-            logger.info(f"_ler_sefaz: ✅ Cabeçalho encontrado COM intervalos")
+            logger.info(f"_ler_sefaz_multi: ✅ Cabeçalho encontrado COM intervalos")
         except ValueError as e:
             # Se não encontrar "Final", tentar apenas com "Inicial"
-            logger.debug(f"_ler_sefaz: Intervalos não encontrados, tentando sem 'Final'...")
+            logger.debug(f"_ler_sefaz_multi: Intervalos não encontrados, tentando sem 'Final'...")
             try:
                 df = _encontrar_cabecalho(df, ['Inicial', 'Série'])
                 tem_intervalos = False
-                logger.info(f"_ler_sefaz: ✅ Cabeçalho encontrado SEM intervalos")
+                logger.info(f"_ler_sefaz_multi: ✅ Cabeçalho encontrado SEM intervalos")
             except ValueError as e2:
-                logger.error(f"_ler_sefaz: ❌ ERRO - Não encontrou nem com intervalos nem sem")
+                logger.error(f"_ler_sefaz_multi: ❌ ERRO - Não encontrou nem com intervalos nem sem")
                 logger.error(f"Erro original: {str(e2)}")
                 raise
         
@@ -216,61 +315,55 @@ def _ler_sefaz(filepath, serie_alvo):
         col_serie = None
         
         
-        logger.debug(f"_ler_sefaz: Colunas disponíveis após encontrar cabeçalho: {list(df.columns)}")
+        logger.debug(f"_ler_sefaz_multi: Colunas disponíveis após encontrar cabeçalho: {list(df.columns)}")
         
         for col in df.columns:
             col_lower = str(col).lower()
             if 'inicial' in col_lower and not col_inicial:
                 col_inicial = col
-                logger.debug(f"_ler_sefaz: Coluna 'Inicial' = '{col}'")
+                logger.debug(f"_ler_sefaz_multi: Coluna 'Inicial' = '{col}'")
             if 'final' in col_lower and not col_final:
                 col_final = col
-                logger.debug(f"_ler_sefaz: Coluna 'Final' = '{col}'")
+                logger.debug(f"_ler_sefaz_multi: Coluna 'Final' = '{col}'")
             if 'série' in col_lower or 'serie' in col_lower:
                 col_serie = col
-                logger.debug(f"_ler_sefaz: Coluna 'Série' = '{col}'")
+                logger.debug(f"_ler_sefaz_multi: Coluna 'Série' = '{col}'")
         
         if not col_inicial or not col_serie:
             raise ValueError(f"Colunas obrigatórias não encontradas. Disponíveis: {list(df.columns)}")
         
-        # Filtrar e coletar documentos
-        documentos = set()
-        for _, row in df.iterrows():
-            try:
-                serie_val = str(row[col_serie]).strip()
-                
-                # Comparar série (normalizar para string)
-                if serie_val != str(serie_alvo):
-                    continue
-                
-                inicial_val = str(row[col_inicial]).strip()
-                if not inicial_val or inicial_val.lower() == 'nan':
-                    continue
-                
-                # Converter inicial para inteiro
-                inicial_num = int(float(inicial_val))
-                
-                # Se tem coluna "Final", processar como intervalo
-                if tem_intervalos and col_final:
-                    final_val = str(row[col_final]).strip()
-                    if final_val and final_val.lower() != 'nan':
-                        try:
-                            final_num = int(float(final_val))
-                            # Expandir intervalo: de inicial até final (inclusive)
-                            for num in range(inicial_num, final_num + 1):
-                                documentos.add(str(num))
-                        except (ValueError, TypeError):
-                            # Se falhar ao ler "Final", adicionar apenas o inicial
-                            documentos.add(str(inicial_num))
-                    else:
-                        # Se "Final" está vazio, adicionar apenas o inicial
-                        documentos.add(str(inicial_num))
-                else:
-                    # Sem coluna "Final", adicionar apenas o inicial
-                    documentos.add(str(inicial_num))
-                    
-            except (ValueError, TypeError):
-                continue
+        # Coletar documentos (operações por coluna, sem iterar linha a linha)
+        # Série comparada como texto, igual a str(valor).strip(); célula vazia vira '' (no pandas 3
+        # o astype(str) mantém NaN como float)
+        series_linhas = df[col_serie].fillna('').astype(str).str.strip().to_numpy()
+        
+        # Inicial: vazio, 'nan' ou não numérico descarta a linha; decimais são truncados
+        iniciais = _converter_numeros(df[col_inicial])
+        
+        if tem_intervalos and col_final:
+            # Intervalo de inicial até final (inclusive); final vazio/inválido -> só o inicial,
+            # final menor que o inicial -> intervalo vazio (descartado pelo IntervalSet)
+            finais = _converter_numeros(df[col_final])
+            finais = np.where(np.isfinite(finais), finais, iniciais)
+        else:
+            # Sem coluna "Final", apenas o inicial
+            finais = iniciais
+        
+        validos = np.isfinite(iniciais)
+        series_linhas = series_linhas[validos]
+        iniciais = iniciais[validos].astype(np.int64)
+        finais = finais[validos].astype(np.int64)
+        
+        if series is None:
+            # Todas as séries presentes (sem células vazias nem o texto 'nan'/'None' de versões antigas do pandas)
+            series = [s for s in pd.unique(series_linhas) if s and s.lower() not in ('nan', 'none')]
+        
+        documentos = {}
+        for serie in series:
+            mascara = series_linhas == str(serie)
+            documentos[str(serie)] = IntervalSet(zip(iniciais[mascara].tolist(), finais[mascara].tolist()))
+        
+        logger.info(f"_ler_sefaz_multi: {len(documentos)} série(s) lida(s): {list(documentos)}")
         
         return documentos
         
@@ -278,6 +371,38 @@ def _ler_sefaz(filepath, serie_alvo):
         raise Exception(f"Erro ao ler arquivo SEFAZ: {str(e)}")
 
 
+def _faixa_sefaz_grande_demais(documentos):
+    """
+    Procura uma faixa grande demais para ser expandida cupom a cupom (análise automática).
+    
+    Args:
+        documentos (dict): {'série': IntervalSet} de _ler_sefaz_multi
+        
+    Returns:
+        tuple | None: (série, inicial, final) da primeira faixa com mais de
+            TAMANHO_MAXIMO_INTERVALO_SEFAZ números, ou None
+    """
+    for serie, intervalos in documentos.items():
+        for inicial, final in intervalos.intervals:
+            if final - inicial + 1 > TAMANHO_MAXIMO_INTERVALO_SEFAZ:
+                return serie, inicial, final
+    return None
+
+
+def _converter_numeros(coluna):
+    """
+    Converte uma coluna para números inteiros como int(float(str(valor).strip())):
+    texto vazio, 'nan' ou não numérico vira NaN; decimais são truncados.
+    
+    Args:
+        coluna (pd.Series): Valores brutos
+        
+    Returns:
+        np.ndarray: float64 com valores inteiros ou NaN (na ordem das linhas)
+    """
+    return np.trunc(pd.to_numeric(coluna.astype(str).str.strip(), errors='coerce').to_numpy(dtype=np.float64))
+
+
 def _ler_relatorio(filepath, serie_alvo):
     """
     Lê o arquivo Relatório do Sistema e retorna um dicionário de Doc. Fiscal -> Status.
@@ -316,21 +441,18 @@ def _ler_relatorio(filepath, serie_alvo):
         if not col_doc or not col_serie or not col_status:
             raise ValueError(f"Colunas não encontradas. Disponíveis: {list(df.columns)}")
         
-        # Filtrar e coletar documentos
-        relatorio = {}
-        for _, row in df.iterrows():
-            try:
-                serie_val = str(row[col_serie]).strip()
-                doc_val = str(row[col_doc]).strip()
-                status_val = str(row[col_status]).strip()
-                
-                # Comparar série (normalizar para string)
-                if serie_val == str(serie_alvo) and doc_val and doc_val.lower() != 'nan':
-                    # Converter para inteiro para remover zeros à esquerda e .0
-                    doc_limpo = str(int(float(doc_val)))
-                    relatorio[doc_limpo] = status_val
-            except (ValueError, TypeError):
-                continue
+        # Filtrar e coletar documentos (operações por coluna, sem iterar linha a linha)
+        # Série comparada como texto, igual a str(valor).strip(); célula vazia vira '' (no pandas 3
+        # o astype(str) mantém NaN como float)
+        df = df[df[col_serie].fillna('').astype(str).str.strip() == str(serie_alvo)]
+        
+        # Converter para inteiro para remover zeros à esquerda e .0; vazio/'nan'/inválido é descartado
+        documentos = _converter_numeros(df[col_doc])
+        validos = np.isfinite(documentos)
+        status = df[col_status].fillna('').astype(str).str.strip().to_numpy()[validos]
+        
+        # Documento repetido: prevalece a última linha, como na atribuição linha a linha
+        relatorio = dict(zip(map(str, documentos[validos].astype(np.int64).tolist()), status.tolist()))
         
         return relatorio
         
@@ -351,12 +473,13 @@ def executar_analise_discrepancia(path_sefaz, path_relatorio, serie_alvo):
     Returns:
         dict: Dicionário com as chaves:
             - 'tipo': 'discrepancia'
-            - 'discrepancia_grave': lista de docs Inutilizados no SEFAZ mas Autorizados no Sistema
-            - 'conciliado_ok': lista de docs Inutilizados no SEFAZ e Cancelados/Outro no Sistema
-            - 'nao_encontrado_no_relatorio': lista de docs Inutilizados no SEFAZ mas não existem no Relatório
+            - 'discrepancia_grave': IntervalSet de docs Inutilizados no SEFAZ mas Autorizados no Sistema
+            - 'conciliado_ok': IntervalSet de docs Inutilizados no SEFAZ e Cancelados/Outro no Sistema
+            - 'nao_encontrado_no_relatorio': IntervalSet de docs Inutilizados no SEFAZ mas não existem no Relatório
             - 'count_sefaz': total de documentos inutilizados lidos do SEFAZ para a série
             - 'count_relatorio': total de documentos lidos do Relatório para a série
             - 'erro': None se sucesso, string com erro se houver problema
+            Os IntervalSet iteram os números (int) em ordem crescente.
     """
     try:
         # Ler dados de ambos os arquivos
@@ -366,13 +489,11 @@ def executar_analise_discrepancia(path_sefaz, path_relatorio, serie_alvo):
         # Inicializar listas de resultados
         discrepancia_grave = []
         conciliado_ok = []
-        nao_encontrado_no_relatorio = []
         
-        # Iterar sobre os documentos inutilizados no SEFAZ
-        for doc in docs_sefaz:
-            if doc in relatorio_sistema:
-                status = relatorio_sistema[doc]
-                
+        # Classificar os documentos do relatório que caem nas faixas inutilizadas no SEFAZ
+        # (busca binária nos intervalos, sem expandir as faixas)
+        for doc, status in relatorio_sistema.items():
+            if doc in docs_sefaz:
                 # Verificar se está autorizado (discrepância grave)
                 # Tratando variações: Autorizada, Autorizado, etc.
                 if 'autoriza' in status.lower():
@@ -380,16 +501,16 @@ def executar_analise_discrepancia(path_sefaz, path_relatorio, serie_alvo):
                 else:
                     # Cancelado ou outro status (conciliado OK)
                     conciliado_ok.append(doc)
-            else:
-                # Documento não encontrado no relatório
-                nao_encontrado_no_relatorio.append(doc)
+        
+        # Inutilizados no SEFAZ que não existem no relatório (diferença entre intervalos)
+        nao_encontrado_no_relatorio = docs_sefaz - IntervalSet.from_numbers(relatorio_sistema)
         
         # Retornar resultados ordenados com contagens
         resultado = {
             'tipo': 'discrepancia',
-            'discrepancia_grave': sorted(discrepancia_grave, key=lambda x: int(x)),
-            'conciliado_ok': sorted(conciliado_ok, key=lambda x: int(x)),
-            'nao_encontrado_no_relatorio': sorted(nao_encontrado_no_relatorio, key=lambda x: int(x)),
+            'discrepancia_grave': IntervalSet.from_numbers(discrepancia_grave),
+            'conciliado_ok': IntervalSet.from_numbers(conciliado_ok),
+            'nao_encontrado_no_relatorio': nao_encontrado_no_relatorio,
             'count_sefaz': len(docs_sefaz),
             'count_relatorio': len(relatorio_sistema),
             'erro': None
@@ -400,9 +521,9 @@ def executar_analise_discrepancia(path_sefaz, path_relatorio, serie_alvo):
     except (FileNotFoundError, ValueError, Exception) as e:
         return {
             'tipo': 'discrepancia',
-            'discrepancia_grave': [],
-            'conciliado_ok': [],
-            'nao_encontrado_no_relatorio': [],
+            'discrepancia_grave': IntervalSet(),
+            'conciliado_ok': IntervalSet(),
+            'nao_encontrado_no_relatorio': IntervalSet(),
             'count_sefaz': 0,
             'count_relatorio': 0,
             'erro': str(e)
@@ -412,7 +533,7 @@ def executar_analise_discrepancia(path_sefaz, path_relatorio, serie_alvo):
 def executar_comparacao_simples(path_a, path_b, serie_alvo):
     """
     Compara dois arquivos de cupons (A vs B) e retorna a diferença entre eles.
-    Usa matemática de conjuntos para identificar cupons em comum e exclusivos.
+    Usa matemática de conjuntos (IntervalSet) para identificar cupons em comum e exclusivos.
     
     Args:
         path_a (str): Caminho para o primeiro arquivo
@@ -422,9 +543,9 @@ def executar_comparacao_simples(path_a, path_b, serie_alvo):
     Returns:
         dict: Dicionário com as chaves:
             - 'tipo': 'comparacao'
-            - 'em_ambos': lista de cupons que estão em ambos os arquivos
-            - 'so_no_arquivo_a': lista de cupons que estão apenas no arquivo A
-            - 'so_no_arquivo_b': lista de cupons que estão apenas no arquivo B
+            - 'em_ambos': IntervalSet de cupons que estão em ambos os arquivos
+            - 'so_no_arquivo_a': IntervalSet de cupons que estão apenas no arquivo A
+            - 'so_no_arquivo_b': IntervalSet de cupons que estão apenas no arquivo B
             - 'count_a': total de cupons lidos do arquivo A
             - 'count_b': total de cupons lidos do arquivo B
             - 'nome_a': nome do arquivo A
@@ -446,12 +567,12 @@ def executar_comparacao_simples(path_a, path_b, serie_alvo):
         try:
             set_a = _ler_sefaz(path_a, serie_alvo)
             set_b_dict = _ler_relatorio(path_b, serie_alvo)
-            set_b = set(set_b_dict.keys())
+            set_b = IntervalSet.from_numbers(set_b_dict)
         except:
             # Estratégia 2: Tentar A como Relatório (complexo) e B como SEFAZ (simples)
             try:
                 set_a_dict = _ler_relatorio(path_a, serie_alvo)
-                set_a = set(set_a_dict.keys())
+                set_a = IntervalSet.from_numbers(set_a_dict)
                 set_b = _ler_sefaz(path_b, serie_alvo)
             except:
                 # Estratégia 3: Tentar ambos como SEFAZ (simples)
@@ -461,11 +582,11 @@ def executar_comparacao_simples(path_a, path_b, serie_alvo):
                 except:
                     # Estratégia 4: Tentar ambos como Relatório (complexo)
                     set_a_dict = _ler_relatorio(path_a, serie_alvo)
-                    set_a = set(set_a_dict.keys())
+                    set_a = IntervalSet.from_numbers(set_a_dict)
                     set_b_dict = _ler_relatorio(path_b, serie_alvo)
-                    set_b = set(set_b_dict.keys())
+                    set_b = IntervalSet.from_numbers(set_b_dict)
         
-        # Realizar operações de conjunto
+        # Realizar operações de conjunto (sobre intervalos, sem expandir as faixas)
         em_ambos = set_a.intersection(set_b)
         so_no_a = set_a.difference(set_b)
         so_no_b = set_b.difference(set_a)
@@ -473,9 +594,9 @@ def executar_comparacao_simples(path_a, path_b, serie_alvo):
         # Retornar resultados ordenados
         resultado = {
             'tipo': 'comparacao',
-            'em_ambos': sorted(list(em_ambos), key=lambda x: int(x)),
-            'so_no_arquivo_a': sorted(list(so_no_a), key=lambda x: int(x)),
-            'so_no_arquivo_b': sorted(list(so_no_b), key=lambda x: int(x)),
+            'em_ambos': em_ambos,
+            'so_no_arquivo_a': so_no_a,
+            'so_no_arquivo_b': so_no_b,
             'count_a': len(set_a),
             'count_b': len(set_b),
             'nome_a': nome_a,
@@ -488,9 +609,9 @@ def executar_comparacao_simples(path_a, path_b, serie_alvo):
     except (FileNotFoundError, ValueError, Exception) as e:
         return {
             'tipo': 'comparacao',
-            'em_ambos': [],
-            'so_no_arquivo_a': [],
-            'so_no_arquivo_b': [],
+            'em_ambos': IntervalSet(),
+            'so_no_arquivo_a': IntervalSet(),
+            'so_no_arquivo_b': IntervalSet(),
             'count_a': 0,
             'count_b': 0,
             'nome_a': os.path.basename(path_a) if path_a else 'Arquivo A',
@@ -537,28 +658,20 @@ def testar_conexao_db_universal(config):
                     'erro': 'Nome do banco não pode estar vazio.'
                 }
             
-            # Credenciais para PostgreSQL (configuráveis via variáveis de ambiente)
-            conn_config = {
-                'host': os.getenv('DB_HOST', 'localhost'),
-                'port': int(os.getenv('DB_PORT', 5432)),
-                'user': os.getenv('DB_USER', 'postgres'),
-                'password': os.getenv('DB_PASS', ''),
-                'dbname': dbname
-            }
+            # Mesmos parâmetros das análises: a conexão do pool é reaproveitada por elas em seguida
+            conn_config = _config_conexao_postgres(config)
             
             # Conectar ao PostgreSQL
-            conn = psycopg2.connect(**conn_config)
-            
-            # Obter versão
-            cursor = conn.cursor()
-            cursor.execute('SELECT version();')
-            versao = cursor.fetchone()[0]
-            cursor.close()
-            conn.close()
+            with pg_pool.connection(conn_config) as conn:
+                # Obter versão
+                cursor = conn.cursor()
+                cursor.execute('SELECT version();')
+                versao = cursor.fetchone()[0]
+                cursor.close()
             
             return {
                 'sucesso': True,
-                'mensagem': f'Conexão estabelecida com sucesso!\nTipo: PostgreSQL (Nuvem)\nBanco: {dbname}\nHost: localhost:5432\nVersão: {versao.split(",")[0]}'
+                'mensagem': f'Conexão estabelecida com sucesso!\nTipo: PostgreSQL (Nuvem)\nBanco: {dbname}\nHost: {conn_config["host"]}:{conn_config["port"]}\nVersão: {versao.split(",")[0]}'
             }
             
         elif tipo == 'local':
@@ -594,12 +707,13 @@ def testar_conexao_db_universal(config):
             # SOLUÇÃO: Usar isql-fb (ferramenta nativa) para evitar problemas de DLL 32/64 bits
             try:
                 from firebird_isql import test_firebird_connection_isql
-                return test_firebird_connection_isql(path, user, password)
+                return test_firebird_connection_isql(path, user, password, config.get('modo_firebird'))
             except ImportError:
                 pass
             
-            # Fallback: Tentar fdb com localhost DSN
-            dsn = f'localhost:{path}'
+            # Fallback: Tentar fdb (arquivo direto pelo engine embarcado ou localhost DSN)
+            firebird_discovery.prepare_client()
+            dsn = firebird_discovery.database_dsn(config)
             
             try:
                 conn = fdb.connect(
@@ -617,7 +731,7 @@ def testar_conexao_db_universal(config):
                 
                 return {
                     'sucesso': True,
-                    'mensagem': f'Conexão estabelecida com sucesso!\\nTipo: Firebird (Local Server)\\nServidor: localhost\\nArquivo: {os.path.basename(path)}\\nUsuário: {user}\\nVersão: {versao}'
+                    'mensagem': f'Conexão estabelecida com sucesso!\\nTipo: Firebird (Local Server)\\nServidor: {"localhost" if dsn != path else "nenhum (embarcado)"}\\nArquivo: {os.path.basename(path)}\\nUsuário: {user}\\nVersão: {versao}'
                 }
             except Exception as e:
                 return {
@@ -719,6 +833,26 @@ def _extrair_cupons_com_serie(texto_bruto):
     return cupons_com_serie
 
 
+def _config_conexao_postgres(config):
+    """
+    Parâmetros de conexão PostgreSQL usados pelo teste de conexão e pelas análises (empresas e cupons).
+    Configuráveis via variáveis de ambiente DB_HOST, DB_PORT, DB_USER e DB_PASS.
+    
+    Args:
+        config (dict): Configuração do banco com 'dbname'
+        
+    Returns:
+        dict: Parâmetros para psycopg2.connect / pg_pool
+    """
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', 5432)),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASS', '123'),
+        'dbname': config.get('dbname', '')
+    }
+
+
 def _ler_config_db_do_ini(path_ini):
     """
     Lê o arquivo .ini e retorna a configuração do banco de dados.
@@ -809,23 +943,20 @@ def executar_analise_db(config, texto_bruto, serie_alvo):
         
         if tipo == 'nuvem':
             # PostgreSQL
-            conn_config = {
-                'host': 'localhost',
-                'port': 5432,
-                'user': 'postgres',
-                'password': '123',
-                'dbname': config.get('dbname')
-            }
-            conn = psycopg2.connect(**conn_config)
+            conn_config = _config_conexao_postgres(config)
+            conn = pg_pool.get_pool(conn_config).getconn()
         elif tipo == 'local':
-            # Firebird - usar localhost DSN (como IBOConsole)
+            # Firebird - arquivo direto pelo engine embarcado se nenhum servidor o tiver aberto,
+            # senão localhost DSN (como IBOConsole)
             path = config.get('path')
-            dsn = f'localhost:{path}'
+            firebird_discovery.prepare_client()
+            dsn = firebird_discovery.database_dsn(config)
             try:
                 conn = fdb.connect(dsn=dsn, user=config.get('user'), password=config.get('password'), charset='UTF8')
             except:
-                # Fallback para embedded
-                conn = fdb.connect(database=path, user=config.get('user'), password=config.get('password'), charset='UTF8')
+                # Fallback para o outro modo (servidor <-> embarcado)
+                conn = fdb.connect(dsn=path if dsn != path else f'localhost:{path}', user=config.get('user'),
+                                   password=config.get('password'), charset='UTF8')
         else:
             return {
                 'tipo': 'analise_db',
@@ -838,61 +969,66 @@ def executar_analise_db(config, texto_bruto, serie_alvo):
                 'erro': f'Tipo de banco inválido: {tipo}'
             }
         
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
         
-        # 4. Preparar listas de resultados
-        prontos_para_inutilizar = []
-        autorizados = []
-        cancelados = []
-        nao_encontrados = []
-        outros_erros = []
+            # 4. Preparar listas de resultados
+            prontos_para_inutilizar = []
+            autorizados = []
+            cancelados = []
+            nao_encontrados = []
+            outros_erros = []
         
-        # 5. Loop principal: processar cada cupom
-        for cupom in cupons:
-            try:
-                # Aplicar padding de 9 dígitos
-                num_formatado = cupom.zfill(9)
+            # 5. Loop principal: processar cada cupom
+            for cupom in cupons:
+                try:
+                    # Aplicar padding de 9 dígitos
+                    num_formatado = cupom.zfill(9)
                 
-                # Query SQL
-                query = """
-                    SELECT nfe_cod_resp, nfe_status, cancelada 
-                    FROM vendas 
-                    WHERE numero_nf = %s AND serie_nf = %s
-                """
+                    # Query SQL
+                    query = """
+                        SELECT nfe_cod_resp, nfe_status, cancelada 
+                        FROM vendas 
+                        WHERE numero_nf = %s AND serie_nf = %s
+                    """
                 
-                cursor.execute(query, (num_formatado, serie_alvo))
-                resultado = cursor.fetchone()
+                    cursor.execute(query, (num_formatado, serie_alvo))
+                    resultado = cursor.fetchone()
                 
-                # Lógica de decisão
-                if not resultado:
-                    # Cupom não encontrado no banco
-                    nao_encontrados.append(cupom)
-                else:
-                    nfe_cod_resp = resultado[0]
-                    nfe_status = resultado[1]
-                    cancelada = resultado[2]
-                    
-                    # Verificar status
-                    if nfe_cod_resp == 'E0001':
-                        # Pronto para inutilizar
-                        prontos_para_inutilizar.append(cupom)
-                    elif nfe_status and 'autoriza' in nfe_status.lower():
-                        # Autorizado (discrepância grave)
-                        autorizados.append(cupom)
-                    elif cancelada and cancelada.upper() == 'S':
-                        # Já cancelado
-                        cancelados.append(cupom)
+                    # Lógica de decisão
+                    if not resultado:
+                        # Cupom não encontrado no banco
+                        nao_encontrados.append(cupom)
                     else:
-                        # Outros casos
-                        outros_erros.append(f"{cupom} (Status: {nfe_status or 'N/A'})")
+                        nfe_cod_resp = resultado[0]
+                        nfe_status = resultado[1]
+                        cancelada = resultado[2]
+                    
+                        # Verificar status
+                        if nfe_cod_resp == 'E0001':
+                            # Pronto para inutilizar
+                            prontos_para_inutilizar.append(cupom)
+                        elif nfe_status and 'autoriza' in nfe_status.lower():
+                            # Autorizado (discrepância grave)
+                            autorizados.append(cupom)
+                        elif cancelada and cancelada.upper() == 'S':
+                            # Já cancelado
+                            cancelados.append(cupom)
+                        else:
+                            # Outros casos
+                            outros_erros.append(f"{cupom} (Status: {nfe_status or 'N/A'})")
                         
-            except Exception as e:
-                # Erro ao processar cupom específico
-                outros_erros.append(f"{cupom} (Erro: {str(e)})")
-        
-        # 6. Fechar conexão
-        cursor.close()
-        conn.close()
+                except Exception as e:
+                    # Erro ao processar cupom específico
+                    outros_erros.append(f"{cupom} (Erro: {str(e)})")
+            
+            cursor.close()
+        finally:
+            # 6. Fechar conexão (PostgreSQL volta para o pool)
+            if tipo == 'nuvem':
+                pg_pool.get_pool(conn_config).putconn(conn)
+            else:
+                conn.close()
         
         # 7. Ordenar resultados
         prontos_para_inutilizar.sort(key=lambda x: int(x))
@@ -1152,89 +1288,86 @@ def converter_pdf_para_excel(path_pdf, temp_excel_path):
         }
 
 
-def obter_empresas_disponiveis(config):
+def obter_empresas_disponiveis(config, sessao_firebird=None):
     """
     Obtém lista de empresas disponíveis no banco de dados.
+    
+    Args:
+        config (dict): Configuração do banco
+        sessao_firebird (firebird_backend.FdbBackend/IsqlBackend): Sessão Firebird já aberta para
+                                                 reaproveitar (opcional). Sem ela, uma sessão temporária é usada.
     """
     try:
         tipo = config.get('tipo')
         
         if tipo == 'nuvem':
             # PostgreSQL (mantém lógica original mas tenta buscar detalhes)
-            dbname = config.get('dbname', '')
-            conn_config = {
-                'host': 'localhost',
-                'port': 5432,
-                'user': 'postgres',
-                'password': '123',
-                'dbname': dbname
-            }
-            conn = psycopg2.connect(**conn_config)
-            cursor = conn.cursor()
+            conn_config = _config_conexao_postgres(config)
+            with pg_pool.connection(conn_config) as conn:
+                cursor = conn.cursor()
             
-            # Tentar buscar detalhes na tabela EMPRESA primeiro
-            try:
-                cursor.execute('SELECT codigo, razao_social, cnpj FROM empresa ORDER BY codigo')
-                rows = cursor.fetchall()
-                # Retorna formato rico: [{'id': '1', 'nome': 'Razao', 'cnpj': '...'}]
-                empresas = []
-                for row in rows:
-                    empresas.append({
-                        'id': str(row[0]),
-                        'nome': row[1] or f"Empresa {row[0]}",
-                        'cnpj': row[2] or ""
-                    })
-            except:
-                # Fallback se não existir tabela empresa
-                conn.rollback() # Limpar erro
-                cursor.execute('SELECT DISTINCT cod_empresa FROM vendas ORDER BY cod_empresa')
-                # Retorna formato simples (apenas ID) mas encapsulado em dict para padronização
-                empresas = [{'id': str(row[0]), 'nome': f"Empresa {row[0]} (Detalhes indisponíveis)", 'cnpj': ''} for row in cursor.fetchall()]
+                # Tentar buscar detalhes na tabela EMPRESA primeiro
+                try:
+                    cursor.execute('SELECT codigo, razao_social, cnpj FROM empresa ORDER BY codigo')
+                    rows = cursor.fetchall()
+                    # Retorna formato rico: [{'id': '1', 'nome': 'Razao', 'cnpj': '...'}]
+                    empresas = []
+                    for row in rows:
+                        empresas.append({
+                            'id': str(row[0]),
+                            'nome': row[1] or f"Empresa {row[0]}",
+                            'cnpj': row[2] or ""
+                        })
+                except:
+                    # Fallback se não existir tabela empresa
+                    conn.rollback() # Limpar erro
+                    cursor.execute('SELECT DISTINCT cod_empresa FROM vendas ORDER BY cod_empresa')
+                    # Retorna formato simples (apenas ID) mas encapsulado em dict para padronização
+                    empresas = [{'id': str(row[0]), 'nome': f"Empresa {row[0]} (Detalhes indisponíveis)", 'cnpj': ''} for row in cursor.fetchall()]
 
-            cursor.close()
-            conn.close()
+                cursor.close()
             
         elif tipo == 'local':
-            # Firebird via ISQL (NOVO)
-            import firebird_isql
+            # Firebird (fdb ou isql; mesma sessão para a consulta EMPRESA e o fallback VENDAS)
+            import firebird_backend
             
             # Tentar buscar detalhes tabela EMPRESA
             # Assumindo colunas CODIGO, RAZAO_SOCIAL, CNPJ conforme pedido
             query = 'SELECT CODIGO, RAZAO_SOCIAL, CNPJ FROM EMPRESA ORDER BY CODIGO'
+            # Fallback: SELECT DISTINCT cod_empresa FROM VENDAS
+            query_fallback = 'SELECT DISTINCT cod_empresa FROM vendas ORDER BY cod_empresa'
             
-            try:
-                rows = firebird_isql.execute_query_isql(config, query)
-                
-                # Se retorno vazio ou erro (isql as vezes não lança exception se tabela nao existe mas retorna erro no stdout que o parser pega como rows vazias ou erro), 
-                # vamos validar se tem conteúdo real.
+            # Sem sessão aberta: uma sessão temporária (um único processo isql, se não houver fdb).
+            # A consulta de VENDAS (varredura da maior tabela) só roda se a de EMPRESA falhar ou vier vazia
+            with _abrir_backend_firebird(config, sessao_firebird) as sessao:
+                try:
+                    rows = sessao.fetch_rows(query)
                 
-                empresas = []
-                # Verificar se rows contém chaves esperadas (parser retorna maiúsculo)
-                if rows and 'CODIGO' in rows[0]:
-                    for row in rows:
-                        empresas.append({
-                            'id': str(row.get('CODIGO')),
-                            'nome': row.get('RAZAO_SOCIAL') or f"Empresa {row.get('CODIGO')}",
-                            'cnpj': row.get('CNPJ') or ""
-                        })
-                else:
-                    raise Exception("Tabela EMPRESA não retornou dados esperados")
+                    # Tabela inexistente gera exceção; tabela vazia cai no fallback também
+                    empresas = []
+                    if rows:
+                        for row in rows:
+                            empresas.append({
+                                'id': str(row[0]),
+                                'nome': row[1] or f"Empresa {row[0]}",
+                                'cnpj': row[2] or ""
+                            })
+                    else:
+                        raise Exception("Tabela EMPRESA não retornou dados esperados")
                     
-            except Exception as e:
-                logger.warning(f"Falha ao buscar tabela EMPRESA: {e}. Usando fallback VENDAS.")
-                # Fallback: SELECT DISTINCT cod_empresa FROM VENDAS
-                query_fallback = 'SELECT DISTINCT cod_empresa FROM vendas ORDER BY cod_empresa'
-                rows = firebird_isql.execute_query_isql(config, query_fallback)
+                except Exception as e:
+                    logger.warning(f"Falha ao buscar tabela EMPRESA: {e}. Usando fallback VENDAS.")
+                    rows = sessao.fetch_rows(query_fallback)
                 
-                empresas = []
-                for row in rows:
-                    val = row.get('COD_EMPRESA')
-                    if val:
-                        empresas.append({
-                            'id': str(val), 
-                            'nome': f"Empresa {val} (Nome não encontrado)", 
-                            'cnpj': ''
-                        })
+                    empresas = []
+                    for row in rows:
+                        val = row[0]
+                        if val:
+                            empresas.append({
+                                'id': str(val), 
+                                'nome': f"Empresa {val} (Nome não encontrado)", 
+                                'cnpj': ''
+                            })
 
             # Deduplicar por ID
             seen_ids = set()
@@ -1264,7 +1397,7 @@ def obter_empresas_disponiveis(config):
         }
 
 
-def executar_analise_db_avancada(config, texto_bruto, lista_series, lista_empresas):
+def executar_analise_db_avancada(config, texto_bruto, lista_series, lista_empresas, sessao_firebird=None):
     """
     Executa análise avançada de cupons via banco de dados com:
     - Múltiplas séries
@@ -1284,6 +1417,8 @@ def executar_analise_db_avancada(config, texto_bruto, lista_series, lista_empres
         texto_bruto (str): Texto com lista de cupons
         lista_series (list): Lista de séries (ex: ['1', '2'])
         lista_empresas (list): Lista de códigos de empresa (ex: ['1', '2'])
+        sessao_firebird (firebird_backend.FdbBackend/IsqlBackend): Sessão Firebird já aberta para
+                                                 reaproveitar (opcional). Sem ela, uma sessão temporária é usada.
         
     Returns:
         dict: Dicionário com resultados agrupados por série
@@ -1305,108 +1440,146 @@ def executar_analise_db_avancada(config, texto_bruto, lista_series, lista_empres
         
         # Dicionário para agrupar por série (inicialização global)
         resultados_por_serie = {}
+        
+        # Cupons agrupados pelo número com padding de 9 dígitos (chave usada nas consultas)
+        cupons_por_numero = _agrupar_cupons_por_numero(cupons_com_serie)
+        numeros = sorted(cupons_por_numero)
+        
+        def _classificar(numero, resultados):
+            """Classifica os cupons de um número assim que todas as suas linhas chegaram."""
+            for cupom, serie_origem in cupons_por_numero[numero]:
+                _processar_resultados_analise(resultados, cupom, serie_origem, lista_series, resultados_por_serie)
+        
+        # Faixas contíguas viram varreduras BETWEEN; avulsos vão em lotes.
+        # Cada unidade de consulta é lida e classificada antes da próxima (memória limitada ao lote)
+        faixas, avulsos = _separar_faixas_contiguas(numeros, TAMANHO_MINIMO_FAIXA, TAMANHO_MAXIMO_FAIXA)
                 
         # ROTEAMENTO POR TIPO DE BANCO
         if tipo == 'nuvem':
             # PostgreSQL (Código existente)
-            dbname = config.get('dbname', '')
-            conn_config = {
-                'host': 'localhost',
-                'port': 5432,
-                'user': 'postgres',
-                'password': '123',
-                'dbname': dbname
-            }
-            conn = psycopg2.connect(**conn_config)
-            cursor = conn.cursor()
-            
-            # Construir query SQL dinâmica
-            placeholders_series = ','.join(['%s'] * len(lista_series))
-            placeholders_empresas = ','.join(['%s'] * len(lista_empresas))
+            conn_config = _config_conexao_postgres(config)
+            with pg_pool.connection(conn_config) as conn:
+                # Construir query SQL dinâmica
+                placeholders_series = ','.join(['%s'] * len(lista_series))
+                placeholders_empresas = ','.join(['%s'] * len(lista_empresas))
             
-            query = f"""
-                SELECT cod_empresa, numero_nf, nfe_chave, nfe_status, 
-                       nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
-                FROM vendas
-                WHERE numero_nf = %s
-                AND serie_nf IN ({placeholders_series})
-                AND cod_empresa IN ({placeholders_empresas})
-            """
+                # Consulta em lote: um array de números por execução em vez de um cupom por vez.
+                # A lista chega como text[]; o cast para o tipo de numero_nf evita "integer = text"
+                tipo_numero = _tipo_coluna_postgres(conn, 'vendas', 'numero_nf')
+                query_lote = f"""
+                    SELECT cod_empresa, numero_nf, nfe_chave, nfe_status, 
+                           nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
+                    FROM vendas
+                    WHERE numero_nf = ANY(%s::{tipo_numero}[])
+                    AND serie_nf IN ({placeholders_series})
+                    AND cod_empresa IN ({placeholders_empresas})
+                """
             
-            # Loop e Execução (Postgres)
-            for cupom, serie_origem in sorted(cupons_com_serie.items(), key=lambda x: int(x[0])):
-                # Aplicar padding de 9 dígitos
-                cupom_padded = cupom.zfill(9)
-                
-                params = [cupom_padded] + lista_series + lista_empresas
-                cursor.execute(query, params)
-                resultados = cursor.fetchall()
+                # Consulta por faixa: uma varredura indexada por série para cada sequência contígua
+                query_faixa = f"""
+                    SELECT cod_empresa, numero_nf, nfe_chave, nfe_status, 
+                           nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
+                    FROM vendas
+                    WHERE serie_nf = %s
+                    AND numero_nf BETWEEN %s AND %s
+                    AND cod_empresa IN ({placeholders_empresas})
+                """
                 
-                # Processar resultados (função auxiliar abaixo)
-                _processar_resultados_analise(resultados, cupom, serie_origem, lista_series, resultados_por_serie)
+                limite_tabela_temporaria = int(config.get('limite_tabela_temporaria', LIMITE_TABELA_TEMPORARIA))
+                if len(numeros) >= limite_tabela_temporaria:
+                    # Listas muito grandes: carga via COPY em tabela temporária + um único JOIN
+                    _consultar_postgres_tabela_temporaria(conn, numeros, lista_series, lista_empresas, _classificar)
+                else:
+                    # Unidades: (consultas, números cobertos)
+                    unidades = []
+                    for faixa in faixas:
+                        consultas = [(query_faixa, [serie, faixa[0], faixa[-1]] + lista_empresas) for serie in lista_series]
+                        unidades.append((consultas, faixa))
+                    for lote in _dividir_em_lotes(avulsos, TAMANHO_LOTE_POSTGRES):
+                        unidades.append(([(query_lote, [lote] + lista_series + lista_empresas)], lote))
+                    
+                    cursor = conn.cursor()
+                    for consultas, numeros_unidade in unidades:
+                        linhas_por_numero = {}
+                        for query, params in consultas:
+                            cursor.execute(query, params)
+                            _agrupar_por_numero(cursor, linhas_por_numero, set(numeros_unidade))
+                        for numero in numeros_unidade:
+                            _classificar(numero, linhas_por_numero.get(numero, []))
+                    cursor.close()
                 
-            cursor.close()
-            conn.close()
+                    logger.debug(f"PostgreSQL: {len(numeros)} cupons consultados em {len(unidades)} unidade(s) "
+                                 f"({len(faixas)} faixa(s), {len(avulsos)} avulso(s))")
 
         elif tipo == 'local':
-            # Firebird via ISQL (NOVO)
-            import firebird_isql
+            # Firebird (fdb com statements preparados, ou isql se o driver não for utilizável)
+            import firebird_backend
             
-            # Construir query SQL para Firebird (ISQL requer IN com valores literais na query,
-            # pois nossa função de execução simples não suporta lista no IN via parametro bind simulado)
+            # Faixas prontas; avulsos cortados em lotes IN de tamanho adaptativo (AIMD): o lote cresce
+            # enquanto as consultas ficam abaixo do tempo alvo e cai pela metade quando passam dele.
+            # Unidade que estoura o tempo (timeout proporcional ao tamanho) é repetida em duas metades;
+            # se ainda assim falhar, a fila é cancelada e a análise retorna erro com os cupons não consultados
+            lote = firebird_backend.AdaptiveBatchSize(
+                LOTE_INICIAL_FIREBIRD, LOTE_MINIMO_FIREBIRD, LIMITE_IN_FIREBIRD, PASSO_LOTE_FIREBIRD
+            )
             
-            str_series = ", ".join([f"'{s}'" for s in lista_series])
-            str_empresas = ", ".join([f"'{e}'" for e in lista_empresas])
+            # Loop e Execução: unidades distribuídas entre a sessão principal e,
+            # se configurado, sessões paralelas adicionais (limitadas por banco).
+            # Cada unidade é classificada assim que termina (a ordem final é normalizada no fim)
+            workers = max(1, int(config.get('workers_firebird', WORKERS_FIREBIRD)))
             
-            # Query base (sem o numero_nf ainda)
-            query_base = f"""
-                SELECT cod_empresa, numero_nf, nfe_chave, nfe_status, 
-                       nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
-                FROM vendas
-                WHERE serie_nf IN ({str_series})
-                AND cod_empresa IN ({str_empresas})
-                AND numero_nf = 
-            """
+            limite_tabela_temporaria = int(config.get('limite_tabela_temporaria_firebird',
+                                                      LIMITE_TABELA_TEMPORARIA_FIREBIRD))
             
-            # Loop e Execução (ISQL)
-            total_items = len(cupons_com_serie)
-            for idx, (cupom, serie_origem) in enumerate(sorted(cupons_com_serie.items(), key=lambda x: int(x[0]))):
-                if idx % 5 == 0:
-                    logger.debug(f"Processando cupom {idx+1}/{total_items} no Firebird...")
-                    
-                cupom_padded = cupom.zfill(9)
+            erro_firebird = None
+            consultados = set()
+            restantes = numeros
+            
+            inicio = time.perf_counter()
+            with _abrir_backend_firebird(config, sessao_firebird) as sessao:
+                # Listas muito grandes: carga em tabela temporária global (EXECUTE BLOCK) + um único JOIN.
+                # Se a carga falhar (ex: usuário sem permissão para criar a tabela) ou o JOIN falhar no meio,
+                # os números ainda não classificados seguem pelos lotes IN
+                if len(numeros) >= limite_tabela_temporaria:
+                    restantes = _consultar_firebird_tabela_temporaria(
+                        sessao, numeros, lista_series, lista_empresas, _classificar
+                    )
+                    if restantes and len(restantes) < len(numeros):
+                        faixas, avulsos = _separar_faixas_contiguas(restantes, TAMANHO_MINIMO_FAIXA, TAMANHO_MAXIMO_FAIXA)
                 
-                # Montar query final com o número
-                query_final = f"{query_base} '{cupom_padded}'"
+                fila = _FilaUnidadesFirebird(faixas, avulsos, lista_series, lista_empresas, lote)
+                unidades_estimadas = len(faixas) + -(-len(avulsos) // lote.size)
                 
-                # Executar
-                try:
-                    rows = firebird_isql.execute_query_isql(config, query_final)
-                    
-                    # Converter formato de dict para tupla (compatibilidade com lógica existente)
-                    # Ordem esperada: cod_empresa, numero_nf, nfe_chave, nfe_status, 
-                    #                 nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
-                    resultados = []
-                    for r in rows:
-                        tup = (
-                            r.get('COD_EMPRESA'),
-                            r.get('NUMERO_NF'),
-                            r.get('NFE_CHAVE'),
-                            r.get('NFE_STATUS'),
-                            r.get('NFE_CONTINGENCIA'),
-                            r.get('CANCELADA'),
-                            r.get('SERIE_NF'),
-                            r.get('NFE_COD_RESP')
-                        )
-                        resultados.append(tup)
-                    
-                    # Processar resultados
-                    _processar_resultados_analise(resultados, cupom, serie_origem, lista_series, resultados_por_serie)
-                    
-                except Exception as e:
-                    logger.error(f"Erro ao consultar cupom {cupom}: {str(e)}")
-                    # Tratar como não encontrado/erro
-                    # ... (lógica de erro pode ser adicionada aqui se necessário)
+                if restantes:
+                    with firebird_backend.open_parallel_sessions(config, min(workers, unidades_estimadas) - 1) as extras:
+                        sessoes = [sessao] + extras
+                        logger.debug(f"Firebird ({sessao.name}): ~{unidades_estimadas} unidade(s) em {len(sessoes)} sessão(ões)")
+                        
+                        for numeros_unidade, linhas_por_numero in _executar_unidades_firebird(sessoes, fila):
+                            if isinstance(linhas_por_numero, Exception):
+                                # Sem como completar a análise: não inicia as unidades restantes
+                                logger.error(f"Erro na consulta ({numeros_unidade[0]} a {numeros_unidade[-1]}): {str(linhas_por_numero)}")
+                                erro_firebird = erro_firebird or linhas_por_numero
+                                fila.cancelar()
+                                continue
+                            for numero in numeros_unidade:
+                                _classificar(numero, linhas_por_numero.get(numero, []))
+                                consultados.add(numero)
+            
+            if restantes:
+                duracao = time.perf_counter() - inicio
+                logger.info(f"Firebird: {len(restantes)} cupons em {fila.total_unidades} unidade(s) "
+                            f"({len(faixas)} faixa(s), {len(avulsos)} avulso(s), lote final {lote.size}), {duracao:.2f}s "
+                            f"({len(restantes) / duracao if duracao > 0 else 0:.1f} cupons/s)")
+            
+            if erro_firebird is not None:
+                # Cupons de unidades com erro (e das que não chegaram a rodar) não podem ser omitidos do resultado
+                nao_consultados = [cupom for numero in restantes if numero not in consultados
+                                   for cupom, _ in cupons_por_numero[numero]]
+                return _resultado_cupons_nao_consultados(nao_consultados, erro_firebird)
+        
+        # Ordem final igual à da classificação sequencial (por número do cupom)
+        resultados_por_serie = _ordenar_resultados_por_cupom(resultados_por_serie, cupons_com_serie, lista_series)
 
         return {
             'total_processados': len(cupons_com_serie),
@@ -1422,6 +1595,608 @@ def executar_analise_db_avancada(config, texto_bruto, lista_series, lista_empres
         }
 
 
+def executar_analise_multibanco(lista_configs, texto_bruto, lista_series, lista_empresas):
+    """
+    Executa a análise avançada em vários bancos ao mesmo tempo (ex: uma série em várias lojas).
+    Usa o motor assíncrono (async_engine), com concorrência limitada por servidor;
+    a chamada é síncrona e pode ser feita da thread de análise da interface.
+    A interface ainda não oferece análise de vários bancos: por ora é API para scripts e integrações.
+    
+    Args:
+        lista_configs (list): Configurações de banco (mesmo formato de executar_analise_db_avancada;
+                              'nome' opcional identifica o banco no resultado)
+        texto_bruto (str): Texto com lista de cupons
+        lista_series (list): Lista de séries (ex: ['1', '2'])
+        lista_empresas (list): Lista de códigos de empresa (ex: ['1', '2'])
+        
+    Returns:
+        dict: {'resultados_por_banco': {nome: resultado de executar_analise_db_avancada}, 'erro': None}
+    """
+    try:
+        import async_engine
+        return async_engine.run_sync(
+            async_engine.analyze_databases(lista_configs, texto_bruto, lista_series, lista_empresas)
+        )
+    except Exception as e:
+        return {
+            'erro': f'Erro na análise: {str(e)}',
+            'resultados_por_banco': {}
+        }
+
+
+def _resultado_cupons_nao_consultados(cupons, erro):
+    """
+    Resultado de uma análise Firebird em que parte dos cupons não pôde ser consultada:
+    erro com a quantidade e os primeiros CUPONS_LISTADOS_NO_ERRO cupons, nunca um resultado parcial.
+    
+    Args:
+        cupons (list): Cupons não consultados
+        erro: Primeiro erro ocorrido (Exception ou texto)
+        
+    Returns:
+        dict: {'erro', 'cupons_nao_consultados', 'total_processados': 0}
+    """
+    listados = ', '.join(cupons[:CUPONS_LISTADOS_NO_ERRO])
+    if len(cupons) > CUPONS_LISTADOS_NO_ERRO:
+        listados += f" ... (+{len(cupons) - CUPONS_LISTADOS_NO_ERRO})"
+    return {
+        'erro': (f'Erro na análise: {len(cupons)} cupom(ns) não puderam ser consultados '
+                 f'no Firebird ({str(erro)}): {listados}'),
+        'cupons_nao_consultados': cupons,
+        'total_processados': 0
+    }
+
+
+def _montar_unidades_firebird(faixas, avulsos, lista_series, lista_empresas):
+    """
+    Monta as unidades de consulta Firebird da análise avançada com lotes de tamanho fixo
+    (faixas contíguas via BETWEEN e avulsos em lotes IN).
+    
+    Args:
+        faixas (list): Sequências contíguas de números (ver _separar_faixas_contiguas)
+        avulsos (list): Números restantes
+        lista_series (list): Séries consultadas
+        lista_empresas (list): Empresas consultadas
+        
+    Returns:
+        list: [(consultas, numeros_cobertos)] onde consultas é uma lista de (query, params)
+    """
+    # Todos os lotes com o mesmo número de placeholders, para o statement ser preparado uma única vez
+    tamanho_lote = min(LIMITE_IN_FIREBIRD, len(avulsos)) or 1
+    
+    # Unidades: (consultas, números cobertos); um erro invalida a unidade inteira
+    unidades = [_unidade_faixa_firebird(faixa, lista_series, lista_empresas) for faixa in faixas]
+    for lote in _dividir_em_lotes(avulsos, tamanho_lote):
+        unidades.append(_unidade_lote_firebird(lote, lista_series, lista_empresas, tamanho_lote))
+    return unidades
+
+
+def _unidade_faixa_firebird(faixa, lista_series, lista_empresas):
+    """
+    Unidade de consulta por faixa: uma varredura indexada (BETWEEN) por série para uma sequência contígua.
+    Placeholders '?': preparados no fdb, interpolados na sessão isql.
+    
+    Returns:
+        tuple: (consultas, numeros_cobertos)
+    """
+    ph_empresas = ", ".join(['?'] * len(lista_empresas))
+    query_faixa = f"""
+        SELECT cod_empresa, numero_nf, nfe_chave, nfe_status, 
+               nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
+        FROM vendas
+        WHERE cod_empresa IN ({ph_empresas})
+        AND serie_nf = ?
+        AND numero_nf BETWEEN ? AND ?
+    """
+    return [(query_faixa, lista_empresas + [serie, faixa[0], faixa[-1]]) for serie in lista_series], faixa
+
+
+def _unidade_lote_firebird(lote, lista_series, lista_empresas, tamanho_lote=None):
+    """
+    Unidade de consulta em lote (numero_nf IN (...)).
+    A lista IN é completada até `tamanho_lote` placeholders repetindo o último número
+    (padrão: próximo múltiplo de PASSO_LOTE_FIREBIRD), para que lotes de tamanhos
+    próximos reaproveitem o mesmo statement preparado.
+    
+    Returns:
+        tuple: (consultas, numeros_cobertos)
+    """
+    if tamanho_lote is None:
+        tamanho_lote = min(LIMITE_IN_FIREBIRD, -(-len(lote) // PASSO_LOTE_FIREBIRD) * PASSO_LOTE_FIREBIRD)
+    
+    ph_series = ", ".join(['?'] * len(lista_series))
+    ph_empresas = ", ".join(['?'] * len(lista_empresas))
+    query_lote = f"""
+        SELECT cod_empresa, numero_nf, nfe_chave, nfe_status, 
+               nfe_contingencia, cancelada, serie_nf, nfe_cod_resp
+        FROM vendas
+        WHERE serie_nf IN ({ph_series})
+        AND cod_empresa IN ({ph_empresas})
+        AND numero_nf IN ({", ".join(['?'] * tamanho_lote)})
+    """
+    lote_completo = lote + [lote[-1]] * (tamanho_lote - len(lote))
+    return [(query_lote, lista_series + lista_empresas + lote_completo)], lote
+
+
+class _FilaUnidadesFirebird:
+    """
+    Fila de unidades de consulta Firebird da análise avançada, compartilhada pelas sessões.
+    - Faixas entram prontas; avulsos são cortados em lotes sob demanda, no tamanho atual do lote adaptativo
+    - Uma unidade que estoura o tempo pode voltar à fila dividida em duas metades
+      (até DIVISOES_MAXIMAS_FIREBIRD vezes, sem metades menores que LOTE_MINIMO_FIREBIRD)
+    - cancelar() esvazia a fila quando a análise já falhou
+    """
+    
+    def __init__(self, faixas, avulsos, lista_series, lista_empresas, lote):
+        """
+        Args:
+            faixas (list): Sequências contíguas de números
+            avulsos (list): Números restantes (ordenados)
+            lista_series (list): Séries consultadas
+            lista_empresas (list): Empresas consultadas
+            lote (firebird_backend.AdaptiveBatchSize): Tamanho de lote adaptativo dos avulsos
+        """
+        self.lote = lote
+        self.total_unidades = 0
+        self._lista_series = lista_series
+        self._lista_empresas = lista_empresas
+        self._pendentes = collections.deque(('faixa', faixa, 0) for faixa in faixas)
+        self._avulsos = avulsos
+        self._posicao = 0
+        self._lock = threading.Lock()
+    
+    def proxima(self):
+        """
+        Retorna a próxima unidade (tipo, numeros, consultas, divisoes) ou None se a fila acabou.
+        tipo: 'faixa' ou 'lote'; divisoes: quantas vezes a unidade já foi dividida.
+        """
+        with self._lock:
+            if self._pendentes:
+                tipo, numeros, divisoes = self._pendentes.popleft()
+            elif self._posicao < len(self._avulsos):
+                tipo, divisoes = 'lote', 0
+                numeros = self._avulsos[self._posicao:self._posicao + self.lote.size]
+                self._posicao += len(numeros)
+            else:
+                return None
+            self.total_unidades += 1
+        
+        if tipo == 'faixa':
+            consultas, _ = _unidade_faixa_firebird(numeros, self._lista_series, self._lista_empresas)
+        else:
+            consultas, _ = _unidade_lote_firebird(numeros, self._lista_series, self._lista_empresas)
+        return tipo, numeros, consultas, divisoes
+    
+    def dividir(self, tipo, numeros, divisoes):
+        """
+        Recoloca a unidade no início da fila em duas metades.
+        
+        Returns:
+            bool: False se a unidade já foi dividida DIVISOES_MAXIMAS_FIREBIRD vezes ou se as
+                  metades ficariam menores que LOTE_MINIMO_FIREBIRD (a unidade falha)
+        """
+        meio = len(numeros) // 2
+        if divisoes >= DIVISOES_MAXIMAS_FIREBIRD or meio < LOTE_MINIMO_FIREBIRD:
+            return False
+        with self._lock:
+            self._pendentes.appendleft((tipo, numeros[meio:], divisoes + 1))
+            self._pendentes.appendleft((tipo, numeros[:meio], divisoes + 1))
+        return True
+    
+    def cancelar(self):
+        """Descarta as unidades ainda não iniciadas (as que estão em andamento terminam normalmente)."""
+        with self._lock:
+            self._pendentes.clear()
+            self._posicao = len(self._avulsos)
+
+
+def _abrir_backend_firebird(config, sessao_firebird=None):
+    """
+    Retorna um context manager com o backend Firebird a ser usado (fdb ou isql, ver firebird_backend).
+    Se uma sessão foi recebida, ela é reaproveitada e NÃO é fechada ao sair do bloco
+    (quem a criou é responsável por fechá-la); senão, abre uma sessão temporária.
+    """
+    if sessao_firebird is not None:
+        return contextlib.nullcontext(sessao_firebird)
+    
+    import firebird_backend
+    return firebird_backend.open_backend(config)
+
+
+def _tipo_coluna_postgres(conn, tabela, coluna):
+    """
+    Obtém o tipo SQL declarado de uma coluna no PostgreSQL (ex: 'integer', 'character varying(20)').
+    
+    Args:
+        conn: Conexão PostgreSQL
+        tabela (str): Nome da tabela
+        coluna (str): Nome da coluna
+    
+    Returns:
+        str: Tipo no formato aceito por um cast
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attname = %s AND NOT attisdropped",
+            [tabela, coluna]
+        )
+        linha = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not linha:
+        raise Exception(f"Coluna {coluna} não encontrada na tabela {tabela}")
+    return linha[0]
+
+
+def _consultar_postgres_tabela_temporaria(conn, numeros, lista_series, lista_empresas, classificar):
+    """
+    Consulta em massa no PostgreSQL: carrega os pares (numero_nf, serie_nf) numa tabela
+    temporária da sessão via COPY FROM STDIN e faz um único JOIN com vendas.
+    O resultado é lido aos poucos por um cursor no servidor, ordenado por numero_nf,
+    e cada número é classificado assim que suas linhas terminam de chegar.
+    
+    Args:
+        conn: Conexão PostgreSQL (dentro de uma transação; a tabela é esvaziada no fim dela)
+        numeros (list): Números de cupom com padding de 9 dígitos
+        lista_series (list): Séries consultadas
+        lista_empresas (list): Códigos de empresa
+        classificar (callable): classificar(numero, linhas), chamada uma vez por número
+    """
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    
+    # Colunas com os mesmos tipos de vendas (texto ou inteiro), para o JOIN comparar sem conversão
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS cupons_analise ON COMMIT DELETE ROWS AS
+        SELECT numero_nf, serie_nf FROM vendas WITH NO DATA
+    """)
+    cursor.execute("TRUNCATE cupons_analise")
+    
+    # Formato texto do COPY: colunas separadas por TAB, uma linha por par
+    def _escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+    
+    dados = io.StringIO(''.join(
+        f"{numero}\t{_escapar(serie)}\n" for numero in numeros for serie in lista_series
+    ))
+    cursor.copy_expert("COPY cupons_analise (numero_nf, serie_nf) FROM STDIN", dados)
+    cursor.execute("ANALYZE cupons_analise")
+    cursor.close()
+    
+    placeholders_empresas = ','.join(['%s'] * len(lista_empresas))
+    query = f"""
+        SELECT v.cod_empresa, v.numero_nf, v.nfe_chave, v.nfe_status, 
+               v.nfe_contingencia, v.cancelada, v.serie_nf, v.nfe_cod_resp
+        FROM vendas v
+        JOIN cupons_analise t ON t.numero_nf = v.numero_nf AND t.serie_nf = v.serie_nf
+        WHERE v.cod_empresa IN ({placeholders_empresas})
+        ORDER BY v.numero_nf
+    """
+    
+    # Cursor nomeado (no servidor): as linhas chegam em blocos, sem materializar tudo no cliente
+    pendentes = set(numeros)
+    cursor_join = conn.cursor(name='analise_cupons_join')
+    cursor_join.itersize = TAMANHO_FETCH_POSTGRES
+    cursor_join.execute(query, lista_empresas)
+    for numero, linhas in itertools.groupby(cursor_join, key=lambda linha: str(linha[1]).strip().zfill(9)):
+        if numero in pendentes:
+            pendentes.discard(numero)
+            classificar(numero, list(linhas))
+    cursor_join.close()
+    
+    # Números sem nenhuma linha no JOIN: não encontrados
+    for numero in sorted(pendentes):
+        classificar(numero, [])
+    
+    logger.info(f"PostgreSQL: {len(numeros)} cupons via tabela temporária em "
+                f"{time.perf_counter() - inicio:.2f}s")
+
+
+def _consultar_firebird_tabela_temporaria(sessao, numeros, lista_series, lista_empresas, classificar):
+    """
+    Consulta em massa no Firebird: carrega os pares (numero_nf, serie_nf) na tabela temporária
+    global TABELA_TEMPORARIA_FIREBIRD (EXECUTE BLOCKs de inserts) e faz um único JOIN com vendas,
+    ordenado por numero_nf; cada número é classificado assim que suas linhas terminam de chegar.
+    As linhas da tabela são descartadas no COMMIT do fim (ON COMMIT DELETE ROWS).
+    
+    Args:
+        sessao (firebird_backend.FdbBackend/IsqlBackend): Sessão Firebird aberta
+        numeros (list): Números de cupom com padding de 9 dígitos
+        lista_series (list): Séries consultadas
+        lista_empresas (list): Códigos de empresa
+        classificar (callable): classificar(numero, linhas), chamada uma vez por número
+        
+    Returns:
+        list: Números que ainda precisam ser consultados pelos lotes IN: todos se a tabela não pôde
+              ser criada/carregada, os que faltavam se o JOIN falhou no meio, vazia se tudo foi classificado
+    """
+    import firebird_backend
+    
+    def _timeout(pares):
+        estimado = pares * SEGUNDOS_POR_PAR_TABELA_TEMPORARIA_FIREBIRD * firebird_backend.TIMEOUT_FACTOR
+        return max(firebird_backend.MIN_TIMEOUT, min(firebird_backend.MAX_TIMEOUT, estimado))
+    
+    def _descartar_tabela():
+        try:
+            sessao.commit()  # Descarta o que chegou a ser carregado
+        except Exception:
+            pass
+    
+    inicio = time.perf_counter()
+    try:
+        # Colunas com os mesmos tipos de vendas, para o JOIN comparar sem conversão
+        tipos = firebird_backend.column_sql_types(sessao, 'vendas')
+        colunas = [(coluna, tipos.get(coluna.upper())) for coluna in ('numero_nf', 'serie_nf')]
+        for coluna, tipo in colunas:
+            if tipo is None:
+                raise Exception(f"tipo da coluna {coluna} de vendas não suportado")
+        firebird_backend.load_temporary_table(
+            sessao,
+            TABELA_TEMPORARIA_FIREBIRD,
+            colunas,
+            ((numero, serie) for numero in numeros for serie in lista_series),
+            timeout=_timeout(firebird_backend.EXECUTE_BLOCK_ROWS)
+        )
+    except Exception as e:
+        logger.warning(f"Firebird: tabela temporária indisponível ({str(e)}). Usando lotes IN.")
+        _descartar_tabela()
+        return list(numeros)
+    carga = time.perf_counter() - inicio
+    
+    # vendas primeiro no FROM: o backend isql converte os valores pelos tipos dessa tabela
+    placeholders_empresas = ', '.join(['?'] * len(lista_empresas))
+    query = f"""
+        SELECT v.cod_empresa, v.numero_nf, v.nfe_chave, v.nfe_status, 
+               v.nfe_contingencia, v.cancelada, v.serie_nf, v.nfe_cod_resp
+        FROM vendas v
+        JOIN {TABELA_TEMPORARIA_FIREBIRD} t ON t.numero_nf = v.numero_nf AND t.serie_nf = v.serie_nf
+        WHERE v.cod_empresa IN ({placeholders_empresas})
+        ORDER BY v.numero_nf
+    """
+    
+    pendentes = set(numeros)
+    try:
+        linhas_join = sessao.iter_rows(query, lista_empresas, _timeout(len(numeros) * len(lista_series)))
+        for numero, linhas in itertools.groupby(linhas_join, key=lambda linha: str(linha[1]).strip().zfill(9)):
+            if numero in pendentes:
+                linhas = list(linhas)  # Grupo lido por inteiro antes de sair dos pendentes
+                pendentes.discard(numero)
+                classificar(numero, linhas)
+    except Exception as e:
+        # Números já classificados chegaram completos (grupos fechados); os demais vão pelos lotes IN
+        logger.warning(f"Firebird: falha no JOIN com a tabela temporária ({str(e)}). "
+                       f"{len(pendentes)} cupons seguem pelos lotes IN.")
+        _descartar_tabela()
+        return sorted(pendentes)
+    sessao.commit()
+    
+    # Números sem nenhuma linha no JOIN: não encontrados
+    for numero in sorted(pendentes):
+        classificar(numero, [])
+    
+    logger.info(f"Firebird ({sessao.name}): {len(numeros)} cupons via tabela temporária em "
+                f"{time.perf_counter() - inicio:.2f}s (carga {carga:.2f}s)")
+    return []
+
+
+def _executar_unidades_firebird(sessoes, fila):
+    """
+    Executa as unidades de consulta Firebird distribuindo-as entre as sessões (uma thread por sessão).
+    Cada sessão retira uma unidade da fila por vez; as linhas são lidas em fluxo (iter_rows)
+    e agrupadas por número apenas dentro da unidade.
+    
+    Cada consulta recebe um timeout proporcional ao tamanho da unidade (ver AdaptiveBatchSize);
+    a duração medida ajusta o tamanho dos próximos lotes. Unidade que estoura o tempo volta
+    à fila dividida ao meio (limitado por _FilaUnidadesFirebird.dividir) em vez de falhar.
+    
+    Args:
+        sessoes (list): Backends Firebird abertos (iter_rows)
+        fila (_FilaUnidadesFirebird): Fila de unidades
+        
+    Yields:
+        tuple: (números da unidade, {numero: [linhas]} ou a Exception ocorrida), na ordem em que terminam
+    """
+    import firebird_backend
+    
+    def _executar(sessao, tipo, numeros_unidade, consultas, divisoes):
+        """Executa a unidade; None se ela voltou dividida para a fila."""
+        logger.debug(f"Consultando {tipo} de {len(numeros_unidade)} cupons no Firebird...")
+        # Faixas têm latência própria: o custo por item de um BETWEEN não serve para os lotes IN
+        kind = firebird_backend.RANGE if tipo == 'faixa' else firebird_backend.BATCH
+        timeout = fila.lote.timeout_for(len(numeros_unidade), kind)
+        inicio = time.perf_counter()
+        try:
+            linhas_por_numero = {}
+            solicitados = set(numeros_unidade)
+            for query, params in consultas:
+                _agrupar_por_numero(sessao.iter_rows(query, params, timeout), linhas_por_numero, solicitados)
+        except firebird_backend.QueryTimeout as e:
+            fila.lote.record_timeout(len(numeros_unidade), kind)
+            if fila.dividir(tipo, numeros_unidade, divisoes):
+                logger.warning(f"Tempo esgotado na consulta ({numeros_unidade[0]} a {numeros_unidade[-1]}, "
+                               f"{len(numeros_unidade)} cupons). Repetindo em duas metades.")
+                return None
+            return e
+        except Exception as e:
+            return e
+        
+        # Só lotes ajustam o tamanho; faixas atualizam apenas a própria latência
+        fila.lote.record(len(numeros_unidade), time.perf_counter() - inicio, kind)
+        return linhas_por_numero
+    
+    if len(sessoes) == 1:
+        while True:
+            unidade = fila.proxima()
+            if unidade is None:
+                return
+            resultado = _executar(sessoes[0], *unidade)
+            if resultado is not None:
+                yield unidade[1], resultado
+    
+    resultados = queue.Queue()
+    
+    def _trabalhador(sessao):
+        try:
+            while True:
+                unidade = fila.proxima()
+                if unidade is None:
+                    return
+                resultado = _executar(sessao, *unidade)
+                if resultado is not None:
+                    resultados.put((unidade[1], resultado))
+        finally:
+            resultados.put(None)  # Sessão terminou
+    
+    with ThreadPoolExecutor(max_workers=len(sessoes)) as executor:
+        for sessao in sessoes:
+            executor.submit(_trabalhador, sessao)
+        
+        ativos = len(sessoes)
+        while ativos:
+            item = resultados.get()
+            if item is None:
+                ativos -= 1
+                continue
+            yield item
+
+
+def _ordenar_resultados_por_cupom(resultados_por_serie, cupons_com_serie, lista_series):
+    """
+    Reordena os resultados como se os cupons tivessem sido classificados um a um em ordem
+    numérica: listas ordenadas pelo cupom e séries na ordem em que apareceriam primeiro.
+    Permite classificar por unidade de consulta (em qualquer ordem) sem mudar a saída.
+    
+    Args:
+        resultados_por_serie (dict): {serie: {categoria: [itens]}}
+        cupons_com_serie (dict): Cupons da análise {cupom: serie_origem}
+        lista_series (list): Séries consultadas (desempate entre séries do mesmo cupom)
+        
+    Returns:
+        dict: Novo dicionário com a mesma estrutura, reordenado
+    """
+    posicao = {cupom: pos for pos, (cupom, _) in enumerate(sorted(cupons_com_serie.items(), key=lambda x: int(x[0])))}
+    
+    def _chave_serie(serie):
+        primeira = min(
+            (posicao[item['cupom']] for itens in resultados_por_serie[serie].values() for item in itens),
+            default=len(posicao)
+        )
+        desempate = lista_series.index(serie) if serie in lista_series else len(lista_series)
+        return (primeira, desempate)
+    
+    return {
+        serie: {
+            categoria: sorted(itens, key=lambda item: posicao[item['cupom']])
+            for categoria, itens in resultados_por_serie[serie].items()
+        }
+        for serie in sorted(resultados_por_serie, key=_chave_serie)
+    }
+
+
+def _agrupar_cupons_por_numero(cupons_com_serie):
+    """
+    Agrupa os cupons pelo número com padding de 9 dígitos (chave usada nas consultas).
+    
+    Args:
+        cupons_com_serie (dict): {cupom: serie_origem}
+        
+    Returns:
+        dict: {numero_com_padding: [(cupom, serie_origem), ...]}
+    """
+    cupons_por_numero = {}
+    for cupom, serie_origem in cupons_com_serie.items():
+        cupons_por_numero.setdefault(cupom.zfill(9), []).append((cupom, serie_origem))
+    return cupons_por_numero
+
+
+def _dividir_em_lotes(itens, tamanho):
+    """
+    Divide uma lista em lotes consecutivos de no máximo `tamanho` itens.
+    
+    Args:
+        itens (list): Lista a ser dividida
+        tamanho (int): Tamanho máximo de cada lote
+        
+    Returns:
+        list: Lista de sublistas
+    """
+    return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
+
+def _agrupar_por_numero(resultados, linhas_por_numero=None, numeros_solicitados=None):
+    """
+    Agrupa as linhas retornadas pela query de análise por numero_nf.
+    A chave é normalizada com padding de 9 dígitos, igual ao usado na consulta.
+    
+    Args:
+        resultados (iterable): Tuplas na ordem cod_empresa, numero_nf, nfe_chave, ...
+        linhas_por_numero (dict): Dicionário a ser completado (opcional)
+        numeros_solicitados (set): Se informado, descarta linhas de números fora do conjunto
+                                   (varreduras por faixa podem trazer números não pedidos)
+        
+    Returns:
+        dict: {numero_nf_com_padding: [linhas]}
+    """
+    if linhas_por_numero is None:
+        linhas_por_numero = {}
+    
+    for linha in resultados:
+        numero = str(linha[1]).strip().zfill(9)
+        if numeros_solicitados is not None and numero not in numeros_solicitados:
+            continue
+        linhas_por_numero.setdefault(numero, []).append(linha)
+    
+    return linhas_por_numero
+
+
+def _separar_faixas_contiguas(numeros, tamanho_minimo, tamanho_maximo=None):
+    """
+    Separa números de cupom (com padding de 9 dígitos) em sequências contíguas e avulsos.
+    Sequências com pelo menos `tamanho_minimo` números podem ser lidas com um único
+    BETWEEN por série; os demais seguem para a consulta em lote.
+    
+    Args:
+        numeros (list): Números de cupom ordenados (strings com padding)
+        tamanho_minimo (int): Tamanho mínimo de uma sequência para virar faixa
+        tamanho_maximo (int): Sequências maiores são quebradas em faixas deste tamanho (opcional)
+        
+    Returns:
+        tuple: (faixas, avulsos) onde faixas é uma lista de listas de números contíguos
+               e avulsos é a lista dos números restantes
+    """
+    faixas = []
+    avulsos = []
+    sequencia = []
+    
+    # Apenas números de 9 dígitos: a comparação textual do BETWEEN equivale à numérica
+    candidatos = []
+    for numero in numeros:
+        if len(numero) == 9 and numero.isdigit():
+            candidatos.append(numero)
+        else:
+            avulsos.append(numero)
+    candidatos.sort(key=int)
+    
+    def _fechar_sequencia():
+        if len(sequencia) >= tamanho_minimo:
+            faixas.extend(_dividir_em_lotes(sequencia, tamanho_maximo or len(sequencia)))
+        else:
+            avulsos.extend(sequencia)
+    
+    for numero in candidatos:
+        if sequencia and int(numero) != int(sequencia[-1]) + 1:
+            _fechar_sequencia()
+            sequencia = []
+        sequencia.append(numero)
+    if sequencia:
+        _fechar_sequencia()
+    
+    avulsos.sort(key=lambda x: (len(x), x))
+    return faixas, avulsos
+
+
 def _processar_resultados_analise(resultados, cupom, serie_origem, lista_series, resultados_por_serie):
     """
     Função auxiliar para processar resultados da query (seja Postgres ou Firebird)
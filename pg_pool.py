@@ -0,0 +1,165 @@
+"""
+Pool de conexões PostgreSQL compartilhado pelas funções de logic.py.
+Evita um novo handshake (TCP/TLS + autenticação) a cada chamada ao banco na nuvem.
+
+Um pool é mantido por conjunto de parâmetros de conexão (host, porta, usuário, banco...).
+"""
+
+import atexit
+import contextlib
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+# Máximo de conexões abertas por pool (em uso + ociosas)
+MAX_CONNECTIONS = 4
+
+# Conexões ociosas há mais tempo que isso (segundos) são fechadas
+IDLE_TIMEOUT = 300
+
+# Conexões ociosas há mais tempo que isso (segundos) são testadas com SELECT 1 antes do uso
+PING_AFTER = 30
+
+# Tempo máximo (segundos) de espera por uma conexão livre quando o pool está cheio
+ACQUIRE_TIMEOUT = 60
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Pool de conexões para um único conjunto de parâmetros.
+
+    - Verificação de saúde na retirada (conexão fechada, perdida ou ociosa há muito tempo)
+    - Fechamento de conexões ociosas além de IDLE_TIMEOUT
+    - Limite de conexões abertas (quem excede espera até ACQUIRE_TIMEOUT)
+    """
+
+    def __init__(self, conn_config, max_size=MAX_CONNECTIONS, idle_timeout=IDLE_TIMEOUT):
+        self._conn_config = dict(conn_config)
+        self._idle_timeout = idle_timeout
+        self._idle = []  # [(conexão, instante do último uso)], mais recente no final
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def getconn(self, timeout=ACQUIRE_TIMEOUT):
+        """Retira uma conexão saudável do pool (ou abre uma nova)."""
+        if not self._slots.acquire(timeout=timeout):
+            raise pool.PoolError(f"Nenhuma conexão PostgreSQL livre após {timeout}s")
+
+        try:
+            while True:
+                with self._lock:
+                    self._evict_idle()
+                    item = self._idle.pop() if self._idle else None
+
+                if item is None:
+                    return psycopg2.connect(**self._conn_config)
+
+                conn, last_used = item
+                if self._is_healthy(conn, time.monotonic() - last_used):
+                    return conn
+                _close_quietly(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        """Devolve a conexão ao pool (descartando-a se estiver quebrada ou se close=True)."""
+        try:
+            if not close and not conn.closed:
+                try:
+                    # Sair de qualquer transação aberta antes de reutilizar
+                    if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+            if close or conn.closed:
+                _close_quietly(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        """Fecha todas as conexões ociosas."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def _evict_idle(self):
+        """Fecha as conexões ociosas além do limite (chamar com self._lock)."""
+        limit = time.monotonic() - self._idle_timeout
+        expired = [conn for conn, last_used in self._idle if last_used < limit]
+        if expired:
+            self._idle = [(conn, last_used) for conn, last_used in self._idle if last_used >= limit]
+            for conn in expired:
+                _close_quietly(conn)
+
+    @staticmethod
+    def _is_healthy(conn, idle_seconds):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if idle_seconds < PING_AFTER:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def get_pool(conn_config):
+    """Retorna o pool associado aos parâmetros de conexão (criando-o na primeira chamada)."""
+    key = tuple(sorted((k, str(v)) for k, v in conn_config.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(conn_config)
+        return _pools[key]
+
+
+@contextlib.contextmanager
+def connection(conn_config):
+    """
+    Context manager que empresta uma conexão do pool e a devolve ao final.
+
+    Uso:
+        with pg_pool.connection(conn_config) as conn:
+            cursor = conn.cursor()
+            ...
+    """
+    conn_pool = get_pool(conn_config)
+    conn = conn_pool.getconn()
+    try:
+        yield conn
+    finally:
+        conn_pool.putconn(conn)
+
+
+def close_all():
+    """Fecha as conexões ociosas de todos os pools."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for conn_pool in pools:
+        conn_pool.closeall()
+
+
+atexit.register(close_all)
@@ -0,0 +1,53 @@
+"""Testes da leitura dos arquivos de entrada (SEFAZ e Relatório do Sistema)."""
+
+import logic
+
+
+def _csv(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_relatorio_com_status_vazio(tmp_path):
+    sefaz = _csv(tmp_path, 'sefaz.csv', 'Inicial a,Final,Série\n10,12,1\n')
+    relatorio = _csv(tmp_path, 'relatorio.csv', 'Doc. Fiscal,Série,Status\n10,1,Autorizada\n11,1,\n')
+
+    resultado = logic.executar_analise_discrepancia(sefaz, relatorio, '1')
+
+    assert resultado['erro'] is None
+    assert list(resultado['discrepancia_grave']) == [10]
+    assert list(resultado['conciliado_ok']) == [11]
+    assert list(resultado['nao_encontrado_no_relatorio']) == [12]
+    assert resultado['count_relatorio'] == 2
+
+
+def test_sefaz_com_serie_vazia(tmp_path):
+    sefaz = _csv(tmp_path, 'sefaz.csv', 'Inicial a,Final,Série\n10,12,1\n20,21,\n30,30,2\n')
+
+    documentos = logic._ler_sefaz_multi(sefaz)
+
+    assert sorted(documentos) == ['1', '2']
+    assert documentos['1'].intervals == [(10, 12)]
+    assert list(documentos['2']) == [30]
+
+
+def test_faixa_grande_preservada_na_leitura(tmp_path):
+    sefaz = _csv(tmp_path, 'sefaz.csv', 'Inicial a,Final,Série\n1,999999999,1\n5,6,2\n')
+
+    documentos = logic._ler_sefaz_multi(sefaz)
+
+    assert documentos['1'].intervals == [(1, 999999999)]
+    assert logic._faixa_sefaz_grande_demais(documentos) == ('1', 1, 999999999)
+    assert logic._faixa_sefaz_grande_demais({'2': documentos['2']}) is None
+
+
+def test_sefaz_com_linhas_de_titulo(tmp_path):
+    sefaz = _csv(
+        tmp_path, 'sefaz.csv',
+        'Relatório de Inutilizações\nEmitente: 123\n\nInicial a;Final;Série;Motivo\n10;12;1;Erro\n15;15;1;Erro\n'
+    )
+
+    documentos = logic._ler_sefaz_multi(sefaz)
+
+    assert documentos['1'].intervals == [(10, 12), (15, 15)]